@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Compare the sync WSGI stack with the async ASGI read path at equal worker counts.
+
+Starts gunicorn twice against the configured database - once with the default
+sync workers, once with uvicorn workers (ASYNC_READ_VIEWS on) - and drives
+both with the same read-heavy mix from load_driver.py at increasing
+concurrency. The gain grows with database round-trip time, so run it against
+the Postgres service rather than SQLite.
+
+    python benchmarks/asgi_vs_wsgi.py --workers 3 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from load_driver import TrafficState, parse_mix, run_load  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+READ_MIX = 'check-eligibility=4,view-loan=4,view-loans=2'
+
+STACKS = {
+    'wsgi': {
+        'app': 'credit_approval.wsgi:application',
+        'worker_class': 'sync',
+        'env': {'ASYNC_READ_VIEWS': '0'},
+    },
+    'asgi': {
+        'app': 'credit_approval.asgi:application',
+        'worker_class': 'uvicorn_worker.UvicornWorker',
+        'env': {'ASYNC_READ_VIEWS': '1'},
+    },
+}
+
+
+def start_server(stack, workers, port):
+    config = STACKS[stack]
+    env = dict(os.environ, **config['env'])
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', config['app'],
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers),
+            '--worker-class', config['worker_class'],
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/api/view-loan/00000000-0000-0000-0000-000000000000/', timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{stack} server did not start on port {port}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3, help='Worker processes for both stacks')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16, 64, 128])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(READ_MIX))
+    args = parser.parse_args(argv)
+
+    results = {}
+    for stack in STACKS:
+        process = start_server(stack, args.workers, args.port)
+        try:
+            state = TrafficState()
+            for concurrency in args.concurrency:
+                summary = asyncio.run(run_load(
+                    f'http://127.0.0.1:{args.port}', args.mix, concurrency, args.duration, state=state
+                ))
+                results[(stack, concurrency)] = summary
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{'clients':>8} | {'wsgi rps':>10} {'p99 ms':>8} | {'asgi rps':>10} {'p99 ms':>8} | {'gain':>6}")
+    for concurrency in args.concurrency:
+        wsgi, asgi = results[('wsgi', concurrency)], results[('asgi', concurrency)]
+        gain = asgi['throughput_rps'] / wsgi['throughput_rps'] if wsgi['throughput_rps'] else 0
+        print(
+            f"{concurrency:>8} | {wsgi['throughput_rps']:>10} {wsgi['latency']['p99_ms']:>8} | "
+            f"{asgi['throughput_rps']:>10} {asgi['latency']['p99_ms']:>8} | {gain:>5.2f}x"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
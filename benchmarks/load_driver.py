@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+"""
+Closed-loop HTTP load driver for the credit approval API.
+
+Replays a weighted mix of register / check-eligibility / create-loan /
+view-loan traffic against a running server (gunicorn, uvicorn or nginx in
+front of either) and reports the latency distribution, error rate and
+achieved throughput. Requests shed by admission control (429) are counted
+per operation as `rejected` and kept out of the latency percentiles, which
+would otherwise be pulled down by the cheap rejections.
+
+Examples:
+    # 32 concurrent closed-loop clients for 60 seconds
+    python benchmarks/load_driver.py --base-url http://localhost:8000 --concurrency 32 --duration 60
+
+    # Paced at 200 requests/second across 64 clients
+    python benchmarks/load_driver.py --rps 200 --concurrency 64
+
+    # Step concurrency up until throughput stops growing
+    python benchmarks/load_driver.py --find-saturation --max-concurrency 256
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+DEFAULT_MIX = 'register=1,check-eligibility=4,create-loan=1,view-loan=4'
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_mix(value):
+    """Parse 'op=weight,op=weight' into a dict of positive weights."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}'")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError('Traffic mix needs at least one positive weight')
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Stats:
+    """Latency samples, error and rejection counts for one run, per operation."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.rejected = {}
+        self.status_codes = {}
+        self.started = None
+        self.finished = None
+
+    def record(self, operation, latency, status_code):
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        if status_code == 429:
+            # Shed by admission control before doing any work
+            self.rejected[operation] = self.rejected.get(operation, 0) + 1
+            return
+        self.latencies.setdefault(operation, []).append(latency)
+        # 4xx answers such as "loan not approved" are valid business responses;
+        # only transport failures and 5xx count as errors.
+        if status_code is None or status_code >= 500:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        all_latencies = sorted(l for values in self.latencies.values() for l in values)
+        served = len(all_latencies)
+        rejected = sum(self.rejected.values())
+        total = served + rejected
+        errors = sum(self.errors.values())
+
+        def describe(values):
+            values = sorted(values)
+            result = {f'p{pct}_ms': round(percentile(values, pct) * 1000, 2) for pct in PERCENTILES}
+            result['max_ms'] = round(values[-1] * 1000, 2) if values else 0.0
+            result['count'] = len(values)
+            return result
+
+        return {
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'rejected': rejected,
+            'rejection_rate': round(rejected / total, 4) if total else 0.0,
+            'duration_s': round(elapsed, 2),
+            # Requests the server answered, not the ones it shed
+            'throughput_rps': round(served / elapsed, 2) if elapsed > 0 else 0.0,
+            'latency': describe(all_latencies),
+            'operations': {
+                name: dict(
+                    describe(self.latencies.get(name, [])),
+                    errors=self.errors.get(name, 0),
+                    rejected=self.rejected.get(name, 0),
+                )
+                for name in sorted(set(self.latencies) | set(self.rejected))
+            },
+            'status_codes': {str(code): count for code, count in sorted(self.status_codes.items(), key=str)},
+        }
+
+
+class TrafficState:
+    """Customer and loan ids discovered while the run progresses."""
+
+    def __init__(self):
+        self.customer_ids = []
+        self.loan_ids = []
+
+    def random_customer(self):
+        return random.choice(self.customer_ids) if self.customer_ids else None
+
+    def random_loan(self):
+        return random.choice(self.loan_ids) if self.loan_ids else None
+
+
+def _new_customer_payload():
+    return {
+        'first_name': 'Load',
+        'last_name': 'Test',
+        'age': random.randint(21, 60),
+        'monthly_income': random.choice([30000, 50000, 80000, 120000, 200000]),
+        # 15 digits max; uuid keeps concurrent drivers from colliding
+        'phone_number': str(uuid.uuid4().int)[:15],
+    }
+
+
+def _loan_payload(customer_id):
+    return {
+        'customer_id': customer_id,
+        'loan_amount': random.choice([50000, 100000, 250000, 500000]),
+        'interest_rate': random.choice([8.5, 10, 12.5, 16]),
+        'tenure': random.choice([12, 24, 36, 60]),
+    }
+
+
+async def op_register(client, state):
+    response = await client.post('/api/register/', json=_new_customer_payload())
+    if response.status_code == 201:
+        state.customer_ids.append(response.json()['customer_id'])
+    return response
+
+
+async def op_check_eligibility(client, state):
+    customer_id = state.random_customer()
+    if customer_id is None:
+        return await op_register(client, state)
+    return await client.post('/api/check-eligibility/', json=_loan_payload(customer_id))
+
+
+async def op_create_loan(client, state):
+    customer_id = state.random_customer()
+    if customer_id is None:
+        return await op_register(client, state)
+    response = await client.post('/api/create-loan/', json=_loan_payload(customer_id))
+    if response.status_code == 201 and response.json().get('loan_id'):
+        state.loan_ids.append(response.json()['loan_id'])
+    return response
+
+
+async def op_view_loan(client, state):
+    loan_id = state.random_loan()
+    if loan_id is None:
+        customer_id = state.random_customer()
+        if customer_id is None:
+            return await op_register(client, state)
+        return await client.get(f'/api/view-loans/{customer_id}/')
+    return await client.get(f'/api/view-loan/{loan_id}/')
+
+
+async def op_view_loans(client, state):
+    customer_id = state.random_customer()
+    if customer_id is None:
+        return await op_register(client, state)
+    return await client.get(f'/api/view-loans/{customer_id}/')
+
+
+OPERATIONS = {
+    'register': op_register,
+    'check-eligibility': op_check_eligibility,
+    'create-loan': op_create_loan,
+    'view-loan': op_view_loan,
+    'view-loans': op_view_loans,
+}
+
+
+async def seed(client, state, customers):
+    """Register a starting population so reads have something to hit."""
+    for _ in range(customers):
+        await op_register(client, state)
+    for customer_id in list(state.customer_ids)[: max(customers // 2, 1)]:
+        response = await client.post('/api/create-loan/', json=_loan_payload(customer_id))
+        if response.status_code == 201 and response.json().get('loan_id'):
+            state.loan_ids.append(response.json()['loan_id'])
+
+
+async def worker(client, state, stats, mix, deadline, interval):
+    """
+    One closed-loop client: issue a request, wait for the answer, repeat.
+
+    When `interval` is set the client is paced so the whole pool approximates
+    the target RPS; a slow server still back-pressures the pool, which is what
+    makes the saturation point visible.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    next_send = time.perf_counter()
+    while time.perf_counter() < deadline:
+        if interval:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send += interval
+        operation = random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await OPERATIONS[operation](client, state)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            status_code = None
+        stats.record(operation, time.perf_counter() - started, status_code)
+
+
+async def run_load(base_url, mix, concurrency, duration, rps=None, state=None, timeout=30.0):
+    """Run one load level and return its Stats summary."""
+    state = state or TrafficState()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        if not state.customer_ids:
+            await seed(client, state, customers=min(max(concurrency, 10), 200))
+        stats = Stats()
+        interval = concurrency / rps if rps else None
+        stats.started = time.perf_counter()
+        deadline = stats.started + duration
+        await asyncio.gather(*(
+            worker(client, state, stats, mix, deadline, interval)
+            for _ in range(concurrency)
+        ))
+        stats.finished = time.perf_counter()
+    return stats.summary()
+
+
+async def find_saturation(base_url, mix, duration, max_concurrency, min_gain, max_error_rate, p99_budget_ms):
+    """
+    Double the number of clients until throughput stops improving.
+
+    The saturation point is the last level whose throughput grew by at least
+    `min_gain` over the previous one while staying inside the error and p99
+    budgets.
+    """
+    state = TrafficState()
+    levels = []
+    saturation = None
+    concurrency = 1
+    while concurrency <= max_concurrency:
+        result = await run_load(base_url, mix, concurrency, duration, state=state)
+        result['concurrency'] = concurrency
+        levels.append(result)
+        print(
+            f"concurrency={concurrency:<4} rps={result['throughput_rps']:<9} "
+            f"p50={result['latency']['p50_ms']}ms p99={result['latency']['p99_ms']}ms "
+            f"errors={result['error_rate']:.2%} rejected={result['rejection_rate']:.2%}",
+            file=sys.stderr,
+        )
+        over_budget = (
+            result['error_rate'] > max_error_rate
+            or (p99_budget_ms and result['latency']['p99_ms'] > p99_budget_ms)
+        )
+        if len(levels) > 1:
+            previous = levels[-2]
+            gain = (result['throughput_rps'] - previous['throughput_rps']) / max(previous['throughput_rps'], 1e-9)
+            if over_budget or gain < min_gain:
+                saturation = previous
+                break
+        elif over_budget:
+            saturation = result
+            break
+        concurrency *= 2
+    if saturation is None and levels:
+        saturation = levels[-1]
+    return {
+        'levels': levels,
+        'saturation': {
+            'concurrency': saturation['concurrency'],
+            'throughput_rps': saturation['throughput_rps'],
+            'p99_ms': saturation['latency']['p99_ms'],
+        } if saturation else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Weighted operation mix (default: {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of closed-loop clients')
+    parser.add_argument('--rps', type=float, help='Target requests per second (paces the clients)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per load level')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, help='Random seed for a reproducible mix')
+    parser.add_argument('--find-saturation', action='store_true',
+                        help='Step concurrency 1, 2, 4, ... until throughput plateaus')
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    parser.add_argument('--min-gain', type=float, default=0.05,
+                        help='Minimum relative throughput gain to keep stepping (default 5%%)')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--p99-budget-ms', type=float, default=0,
+                        help='Stop stepping once p99 exceeds this many milliseconds (0 disables)')
+    parser.add_argument('--output', help='Write the JSON report to this file as well as stdout')
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.find_saturation:
+        report = asyncio.run(find_saturation(
+            args.base_url, args.mix, args.duration, args.max_concurrency,
+            args.min_gain, args.max_error_rate, args.p99_budget_ms,
+        ))
+    else:
+        report = asyncio.run(run_load(
+            args.base_url, args.mix, args.concurrency, args.duration,
+            rps=args.rps, timeout=args.timeout,
+        ))
+        report['concurrency'] = args.concurrency
+        report['target_rps'] = args.rps
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
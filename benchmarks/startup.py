@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Boot cost of each process type: import time and resident memory.
+
+Boots every process type in a fresh interpreter under `-X importtime`,
+the way it boots in production, and reports the total import time, the
+heaviest top-level imports and the RSS once booted:
+
+- web:     the WSGI app with the URL conf and every view module loaded
+- celery:  the Celery app after task autodiscovery
+- command: the `import_excel_data` management command
+
+With --check the run fails when a process is over its budget in
+benchmarks/startup_budget.json (import time, RSS, and modules it must not
+load at all, e.g. pandas outside the importer). Import times are the
+median of --repeat runs; the budgets leave headroom for slower machines.
+
+With --gunicorn it also starts gunicorn with and without preload_app and
+reports the proportional (PSS) and private (USS) memory per worker, which
+shows how much the forked workers share copy-on-write.
+
+    python benchmarks/startup.py --check
+    python benchmarks/startup.py --gunicorn --workers 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_FILE = Path(__file__).resolve().parent / 'startup_budget.json'
+
+BOOT = {
+    'web': (
+        "import credit_approval.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    'celery': (
+        "from credit_approval.celery import app\n"
+        "import django\n"
+        "django.setup()\n"
+        "app.loader.import_default_modules()\n"
+    ),
+    'command': (
+        "import django\n"
+        "django.setup()\n"
+        "from django.core.management import load_command_class\n"
+        "load_command_class('core', 'import_excel_data')\n"
+    ),
+}
+
+REPORT = (
+    "import json, sys\n"
+    "rss = 0\n"
+    "with open('/proc/self/status') as status:\n"
+    "    for line in status:\n"
+    "        if line.startswith('VmRSS:'):\n"
+    "            rss = int(line.split()[1]) / 1024\n"
+    "print(json.dumps({'rss_mb': rss, 'modules': sorted(sys.modules)}))\n"
+)
+
+
+def parse_importtime(stderr):
+    """Total import time (ms) and top-level imports by cumulative time."""
+    total_us = 0
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        if not name.startswith('  '):
+            top_level.append((int(cumulative_us) / 1000, name.strip()))
+    return total_us / 1000, sorted(top_level, reverse=True)
+
+
+def boot(process_type, settings_module):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT[process_type] + REPORT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    import_ms, top_level = parse_importtime(result.stderr)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'import_ms': import_ms,
+        'wall_ms': wall_ms,
+        'rss_mb': report['rss_mb'],
+        'modules': set(report['modules']),
+        'top_level': top_level,
+    }
+
+
+def measure(process_type, settings_module, repeat):
+    runs = [boot(process_type, settings_module) for _ in range(repeat)]
+    return {
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'wall_ms': round(statistics.median(run['wall_ms'] for run in runs), 1),
+        'rss_mb': round(statistics.median(run['rss_mb'] for run in runs), 1),
+        'modules': runs[-1]['modules'],
+        'top_level': runs[-1]['top_level'],
+    }
+
+
+def check_budget(process_type, result, budget):
+    """Budget violations of one process type, as messages."""
+    problems = []
+    if result['import_ms'] > budget['import_ms']:
+        problems.append(f"import time {result['import_ms']} ms > {budget['import_ms']} ms")
+    if result['rss_mb'] > budget['rss_mb']:
+        problems.append(f"RSS {result['rss_mb']} MB > {budget['rss_mb']} MB")
+    for module in budget.get('forbidden', []):
+        if module in result['modules']:
+            problems.append(f'imports {module}')
+    return [f'{process_type}: {problem}' for problem in problems]
+
+
+def smaps_rollup(pid):
+    """PSS and USS of a process in MB."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'pss_mb': round(values.get('Pss', 0), 1),
+        'uss_mb': round(values.get('Private_Clean', 0) + values.get('Private_Dirty', 0), 1),
+    }
+
+
+def gunicorn_memory(preload, workers, port, settings_module):
+    """Master and per-worker memory of a gunicorn started with or without preload."""
+    import httpx
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, GUNICORN_PRELOAD='1' if preload else '0')
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'credit_approval.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        ],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f'http://127.0.0.1:{port}/api/metrics/'
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(url, timeout=1)
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+        # Let every worker serve requests, so lazily loaded modules are in
+        for _ in range(workers * 20):
+            httpx.get(url, timeout=5)
+
+        children = Path(f'/proc/{process.pid}/task/{process.pid}/children').read_text().split()
+        worker_memory = [smaps_rollup(pid) for pid in children]
+        return {
+            'master': smaps_rollup(process.pid),
+            'worker_pss_mb': round(statistics.mean(m['pss_mb'] for m in worker_memory), 1),
+            'worker_uss_mb': round(statistics.mean(m['uss_mb'] for m in worker_memory), 1),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='credit_approval.settings')
+    parser.add_argument('--repeat', type=int, default=3, help='Boots per process type; the median is reported')
+    parser.add_argument('--top', type=int, default=8, help='Heaviest top-level imports to list')
+    parser.add_argument('--check', action='store_true', help='Exit 1 when a process is over budget')
+    parser.add_argument('--gunicorn', action='store_true', help='Compare gunicorn worker memory with and without preload')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8060)
+    args = parser.parse_args(argv)
+
+    budgets = json.loads(BUDGET_FILE.read_text())
+    problems = []
+    print(f"{'process':<9} {'import ms':>10} {'wall ms':>9} {'RSS MB':>8}")
+    for process_type in BOOT:
+        result = measure(process_type, args.settings, args.repeat)
+        print(f"{process_type:<9} {result['import_ms']:>10} {result['wall_ms']:>9} {result['rss_mb']:>8}")
+        for cumulative_ms, name in result['top_level'][:args.top]:
+            print(f'    {cumulative_ms:>8.1f} ms  {name}')
+        problems += check_budget(process_type, result, budgets[process_type])
+
+    if args.gunicorn:
+        print(f"\n{'gunicorn':<12} {'master PSS':>11} {'worker PSS':>11} {'worker USS':>11}")
+        for preload in (False, True):
+            memory = gunicorn_memory(preload, args.workers, args.port, args.settings)
+            label = 'preload' if preload else 'no preload'
+            print(
+                f"{label:<12} {memory['master']['pss_mb']:>11} "
+                f"{memory['worker_pss_mb']:>11} {memory['worker_uss_mb']:>11}"
+            )
+
+    if problems:
+        print('\nOver budget:\n  ' + '\n  '.join(problems))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Encode time and payload size of the `view-loans` response per wire format.
+
+Builds a customer's loan list in memory (no database) and, for each format,
+times serializing it and rendering it through the renderer DRF would pick
+for that `Accept`/`Accept-Encoding` pair. Reports the median of --repeat
+runs and the body size in bytes:
+
+- json, json+gzip, json+br: CompressedJSONRenderer
+- msgpack, msgpack+gzip, msgpack+br: MessagePackRenderer
+
+    python benchmarks/wire_formats.py --loans 1000 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FORMATS = {
+    'json': ('application/json', ''),
+    'json+gzip': ('application/json', 'gzip'),
+    'json+br': ('application/json', 'br'),
+    'msgpack': ('application/msgpack', ''),
+    'msgpack+gzip': ('application/msgpack', 'gzip'),
+    'msgpack+br': ('application/msgpack', 'br'),
+}
+
+
+def make_loans(count, seed=0):
+    from core.models import Loan
+
+    rng = random.Random(seed)
+    loans = []
+    for _ in range(count):
+        amount = Decimal(rng.randrange(100, 50_000) * 100)
+        tenure = rng.choice((12, 24, 36, 60, 120))
+        loans.append(Loan(
+            loan_id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            loan_amount=amount.quantize(Decimal('0.01')),
+            tenure=tenure,
+            interest_rate=Decimal(rng.randrange(500, 2400)) / 100,
+            monthly_installment=(amount / tenure * Decimal('1.1')).quantize(Decimal('0.01')),
+            emis_paid_on_time=rng.randrange(0, tenure),
+        ))
+    return loans
+
+
+def encode(loans, accept, accept_encoding):
+    """(serialize seconds, render seconds, body) for one response."""
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from core.renderers import negotiate
+    from core.serializers import CustomerLoanListSerializer
+
+    headers = {'HTTP_ACCEPT': accept}
+    if accept_encoding:
+        headers['HTTP_ACCEPT_ENCODING'] = accept_encoding
+    request = RequestFactory().get('/api/view-loans/1/', **headers)
+    renderer = negotiate(request)
+
+    started = time.perf_counter()
+    data = {
+        'customer_id': str(uuid.uuid4()),
+        'total_loans': len(loans),
+        'loans': CustomerLoanListSerializer(loans, many=True, context={'request': request}).data,
+    }
+    serialized = time.perf_counter()
+    body = renderer.render(data, request.accepted_media_type, {'request': request, 'response': HttpResponse()})
+    return serialized - started, time.perf_counter() - serialized, body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='credit_approval.settings')
+    parser.add_argument('--loans', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=7, help='Runs per format; the median is reported')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS))
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', args.settings)
+    import django
+    django.setup()
+    from core import renderers
+
+    print(f"{'loans':>6} {'format':<13} {'serialize ms':>13} {'render ms':>10} {'bytes':>10} {'vs json':>8}")
+    for count in args.loans:
+        loans = make_loans(count)
+        json_size = None
+        for name in args.formats:
+            accept, accept_encoding = FORMATS[name]
+            if accept_encoding == 'br' and renderers.brotli is None:
+                print(f'{count:>6} {name:<13} {"(brotli not installed)":>34}')
+                continue
+            runs = [encode(loans, accept, accept_encoding) for _ in range(args.repeat)]
+            serialize_ms = statistics.median(run[0] for run in runs) * 1000
+            render_ms = statistics.median(run[1] for run in runs) * 1000
+            size = len(runs[-1][2])
+            json_size = json_size or (size if name == 'json' else None)
+            ratio = f'{size / json_size:.0%}' if json_size else ''
+            print(f'{count:>6} {name:<13} {serialize_ms:>13.1f} {render_ms:>10.1f} {size:>10} {ratio:>8}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
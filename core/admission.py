@@ -0,0 +1,336 @@
+"""
+Admission control for the API.
+
+`AdmissionControlMiddleware` runs before sessions, authentication and the
+view, so a rejected request costs no database work. Requests are matched
+by URL name against ADMISSION_RULES (first fnmatch pattern wins; requests
+matching no rule are always admitted) and then:
+
+1. Token buckets: each rule may have one bucket for the endpoint as a whole
+   (`rate` requests per second, bursts of `burst`) and one per client IP
+   (`client_rate`, `client_burst`). A request needs a token from every
+   bucket of its rule; if one is empty the request is rejected with 429
+   and a `Retry-After` of the time until it refills. Buckets live in Redis
+   (ADMISSION_BACKEND=redis, shared by every worker; one Lua script call
+   per request) or in process memory (ADMISSION_BACKEND=memory, so the
+   limits apply to each worker separately).
+2. Load shedding: with ADMISSION_DB_P95_MS set, every query's duration is
+   recorded and, when the p95 over the last ADMISSION_DB_WINDOW_SECONDS
+   crosses the threshold, a share of requests is rejected before the
+   buckets are touched. The share grows with the overshoot: writes are
+   shed from 1x the threshold (all of them at 2x), rules with priority
+   ``read`` (the view-* lookups) only from 2x (all of them at 3x). The
+   latency window is per process, so each worker sheds on what it sees.
+
+If Redis is unreachable requests are admitted (`admission_errors_total`).
+Decisions are counted in `admission_admitted_total` and
+`admission_rejected_total` (by rule and reason).
+"""
+import math
+import random
+import threading
+import time
+from collections import deque
+from fnmatch import fnmatchcase
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from . import metrics
+
+# Fewer recent queries than this are not enough for a p95
+MIN_SAMPLES = 20
+
+# The p95 is recomputed at most this often (seconds)
+P95_REFRESH_SECONDS = 0.5
+
+BUCKET_KEY = 'admission:{rule}:{scope}'
+
+# Seconds; a slow or unreachable Redis must not hold requests up
+REDIS_TIMEOUTS = {'socket_connect_timeout': 0.1, 'socket_timeout': 0.1}
+
+# KEYS: bucket keys; ARGV: rate and burst for each key in turn. Takes one
+# token from every bucket if all have one, otherwise none; returns the
+# seconds to wait (as a string) and the 1-based index of the bucket that
+# is short, 0 when admitted.
+TAKE_TOKENS = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local tokens = {}
+local wait, short = 0, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or burst
+    local elapsed = math.max(now - (tonumber(state[2]) or now), 0)
+    tokens[i] = math.min(burst, available + elapsed * rate)
+    if tokens[i] < 1 and (1 - tokens[i]) / rate > wait then
+        wait, short = (1 - tokens[i]) / rate, i
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    if short == 0 then tokens[i] = tokens[i] - 1 end
+    redis.call('HSET', key, 'tokens', tokens[i], 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {tostring(wait), short}
+"""
+
+
+class MemoryBuckets:
+    """Token buckets in this process's memory."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets):
+        """
+        Take a token from each (key, rate, burst) bucket if all have one.
+
+        Returns (seconds to wait, index of the short bucket); (0, None)
+        when admitted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            wait, short = 0.0, None
+            for index, (key, rate, burst) in enumerate(buckets):
+                tokens, updated = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < 1 and (1 - tokens) / rate > wait:
+                    wait, short = (1 - tokens) / rate, index
+            for (key, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - 1 if short is None else tokens, now)
+        return wait, short
+
+    async def atake(self, buckets):
+        return self.take(buckets)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every process."""
+
+    def __init__(self):
+        self._client = None
+        self._script = None
+        self._async_script = None
+
+    def _arguments(self, buckets):
+        keys = [key for key, _, _ in buckets]
+        args = [value for _, rate, burst in buckets for value in (rate, burst)]
+        return keys, args
+
+    @staticmethod
+    def _result(result):
+        wait, short = result
+        return float(wait), (int(short) - 1 if int(short) else None)
+
+    def take(self, buckets):
+        if self._script is None:
+            import redis
+            self._client = redis.Redis.from_url(settings.ADMISSION_REDIS_URL, **REDIS_TIMEOUTS)
+            self._script = self._client.register_script(TAKE_TOKENS)
+        keys, args = self._arguments(buckets)
+        return self._result(self._script(keys=keys, args=args))
+
+    async def atake(self, buckets):
+        if self._async_script is None:
+            import redis.asyncio
+            client = redis.asyncio.Redis.from_url(settings.ADMISSION_REDIS_URL, **REDIS_TIMEOUTS)
+            self._async_script = client.register_script(TAKE_TOKENS)
+        keys, args = self._arguments(buckets)
+        return self._result(await self._async_script(keys=keys, args=args))
+
+
+_backends = {}
+
+
+def get_backend():
+    backend = settings.ADMISSION_BACKEND
+    if backend not in _backends:
+        _backends[backend] = RedisBuckets() if backend == 'redis' else MemoryBuckets()
+    return _backends[backend]
+
+
+# Query latency
+
+_samples = deque(maxlen=5000)
+_p95 = [float('-inf'), 0.0]  # computed at (monotonic time), value in seconds
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _samples.append((time.monotonic(), time.perf_counter() - started))
+
+
+@receiver(connection_created, dispatch_uid='admission_time_queries')
+def time_queries(sender, connection, **kwargs):
+    # Stays installed for the connection's lifetime, across requests
+    if settings.ADMISSION_DB_P95_MS and _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def db_p95():
+    """p95 query time in seconds over the recent window; 0 with too few queries."""
+    now = time.monotonic()
+    if now - _p95[0] < P95_REFRESH_SECONDS:
+        return _p95[1]
+    cutoff = now - settings.ADMISSION_DB_WINDOW_SECONDS
+    recent = sorted(seconds for at, seconds in list(_samples) if at >= cutoff)
+    p95 = recent[int(0.95 * (len(recent) - 1))] if len(recent) >= MIN_SAMPLES else 0.0
+    _p95[:] = [now, p95]
+    metrics.set_gauge('admission_db_p95_seconds', p95)
+    return p95
+
+
+def shed_share(priority):
+    """Share of requests of `priority` to shed at the current p95."""
+    threshold = settings.ADMISSION_DB_P95_MS / 1000
+    if not threshold:
+        return 0.0
+    overshoot = db_p95() / threshold - (2 if priority == 'read' else 1)
+    return min(max(overshoot, 0.0), 1.0)
+
+
+def reset():
+    """Forget buckets and latency samples. Used by tests."""
+    for backend in _backends.values():
+        if isinstance(backend, MemoryBuckets):
+            backend.clear()
+    _samples.clear()
+    _p95[:] = [float('-inf'), 0.0]
+
+
+# Request admission
+
+def match_rule(request):
+    """The ADMISSION_RULES entry for `request`, or None."""
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+    if url_name is None:
+        return None
+    for rule in settings.ADMISSION_RULES:
+        if fnmatchcase(url_name, rule['name']) and request.method in rule.get('methods', (request.method,)):
+            return rule
+    return None
+
+
+def client_id(request):
+    """
+    The client's address: the entry ADMISSION_PROXY_COUNT hops from the end
+    of X-Forwarded-For behind that many proxies, otherwise REMOTE_ADDR.
+    """
+    proxies = settings.ADMISSION_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return hops[-min(proxies, len(hops))]
+    return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+def _buckets(rule, request):
+    buckets = []
+    if rule.get('rate'):
+        buckets.append((BUCKET_KEY.format(rule=rule['name'], scope='all'), rule['rate'], rule['burst']))
+    if rule.get('client_rate'):
+        key = BUCKET_KEY.format(rule=rule['name'], scope=client_id(request))
+        buckets.append((key, rule['client_rate'], rule['client_burst']))
+    return buckets
+
+
+def _rejected(rule, reason, retry_after):
+    metrics.inc('admission_rejected_total', rule=rule['name'], reason=reason)
+    response = JsonResponse({'error': 'Too many requests, retry later'}, status=429)
+    response['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def _shed(rule):
+    share = shed_share(rule.get('priority', 'write'))
+    if share and random.random() < share:
+        return _rejected(rule, 'overload', settings.ADMISSION_SHED_RETRY_AFTER)
+    return None
+
+
+def _unavailable():
+    # Redis down: admit rather than turn an outage into a full rejection
+    metrics.inc('admission_errors_total')
+    return 0.0, None
+
+
+def _decide(rule, buckets, result):
+    wait, short = result
+    if short is not None:
+        reason = 'endpoint' if buckets[short][0].endswith(':all') else 'client'
+        return _rejected(rule, reason, wait)
+    metrics.inc('admission_admitted_total', rule=rule['name'])
+    return None
+
+
+class AdmissionControlMiddleware:
+    """Reject requests over their rule's limits with 429 (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _prepare(request):
+        # (rejection, rule, buckets): a rejection if load shedding applies,
+        # otherwise the buckets to take tokens from, if any
+        rule = match_rule(request)
+        if rule is None:
+            return None, None, []
+        rejection = _shed(rule)
+        if rejection is not None:
+            return rejection, rule, []
+        buckets = _buckets(rule, request)
+        if not buckets:
+            metrics.inc('admission_admitted_total', rule=rule['name'])
+        return None, rule, buckets
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        rejection, rule, buckets = self._prepare(request)
+        if buckets:
+            try:
+                result = get_backend().take(buckets)
+            except Exception:
+                result = _unavailable()
+            rejection = _decide(rule, buckets, result)
+        if rejection is not None:
+            return rejection
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        rejection, rule, buckets = self._prepare(request)
+        if buckets:
+            try:
+                result = await get_backend().atake(buckets)
+            except Exception:
+                result = _unavailable()
+            rejection = _decide(rule, buckets, result)
+        if rejection is not None:
+            return rejection
+        return await self.get_response(request)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect the cache invalidation, portfolio counter, task timing and
+        # tracing signal handlers, and register the outbox metrics collector
+        from . import customer_cache, outbox, portfolio, queue_metrics, tracing  # noqa: F401
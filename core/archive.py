@@ -0,0 +1,139 @@
+"""
+Hot/cold tiering of the loan table.
+
+Closed and rejected loans whose end date is more than ARCHIVE_AFTER_DAYS
+in the past are moved from `Loan` into `ArchivedLoan`, so the queries that
+scan a customer's loans (scoring, listings, the closure sweep) only see
+live history. Before a loan leaves `Loan`, its tenure, on-time EMIs and
+amount are added to the customer's `CustomerLoanHistory`, which scoring
+adds back (core.scoring.archived_history_aggregates), so scores do not
+change. Only loans that started before the current year are archived;
+the current-year loan count stays a query over `Loan`.
+
+Each chunk is one transaction: lock the loans (SKIP LOCKED, so a payment
+batch or a second sweep is never waited on), copy them, fold them into the
+summaries and delete them with plain SQL. Loans with payment events still
+waiting to be applied are left for a later run.
+
+On PostgreSQL the archive is partitioned by year of `end_date`; the
+partitions a chunk needs are created before it is copied.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import metrics
+from .models import ArchivedLoan, CustomerLoanHistory, Loan, LoanPayment
+from .partitions import create_partition, existing_partitions
+
+ARCHIVED_STATUSES = ('CLOSED', 'REJECTED')
+
+ARCHIVED_FIELDS = (
+    'loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_installment',
+    'emis_paid_on_time', 'start_date', 'end_date', 'status', 'created_at', 'updated_at',
+)
+
+
+def archivable_loans(today=None):
+    """Loans old enough to move to the archive."""
+    today = today or timezone.now().date()
+    return Loan.objects.filter(
+        status__in=ARCHIVED_STATUSES,
+        end_date__lt=today - timedelta(days=settings.ARCHIVE_AFTER_DAYS),
+        start_date__lt=today.replace(month=1, day=1),
+    ).exclude(
+        Exists(LoanPayment.objects.filter(loan=OuterRef('pk'), applied=False))
+    )
+
+
+def _partition_name(year):
+    return f'{ArchivedLoan._meta.db_table}_y{year}'
+
+
+def ensure_archive_partitions(years):
+    """Create the yearly archive partitions for `years`; no-op outside PostgreSQL."""
+    if connection.vendor != 'postgresql':
+        return []
+    table = ArchivedLoan._meta.db_table
+    existing = existing_partitions(table)
+    created = []
+    for year in sorted(set(years)):
+        name = _partition_name(year)
+        if name not in existing:
+            create_partition(table, name, 'end_date', date(year, 1, 1).isoformat(), date(year + 1, 1, 1).isoformat())
+            created.append(name)
+    return created
+
+
+def _add_to_histories(loans):
+    totals = {}
+    for loan in loans:
+        total = totals.setdefault(loan['customer_id'], [0, 0, 0, 0])
+        total[0] += 1
+        total[1] += loan['tenure']
+        total[2] += loan['emis_paid_on_time']
+        total[3] += loan['loan_amount']
+
+    CustomerLoanHistory.objects.bulk_create(
+        [CustomerLoanHistory(customer_id=customer_id) for customer_id in totals],
+        ignore_conflicts=True,
+    )
+    histories = list(
+        CustomerLoanHistory.objects.select_for_update().filter(pk__in=list(totals)).order_by('pk')
+    )
+    now = timezone.now()
+    for history in histories:
+        loans_count, emis, on_time, amount = totals[history.pk]
+        history.total_loans += loans_count
+        history.total_emis += emis
+        history.emis_paid_on_time += on_time
+        history.total_approved_amount += amount
+        history.updated_at = now
+    CustomerLoanHistory.objects.bulk_update(
+        histories, ['total_loans', 'total_emis', 'emis_paid_on_time', 'total_approved_amount', 'updated_at']
+    )
+
+
+def archive_loans(chunk_size=1000, today=None):
+    """
+    Move archivable loans to `ArchivedLoan`, `chunk_size` loans per transaction.
+
+    Returns the number of loans archived and the partitions created.
+    """
+    archived = 0
+    partitions = []
+    while True:
+        with transaction.atomic():
+            loans = list(
+                archivable_loans(today)
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('pk')
+                .values(*ARCHIVED_FIELDS)[:chunk_size]
+            )
+            if not loans:
+                break
+            ids = [loan['loan_id'] for loan in loans]
+
+            partitions += ensure_archive_partitions(loan['end_date'].year for loan in loans)
+            ArchivedLoan.objects.bulk_create(
+                [ArchivedLoan(**loan) for loan in loans], batch_size=500
+            )
+            _add_to_histories(loans)
+
+            # Plain deletes: the portfolio signal handlers would mark the
+            # scores stale, and CLOSED/REJECTED loans are not in its counters
+            LoanPayment.objects.filter(loan_id__in=ids).delete()
+            table = connection.ops.quote_name(Loan._meta.db_table)
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE loan_id IN ({placeholders})',
+                    [Loan._meta.pk.get_db_prep_value(loan_id, connection) for loan_id in ids],
+                )
+            archived += len(ids)
+
+    metrics.inc('loans_archived_total', archived)
+    return {'loans_archived': archived, 'partitions_created': partitions}
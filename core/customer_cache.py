@@ -0,0 +1,162 @@
+"""
+Read-through cache for customer lookups by id.
+
+Two tiers: a small per-process LRU with a short TTL in front of the shared
+Django cache (Redis in deployment). Only the fields the views use are
+cached; lookups return a `Customer` instance with the remaining fields
+deferred.
+
+Entries are dropped on `Customer.save`/`delete` (signal handlers below,
+connected from CoreConfig.ready) and explicitly after bulk `update()` calls such as the
+current_debt increment in LoanCreationView. Other processes may keep a
+local entry for up to CUSTOMER_CACHE_LOCAL_TTL seconds after a write, so
+LoanCreationView itself reads the customer from the primary under a row
+lock rather than through this cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Customer
+
+# Concrete field order, as Customer.from_db expects
+CACHED_FIELDS = (
+    'customer_id', 'first_name', 'last_name', 'phone_number',
+    'monthly_salary', 'approved_limit', 'current_debt', 'age',
+)
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LocalLRU(settings.CUSTOMER_CACHE_LOCAL_SIZE, settings.CUSTOMER_CACHE_LOCAL_TTL)
+
+
+def _cache_key(customer_id):
+    return f'customer:v1:{customer_id}'
+
+
+def _to_instance(values):
+    return Customer.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+
+
+def _load(customer_id):
+    # Always fill from the primary so a lagging replica can't put pre-write
+    # values back into the cache right after an invalidation
+    values = Customer.objects.using(DEFAULT_DB_ALIAS).filter(
+        customer_id=customer_id
+    ).values_list(*CACHED_FIELDS).first()
+    if values is None:
+        raise Customer.DoesNotExist('Customer matching query does not exist.')
+    return values
+
+
+def _record(tier, hit):
+    metrics.inc('customer_cache_requests_total', tier=tier, result='hit' if hit else 'miss')
+
+
+def get_customer(customer_id):
+    """
+    Return the customer with `customer_id`, raising Customer.DoesNotExist.
+
+    The instance only has CACHED_FIELDS loaded; touching any other field
+    triggers a query.
+    """
+    key = _cache_key(customer_id)
+    values = _local.get(key)
+    _record('local', values is not None)
+    if values is None:
+        values = cache.get(key)
+        _record('shared', values is not None)
+        if values is None:
+            values = _load(customer_id)
+            cache.set(key, values, timeout=settings.CUSTOMER_CACHE_TTL)
+        _local.set(key, values)
+    return _to_instance(values)
+
+
+async def aget_customer(customer_id):
+    """Async variant of `get_customer`."""
+    key = _cache_key(customer_id)
+    values = _local.get(key)
+    _record('local', values is not None)
+    if values is None:
+        values = await cache.aget(key)
+        _record('shared', values is not None)
+        if values is None:
+            values = await sync_to_async(_load)(customer_id)
+            await cache.aset(key, values, timeout=settings.CUSTOMER_CACHE_TTL)
+        _local.set(key, values)
+    return _to_instance(values)
+
+
+def invalidate_customer(customer_id):
+    """
+    Drop the cached customer now and again once the surrounding transaction
+    commits, so a concurrent read can't re-cache the pre-commit row.
+    """
+    def drop():
+        key = _cache_key(customer_id)
+        _local.delete(key)
+        cache.delete(key)
+
+    drop()
+    transaction.on_commit(drop)
+
+
+@receiver(post_save, sender=Customer, dispatch_uid='customer_cache_post_save')
+@receiver(post_delete, sender=Customer, dispatch_uid='customer_cache_post_delete')
+def invalidate_on_customer_write(sender, instance, **kwargs):
+    invalidate_customer(instance.pk)
+
+
+@metrics.register_collector
+def customer_cache_hit_ratio():
+    """Hit ratio per tier since this process started."""
+    for tier in ('local', 'shared'):
+        hits = metrics.get_counter('customer_cache_requests_total', tier=tier, result='hit')
+        misses = metrics.get_counter('customer_cache_requests_total', tier=tier, result='miss')
+        if hits + misses:
+            yield 'customer_cache_hit_ratio', {'tier': tier}, round(hits / (hits + misses), 4)
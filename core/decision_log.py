@@ -0,0 +1,338 @@
+"""
+Buffered audit log of eligibility decisions.
+
+`record_decision` is called for every eligibility check and never writes to
+the database itself. Records go to one of two buffers
+(DECISION_LOG_BACKEND):
+
+- ``memory``: a per-process queue. Once it holds DECISION_LOG_BATCH_SIZE
+  records, or the oldest is DECISION_LOG_FLUSH_SECONDS old, the batch is
+  handed to the `write_eligibility_decisions` Celery task in one message.
+- ``redis``: a Redis stream shared by all processes, drained in batches by
+  the periodic `drain_decision_log` task through a consumer group, so a
+  crashed drain is picked up by the next one.
+
+Either way rows are inserted with `bulk_create`. When a buffer holds
+DECISION_LOG_MAX_BUFFER records (broker or database down), the
+DECISION_LOG_OVERFLOW policy applies: ``write_through`` inserts the record
+synchronously (slower requests, nothing lost), ``drop_oldest`` or
+``drop_newest`` discard records and count them in
+`decision_log_dropped_total`.
+
+On PostgreSQL the table is partitioned by month; `ensure_partitions` and
+`prune_decision_log` keep partitions ahead of time and drop expired ones.
+"""
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import EligibilityDecision
+from .partitions import create_partition, drop_partition, existing_partitions
+from .tasks import write_eligibility_decisions
+
+OVERFLOW_POLICIES = ('write_through', 'drop_oldest', 'drop_newest')
+
+STREAM_KEY = 'eligibility-decisions'
+CONSUMER_GROUP = 'decision-log-writers'
+# Stream entries read but not acknowledged for this long are reclaimed
+RECLAIM_IDLE_MS = 60000
+
+
+def build_record(source, customer, loan_amount, interest_rate, tenure, components, current_emis, result):
+    """A JSON-serialisable decision record for the buffer."""
+    is_eligible, message, corrected_rate, installment = result
+    return {
+        'decided_at': timezone.now().isoformat(),
+        'customer_id': str(customer.customer_id),
+        'source': source,
+        'loan_amount': str(loan_amount),
+        'interest_rate': str(interest_rate),
+        'tenure': tenure,
+        'monthly_salary': str(customer.monthly_salary),
+        'current_debt': str(customer.current_debt),
+        'approved_limit': str(customer.approved_limit),
+        'current_emis': str(current_emis or 0),
+        'credit_score': components['credit_score'],
+        'score_components': components,
+        'approved': is_eligible,
+        'corrected_interest_rate': None if corrected_rate is None else str(corrected_rate),
+        'monthly_installment': None if installment is None else str(installment),
+        'message': message or '',
+    }
+
+
+def write_decisions(records):
+    """Insert decision records with one bulk INSERT per 500 rows."""
+    EligibilityDecision.objects.bulk_create(
+        [EligibilityDecision(**record) for record in records],
+        batch_size=500,
+    )
+    metrics.inc('decision_log_written_total', len(records))
+    return len(records)
+
+
+def _hand_off(records):
+    write_eligibility_decisions.delay(records)
+
+
+class MemoryBuffer:
+    """Per-process buffer, handed off to Celery in batches."""
+
+    def __init__(self):
+        self._records = deque()
+        self._lock = threading.Lock()
+        self._oldest = None
+        self._flusher_pid = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, record):
+        write_now = False
+        with self._lock:
+            if len(self._records) >= settings.DECISION_LOG_MAX_BUFFER:
+                policy = settings.DECISION_LOG_OVERFLOW
+                if policy == 'drop_newest':
+                    metrics.inc('decision_log_dropped_total')
+                    return
+                if policy == 'drop_oldest':
+                    self._records.popleft()
+                    metrics.inc('decision_log_dropped_total')
+                else:
+                    write_now = True
+            if not write_now:
+                self._records.append(record)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            due = len(self._records) >= settings.DECISION_LOG_BATCH_SIZE or bool(
+                self._oldest is not None
+                and settings.DECISION_LOG_FLUSH_SECONDS
+                and time.monotonic() - self._oldest >= settings.DECISION_LOG_FLUSH_SECONDS
+            )
+
+        if write_now:
+            metrics.inc('decision_log_write_through_total')
+            write_decisions([record])
+        self._start_flusher()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Hand everything buffered to Celery; returns the number of records."""
+        with self._lock:
+            batch = list(self._records)
+            self._records.clear()
+            self._oldest = None
+        if not batch:
+            return 0
+
+        try:
+            _hand_off(batch)
+        except Exception:
+            # Broker unreachable: keep the records for the next attempt
+            with self._lock:
+                self._records.extendleft(reversed(batch))
+                self._oldest = time.monotonic()
+                if settings.DECISION_LOG_OVERFLOW == 'drop_oldest':
+                    while len(self._records) > settings.DECISION_LOG_MAX_BUFFER:
+                        self._records.popleft()
+                        metrics.inc('decision_log_dropped_total')
+            metrics.inc('decision_log_handoff_errors_total')
+            return 0
+        return len(batch)
+
+    def _start_flusher(self):
+        # One timer thread per process (threads do not survive a fork), so
+        # a quiet worker still hands off its records within the interval
+        interval = settings.DECISION_LOG_FLUSH_SECONDS
+        if not interval or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.flush()
+
+        threading.Thread(target=run, name='decision-log-flusher', daemon=True).start()
+
+
+class RedisStreamBuffer:
+    """Redis stream shared by every process, drained by `drain`."""
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(settings.DECISION_LOG_REDIS_URL)
+        return self._client
+
+    def append(self, record):
+        payload = {'record': json.dumps(record)}
+        limit = settings.DECISION_LOG_MAX_BUFFER
+        policy = settings.DECISION_LOG_OVERFLOW
+        try:
+            if policy == 'drop_oldest':
+                # Approximate trimming is O(1) amortised
+                self.client.xadd(STREAM_KEY, payload, maxlen=limit, approximate=True)
+                return
+            if self.client.xlen(STREAM_KEY) < limit:
+                self.client.xadd(STREAM_KEY, payload)
+                return
+        except Exception:
+            # Redis down: fall through to a synchronous write
+            metrics.inc('decision_log_buffer_errors_total')
+            policy = 'write_through'
+
+        if policy == 'drop_newest':
+            metrics.inc('decision_log_dropped_total')
+            return
+        metrics.inc('decision_log_write_through_total')
+        write_decisions([record])
+
+    def flush(self):
+        return 0
+
+    def _ensure_group(self):
+        import redis
+        try:
+            self.client.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+        except redis.ResponseError as exc:
+            if 'BUSYGROUP' not in str(exc):
+                raise
+
+    def drain(self, batch_size=1000, max_batches=100):
+        """Write buffered records to the database; returns the number written."""
+        self._ensure_group()
+        consumer = f'{socket.gethostname()}-{os.getpid()}'
+        # Take over entries a crashed drain read but never acknowledged
+        self.client.xautoclaim(
+            STREAM_KEY, CONSUMER_GROUP, consumer, min_idle_time=RECLAIM_IDLE_MS, count=batch_size
+        )
+
+        written = 0
+        for _ in range(max_batches):
+            # '0' returns this consumer's pending entries, '>' new ones
+            messages = []
+            for start in ('0', '>'):
+                response = self.client.xreadgroup(
+                    CONSUMER_GROUP, consumer, {STREAM_KEY: start}, count=batch_size
+                )
+                messages = response[0][1] if response else []
+                if messages:
+                    break
+            if not messages:
+                break
+
+            ids = [message_id for message_id, _ in messages]
+            # Entries trimmed after delivery come back without fields
+            records = [json.loads(fields[b'record']) for _, fields in messages if fields]
+            with transaction.atomic():
+                written += write_decisions(records)
+            self.client.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+            self.client.xdel(STREAM_KEY, *ids)
+        return written
+
+
+_buffers = {}
+
+
+def get_buffer():
+    if settings.DECISION_LOG_OVERFLOW not in OVERFLOW_POLICIES:
+        raise ImproperlyConfigured(
+            f"DECISION_LOG_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}"
+        )
+    backend = settings.DECISION_LOG_BACKEND
+    if backend not in _buffers:
+        _buffers[backend] = RedisStreamBuffer() if backend == 'redis' else MemoryBuffer()
+    return _buffers[backend]
+
+
+def record_decision(record):
+    """Buffer one decision record (see `build_record`)."""
+    metrics.inc('decision_log_recorded_total')
+    get_buffer().append(record)
+
+
+def drain(batch_size=1000):
+    """Flush this process's memory buffer or drain the shared stream."""
+    buffer = get_buffer()
+    if isinstance(buffer, RedisStreamBuffer):
+        return buffer.drain(batch_size=batch_size)
+    return buffer.flush()
+
+
+@atexit.register
+def _flush_on_exit():
+    buffer = _buffers.get('memory')
+    if buffer is not None:
+        buffer.flush()
+
+
+def _partition_name(month):
+    return f'{EligibilityDecision._meta.db_table}_p{month:%Y%m}'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(months_ahead=2, today=None):
+    """
+    Create the monthly partitions from this month to `months_ahead` months
+    out. No-op outside PostgreSQL. Returns the partitions created.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    table = EligibilityDecision._meta.db_table
+    existing = existing_partitions(table)
+    first = (today or timezone.now().date()).replace(day=1)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(first, offset)
+        name = _partition_name(month)
+        if name not in existing:
+            create_partition(table, name, 'decided_at', month.isoformat(), _add_months(month, 1).isoformat())
+            created.append(name)
+    return created
+
+
+def prune_decision_log(retention_months, today=None):
+    """
+    Remove decisions older than `retention_months` whole months.
+
+    On PostgreSQL expired monthly partitions are detached and dropped,
+    which is instant regardless of size; elsewhere rows are deleted.
+    Returns the partitions dropped (or the number of rows deleted).
+    """
+    cutoff = _add_months((today or timezone.now().date()).replace(day=1), -retention_months)
+    if connection.vendor != 'postgresql':
+        deleted, _ = EligibilityDecision.objects.filter(decided_at__date__lt=cutoff).delete()
+        return deleted
+
+    table = EligibilityDecision._meta.db_table
+    dropped = []
+    for name in sorted(existing_partitions(table)):
+        suffix = name.rsplit('_p', 1)[-1]
+        if suffix.isdigit() and date(int(suffix[:4]), int(suffix[4:]), 1) < cutoff:
+            drop_partition(table, name)
+            dropped.append(name)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(table + "_default")} WHERE decided_at < %s', [cutoff.isoformat()])
+    return dropped
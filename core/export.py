@@ -0,0 +1,140 @@
+"""
+Streaming exports of the customer and loan tables.
+
+Rows are read with `values_list().iterator(chunk_size=...)` (a server-side
+cursor on PostgreSQL) and encoded one chunk at a time, so memory use does
+not depend on table size and the first bytes are ready as soon as the
+first chunk is fetched. Used by ExportView and the `export_data` command.
+
+Under ASGI a sync iterator given to StreamingHttpResponse is read to the
+end before the first byte is sent, so ExportView hands ASGI requests
+`astream_export` instead: the same chunks, each produced by a sync_to_async
+call on the thread that owns the ORM connection.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, Loan
+
+EXPORT_FIELDS = {
+    'customers': (
+        Customer,
+        ('customer_id', 'first_name', 'last_name', 'phone_number', 'age',
+         'monthly_salary', 'approved_limit', 'current_debt', 'created_at', 'updated_at'),
+    ),
+    'loans': (
+        Loan,
+        ('loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate',
+         'monthly_installment', 'emis_paid_on_time', 'start_date', 'end_date',
+         'status', 'created_at', 'updated_at'),
+    ),
+}
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def export_queryset(kind, status=None, created_from=None, created_to=None,
+                    start_date_from=None, start_date_to=None):
+    """
+    The filtered rows to export as a values_list queryset.
+
+    Date filters are inclusive. `status` and the start_date filters only
+    apply to loans.
+    """
+    model, fields = EXPORT_FIELDS[kind]
+    queryset = model.objects.order_by()
+    if created_from:
+        queryset = queryset.filter(created_at__date__gte=created_from)
+    if created_to:
+        queryset = queryset.filter(created_at__date__lte=created_to)
+    if kind == 'loans':
+        if status:
+            queryset = queryset.filter(status=status)
+        if start_date_from:
+            queryset = queryset.filter(start_date__gte=start_date_from)
+        if start_date_to:
+            queryset = queryset.filter(start_date__lte=start_date_to)
+    return queryset.values_list(*fields)
+
+
+def _plain(value):
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunks(fields, rows, chunk_size):
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(fields, map(_plain, row)))))
+        if len(buffer) >= chunk_size:
+            yield ('\n'.join(buffer) + '\n').encode()
+            buffer = []
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode()
+
+
+def _csv_chunks(fields, rows, chunk_size):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    # Send the header before the first query returns
+    yield out.getvalue().encode()
+    out.seek(0)
+    out.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        count += 1
+        if count % chunk_size == 0:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+def _gzip(chunks):
+    # wbits=31 writes a gzip container; flushing per chunk keeps the
+    # download streaming instead of buffering until the end
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(kind, fmt='ndjson', compress=False, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """Yield the encoded export of `kind` ('customers' or 'loans') as bytes chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+    _, fields = EXPORT_FIELDS[kind]
+    rows = export_queryset(kind, **filters).iterator(chunk_size=chunk_size)
+    encoder = _ndjson_chunks if fmt == 'ndjson' else _csv_chunks
+    chunks = encoder(fields, rows, chunk_size)
+    return _gzip(chunks) if compress else chunks
+
+
+async def astream_export(kind, fmt='ndjson', compress=False, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+    """Async iterator over `stream_export`, for responses served by ASGI workers."""
+    chunks = stream_export(kind, fmt, compress=compress, chunk_size=chunk_size, **filters)
+    # Thread-sensitive, so every chunk is read on the same connection and cursor
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
@@ -0,0 +1,189 @@
+"""
+Set-based maintenance jobs over the loan book.
+
+These run from Celery (see core.tasks) and touch many rows at once, so they
+work in chunks and push the arithmetic into the database instead of
+loading and saving model instances one by one.
+"""
+import heapq
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics, outbox
+from .customer_cache import invalidate_customer
+from .models import Customer, Loan
+from .portfolio import apply_loan_deltas, mark_scores_stale
+
+
+def active_debt_subquery(customer_ref=OuterRef('pk')):
+    """Sum of approved loan amounts for the customer referenced by `customer_ref`."""
+    return Coalesce(
+        Subquery(
+            Loan.objects.filter(customer=customer_ref, status='APPROVED')
+            .order_by()
+            .values('customer')
+            .annotate(total=Sum('loan_amount'))
+            .values('total')
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def recompute_current_debt(customer_ids):
+    """
+    Set current_debt to the sum of each customer's approved loans.
+
+    The customer rows are locked first, in primary key order, so a
+    concurrent create-loan either commits before the recompute reads the
+    loan table or waits and applies its increment on top of the new value.
+    Returns the number of customers updated.
+    """
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return 0
+
+    with transaction.atomic():
+        list(
+            Customer.objects.select_for_update()
+            .filter(pk__in=customer_ids)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        updated = Customer.objects.filter(pk__in=customer_ids).update(
+            current_debt=active_debt_subquery(),
+            updated_at=timezone.now(),
+        )
+        for customer_id in customer_ids:
+            invalidate_customer(customer_id)
+    return updated
+
+
+def closable_loans(today=None):
+    """Approved loans that reached their end date or have every EMI paid."""
+    today = today or timezone.now().date()
+    return Loan.objects.filter(status='APPROVED').filter(
+        Q(end_date__lt=today) | Q(emis_paid_on_time__gte=F('tenure'))
+    )
+
+
+def close_matured_loans(chunk_size=1000, today=None):
+    """
+    Move matured or fully paid loans to CLOSED, `chunk_size` loans per
+    transaction, then recompute current_debt for the affected customers.
+    The closed loans are taken off the portfolio counters, and get a
+    loan.status_changed outbox event, in the same transaction.
+
+    Returns a summary with the number of loans closed and customers updated.
+    """
+    closed = 0
+    customers_updated = 0
+    while True:
+        chunk = list(
+            closable_loans(today).order_by('pk').values_list('pk', 'customer_id')[:chunk_size]
+        )
+        if not chunk:
+            break
+
+        loan_ids = [loan_id for loan_id, _ in chunk]
+        customer_ids = sorted({customer_id for _, customer_id in chunk})
+        with transaction.atomic():
+            # Re-check the status under a lock so a loan changed since the
+            # select is skipped and never counted off the portfolio twice
+            closing = list(
+                Loan.objects.select_for_update()
+                .filter(pk__in=loan_ids, status='APPROVED')
+                .order_by('pk')
+                .values_list('pk', 'customer_id', 'loan_amount', 'monthly_installment', 'tenure')
+            )
+            closed += Loan.objects.filter(pk__in=[row[0] for row in closing]).update(
+                status='CLOSED',
+                updated_at=timezone.now(),
+            )
+            apply_loan_deltas([row[2:] for row in closing], sign=-1)
+            mark_scores_stale(customer_ids)
+            customers_updated += recompute_current_debt(customer_ids)
+            # The recompute holds the customers' row locks
+            outbox.record_events(
+                outbox.event('loan.status_changed', 'loan', loan_id, customer_id,
+                             previous_status='APPROVED', status='CLOSED')
+                for loan_id, customer_id, *_ in closing
+            )
+
+    metrics.inc('loans_closed_total', closed)
+    return {'loans_closed': closed, 'customers_updated': customers_updated}
+
+
+def debt_drift_queryset():
+    """
+    Customers whose current_debt differs from the sum of their approved
+    loans, as (customer_id, current_debt, expected_debt) rows.
+
+    One grouped query (LEFT JOIN + GROUP BY ... HAVING) over both tables.
+    """
+    expected = Coalesce(
+        Sum('loans__loan_amount', filter=Q(loans__status='APPROVED')),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return (
+        Customer.objects.order_by()
+        .annotate(expected_debt=expected)
+        .exclude(current_debt=F('expected_debt'))
+        .values_list('pk', 'current_debt', 'expected_debt')
+    )
+
+
+def reconcile_current_debt(batch_size=1000, chunk_size=5000, dry_run=False, sample_size=20):
+    """
+    Find and repair current_debt drift across all customers.
+
+    Mismatches are streamed with a server-side cursor (`iterator()`), so
+    memory stays flat on large tables, and repaired `batch_size` customers
+    at a time through `recompute_current_debt`, which re-derives the value
+    under a row lock. Returns a drift report.
+    """
+    report = {
+        'mismatched': 0,
+        'over_stated': 0,
+        'under_stated': 0,
+        'total_absolute_drift': Decimal('0'),
+        'repaired': 0,
+        'dry_run': dry_run,
+        'largest_drifts': [],
+    }
+    largest = []
+    batch = []
+
+    for customer_id, current_debt, expected_debt in debt_drift_queryset().iterator(chunk_size=chunk_size):
+        drift = current_debt - expected_debt
+        report['mismatched'] += 1
+        report['over_stated' if drift > 0 else 'under_stated'] += 1
+        report['total_absolute_drift'] += abs(drift)
+
+        entry = (abs(drift), str(customer_id), str(current_debt), str(expected_debt))
+        if len(largest) < sample_size:
+            heapq.heappush(largest, entry)
+        elif entry > largest[0]:
+            heapq.heapreplace(largest, entry)
+
+        if not dry_run:
+            batch.append(customer_id)
+            if len(batch) >= batch_size:
+                report['repaired'] += recompute_current_debt(batch)
+                batch = []
+
+    if batch:
+        report['repaired'] += recompute_current_debt(batch)
+
+    report['total_absolute_drift'] = str(report['total_absolute_drift'])
+    report['largest_drifts'] = [
+        {'customer_id': customer_id, 'current_debt': current, 'expected_debt': expected}
+        for _, customer_id, current, expected in sorted(largest, reverse=True)
+    ]
+    metrics.set_gauge('current_debt_drift_customers', report['mismatched'])
+    return report
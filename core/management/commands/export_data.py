@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import EXPORT_FIELDS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream the customer or loan table as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORT_FIELDS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', help='Output file (default: stdout)')
+        parser.add_argument('--status', help='Only loans with this status')
+        parser.add_argument('--created-from', help='Rows created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--created-to', help='Rows created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--start-date-from', help='Loans starting on or after this date')
+        parser.add_argument('--start-date-to', help='Loans starting on or before this date')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        if options['kind'] != 'loans' and (options['status'] or options['start_date_from'] or options['start_date_to']):
+            raise CommandError('--status and --start-date-* only apply to loans')
+
+        chunks = stream_export(
+            options['kind'],
+            options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+            status=options['status'],
+            created_from=options['created_from'],
+            created_to=options['created_to'],
+            start_date_from=options['start_date_from'],
+            start_date_to=options['start_date_to'],
+        )
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.portfolio import rebuild_portfolio, refresh_stale_credit_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute the portfolio summary counters and credit score bands from the base tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-scores',
+            action='store_true',
+            help='Only rebuild the counters, leave stale credit scores for the scheduled refresh'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Credit scores recomputed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_portfolio()
+        self.stdout.write(f'{rows} counter rows rebuilt')
+
+        if not options['skip_scores']:
+            result = refresh_stale_credit_scores(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"{result['refreshed']} credit scores refreshed, {result['band_changes']} changed band"
+            )
+        self.stdout.write(self.style.SUCCESS('Portfolio counters rebuilt'))
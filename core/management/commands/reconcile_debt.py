@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.maintenance import reconcile_current_debt
+
+
+class Command(BaseCommand):
+    help = 'Recompute Customer.current_debt from approved loans and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report mismatches, do not repair them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Customers repaired per transaction'
+        )
+        parser.add_argument(
+            '--report',
+            help='Also write the JSON drift report to this file'
+        )
+
+    def handle(self, *args, **options):
+        report = reconcile_current_debt(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        output = json.dumps(report, indent=2)
+
+        if options['report']:
+            with open(options['report'], 'w') as fh:
+                fh.write(output)
+
+        self.stdout.write(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['mismatched']} customers drifted, {report['repaired']} repaired"
+        ))
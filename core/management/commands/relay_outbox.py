@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import relay_batch, relay_pending
+
+
+class Command(BaseCommand):
+    help = 'Publish outbox events to the change stream (see core.outbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Publish the current backlog and exit'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX_RELAY_BATCH_SIZE,
+            help='Events published per transaction'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.OUTBOX_RELAY_INTERVAL_SECONDS,
+            help='Seconds to sleep when the backlog is empty'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['once']:
+            published = relay_pending(batch_size)
+            self.stdout.write(self.style.SUCCESS(f'{published} events published'))
+            return
+
+        self.stdout.write(f"Relaying outbox events to {settings.OUTBOX_BACKEND} stream {settings.OUTBOX_STREAM}")
+        while True:
+            try:
+                published = relay_batch(batch_size)
+            except Exception as exc:
+                # Stream or database unavailable: the batch stays unpublished
+                self.stderr.write(f'Relay failed: {exc}')
+                time.sleep(options['interval'])
+                continue
+            # A full batch means more are waiting
+            if published < batch_size:
+                time.sleep(options['interval'])
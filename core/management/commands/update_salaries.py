@@ -0,0 +1,42 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.payroll import APPLY_CHUNK_SIZE, update_salaries
+
+
+class Command(BaseCommand):
+    help = 'Update salaries and approved limits from a payroll file (CSV or Excel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'payroll_file',
+            help='File with phone_number and monthly_salary columns'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=APPLY_CHUNK_SIZE,
+            help='Staged rows applied per UPDATE and transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many customers would change'
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['payroll_file']):
+            raise CommandError(f"Payroll file not found: {options['payroll_file']}")
+
+        summary = update_salaries(
+            options['payroll_file'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run']
+        )
+        self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['customers_updated']} customers {'would be ' if summary['dry_run'] else ''}updated, "
+            f"{summary['unknown_customers']} unknown phone numbers, {summary['invalid']} invalid rows"
+        ))
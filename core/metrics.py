@@ -0,0 +1,178 @@
+"""
+Lightweight in-process instrumentation.
+
+Counters, gauges and histograms live in the memory of the process that
+records them and are rendered in the Prometheus text format by MetricsView
+(`/api/metrics/`). Values owned by other components - connection pools,
+queue depths - are read at scrape time through collectors registered with
+`register_collector`.
+
+Each gunicorn worker keeps its own registry, so a scrape reflects the worker
+that answered it; scrape each worker or aggregate with `sum by` downstream.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+# Seconds; covers sub-millisecond cache hits up to multi-second DB calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = {}
+_collectors = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter."""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to an absolute value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record one observation (usually seconds) in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                'buckets': tuple(buckets),
+                'counts': [0] * len(buckets),
+                'sum': 0.0,
+                'count': 0,
+            }
+        index = bisect.bisect_left(histogram['buckets'], value)
+        if index < len(histogram['counts']):
+            histogram['counts'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def register_collector(collector):
+    """
+    Register a callable returning an iterable of (name, labels, value) tuples.
+
+    Rows are gauges; a cumulative value read from another component (a
+    `_total`) is yielded as (name, labels, value, 'counter') instead, so rate()
+    treats a drop as a reset, and the `_bucket`/`_sum`/`_count` rows of a
+    histogram with 'histogram'. Collectors are called on every scrape, so they
+    should be cheap. Returns the collector so it can be used as a decorator.
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+def get_counter(name, **labels):
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def collect():
+    """
+    Snapshot of every metric as a list of (type, name, labels, value) rows.
+
+    Histograms expand into cumulative `_bucket`, `_sum` and `_count` rows.
+    """
+    rows = []
+    with _lock:
+        for (name, labels), value in _counters.items():
+            rows.append(('counter', name, dict(labels), value))
+        for (name, labels), value in _gauges.items():
+            rows.append(('gauge', name, dict(labels), value))
+        for (name, labels), histogram in _histograms.items():
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                rows.append(('histogram', f'{name}_bucket', dict(labels, le=str(bound)), cumulative))
+            rows.append(('histogram', f'{name}_bucket', dict(labels, le='+Inf'), histogram['count']))
+            rows.append(('histogram', f'{name}_sum', dict(labels), histogram['sum']))
+            rows.append(('histogram', f'{name}_count', dict(labels), histogram['count']))
+    for collector in list(_collectors):
+        try:
+            for name, labels, value, *metric_type in collector():
+                rows.append((metric_type[0] if metric_type else 'gauge', name, dict(labels), value))
+        except Exception:
+            # A broken collector must never take the metrics endpoint down
+            inc('metrics_collector_errors_total', collector=getattr(collector, '__name__', 'unknown'))
+    return rows
+
+
+def _escape(value):
+    """A label value escaped as the text exposition format requires."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _family(metric_type, name):
+    # Histogram rows share one family name without the _bucket/_sum/_count suffix
+    return name.rsplit('_', 1)[0] if metric_type == 'histogram' else name
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    declared = set()
+    # Sorted by family and label set only: the sort is stable, so a
+    # histogram's buckets stay in bound order, followed by _sum and _count
+    rows = sorted(collect(), key=lambda row: (
+        _family(row[0], row[1]), sorted((key, str(val)) for key, val in row[2].items() if key != 'le')
+    ))
+    for metric_type, name, labels, value in rows:
+        family = _family(metric_type, name)
+        if family not in declared:
+            lines.append(f'# TYPE {family} {metric_type}')
+            declared.add(family)
+        if labels:
+            rendered = ','.join(f'{key}="{_escape(val)}"' for key, val in sorted(labels.items()))
+            lines.append(f'{name}{{{rendered}}} {value}')
+        else:
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear recorded values (collectors stay registered). Used by tests."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+@register_collector
+def database_pool_metrics():
+    """
+    Utilization, wait time and checkout counts of the psycopg connection pools.
+
+    Only pools that already exist in this process are reported; reading the
+    `pool` property would otherwise open a new pool just to scrape it.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        pools = getattr(type(connections[alias]), '_connection_pools', None)
+        pool = pools.get(alias) if pools else None
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+        yield 'db_pool_size', {'alias': alias}, stats.get('pool_size', 0)
+        yield 'db_pool_max_size', {'alias': alias}, stats.get('pool_max', pool.max_size)
+        yield 'db_pool_in_use', {'alias': alias}, in_use
+        yield 'db_pool_utilization', {'alias': alias}, round(in_use / pool.max_size, 4) if pool.max_size else 0
+        yield 'db_pool_requests_waiting', {'alias': alias}, stats.get('requests_waiting', 0)
+        # Cumulative since the pool opened
+        yield 'db_pool_checkouts_total', {'alias': alias}, stats.get('requests_num', 0), 'counter'
+        yield 'db_pool_wait_seconds_total', {'alias': alias}, stats.get('requests_wait_ms', 0) / 1000, 'counter'
+        yield 'db_pool_checkout_errors_total', {'alias': alias}, stats.get('requests_errors', 0), 'counter'
+        yield 'db_pool_connections_opened_total', {'alias': alias}, stats.get('connections_num', 0), 'counter'
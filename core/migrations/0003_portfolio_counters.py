@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_loanpayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditScore',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_score', serialize=False, to='core.customer')),
+                ('score', models.FloatField(default=50)),
+                ('band', models.CharField(default='31-50', max_length=5)),
+                ('stale', models.BooleanField(default=True)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('stale', True)), fields=['customer'], name='creditscore_stale_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PortfolioBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=16)),
+                ('bucket', models.CharField(max_length=16)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('loan_count', models.BigIntegerField(default=0)),
+                ('outstanding_principal', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('monthly_emi', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('customer_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'bucket', 'shard'), name='portfoliobucket_unique_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_simulationrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenure', models.PositiveIntegerField(help_text='Loan tenure in months')),
+                ('max_principal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('rate_floor', models.DecimalField(blank=True, decimal_places=2, help_text="Minimum rate for the customer's credit score band; null when not eligible", max_digits=5, null=True)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('monthly_installment', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['tenure'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['updated_at'], name='customer_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customercreditscore',
+            index=models.Index(fields=['computed_at'], name='creditscore_computed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['updated_at'], name='loan_updated_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='loanoffer',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='core.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='loanoffer',
+            index=models.Index(fields=['computed_at'], name='loanoffer_computed_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='loanoffer',
+            constraint=models.UniqueConstraint(fields=('customer', 'tenure'), name='loanoffer_customer_tenure'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:02
+
+from datetime import date
+
+from django.db import migrations, models
+
+TABLE = 'core_eligibilitydecision'
+
+
+def _month(today, offset):
+    index = today.year * 12 + today.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_by_month(apps, schema_editor):
+    """
+    On PostgreSQL, recreate the table as range-partitioned by decided_at,
+    with a default partition and partitions for this month and the next two.
+    The primary key has to include the partition key, so it becomes
+    (id, decided_at); ids still come from one sequence.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    today = date.today()
+    statements = [
+        f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old',
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS) PARTITION BY RANGE (decided_at)',
+        f'DROP TABLE {TABLE}_old',
+        f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id',
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')",
+        f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, decided_at)',
+        f'CREATE INDEX decision_customer_idx ON {TABLE} (customer_id, decided_at)',
+        f'CREATE INDEX decision_decided_at_idx ON {TABLE} (decided_at)',
+        f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT',
+    ]
+    for offset in range(3):
+        start, end = _month(today, offset), _month(today, offset + 1)
+        statements.append(
+            f"CREATE TABLE {TABLE}_p{start:%Y%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_loan_offers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EligibilityDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decided_at', models.DateTimeField()),
+                ('customer_id', models.UUIDField()),
+                ('source', models.CharField(max_length=32)),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tenure', models.PositiveIntegerField()),
+                ('monthly_salary', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('current_debt', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('approved_limit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('current_emis', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('credit_score', models.FloatField()),
+                ('score_components', models.JSONField(default=dict)),
+                ('approved', models.BooleanField()),
+                ('corrected_interest_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('monthly_installment', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('message', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['-decided_at'],
+                'indexes': [models.Index(fields=['customer_id', 'decided_at'], name='decision_customer_idx'), models.Index(fields=['decided_at'], name='decision_decided_at_idx')],
+            },
+        ),
+        migrations.RunPython(partition_by_month, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = 'core_archivedloan'
+
+
+def partition_by_year(apps, schema_editor):
+    """
+    On PostgreSQL, recreate the archive as range-partitioned by end_date,
+    with only a default partition; yearly partitions are created by
+    core.archive as loans are moved. The primary key has to include the
+    partition key, so it becomes (loan_id, end_date).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    statements = [
+        f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old',
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE (end_date)',
+        f'DROP TABLE {TABLE}_old',
+        f'ALTER TABLE {TABLE} ADD PRIMARY KEY (loan_id, end_date)',
+        f'CREATE INDEX archivedloan_customer_idx ON {TABLE} (customer_id)',
+        f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT',
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_eligibility_decision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoanHistory',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_history', serialize=False, to='core.customer')),
+                ('total_loans', models.PositiveIntegerField(default=0)),
+                ('total_emis', models.PositiveBigIntegerField(default=0)),
+                ('emis_paid_on_time', models.PositiveBigIntegerField(default=0)),
+                ('total_approved_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tenure', models.PositiveIntegerField(help_text='Loan tenure in months')),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('monthly_installment', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('emis_paid_on_time', models.PositiveIntegerField(default=0)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('CLOSED', 'Closed')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='core.customer')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(partition_by_year, migrations.RunPython.noop),
+    ]
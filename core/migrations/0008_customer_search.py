@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:23
+
+from django.db import migrations, models
+
+TABLE = 'core_customer'
+
+NAME_INDEX = models.Index(fields=['last_name', 'first_name', 'customer_id'], name='customer_name_idx')
+
+# Match the UPPER(...) LIKE that `icontains` compiles to on PostgreSQL
+TRIGRAM_INDEXES = {
+    'customer_first_name_trgm_idx': 'UPPER(first_name::text) gin_trgm_ops',
+    'customer_last_name_trgm_idx': 'UPPER(last_name::text) gin_trgm_ops',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    The name search indexes (core.search). On PostgreSQL they are built
+    CONCURRENTLY, so registrations and loan writes continue while a large
+    table is indexed. The phone prefix search needs no new index: Django
+    already created a varchar_pattern_ops index with the unique one.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_index(apps.get_model('core', 'Customer'), NAME_INDEX)
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {NAME_INDEX.name} '
+        f'ON {TABLE} (last_name, first_name, customer_id)'
+    )
+    for name, expression in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {TABLE} USING gin ({expression})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_index(apps.get_model('core', 'Customer'), NAME_INDEX)
+        return
+    for name in (NAME_INDEX.name, *TRIGRAM_INDEXES):
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_loan_archive'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='customer', index=NAME_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+    ]
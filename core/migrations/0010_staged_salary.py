@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagedSalary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.UUIDField()),
+                ('phone_number', models.CharField(max_length=15)),
+                ('monthly_salary', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('approved_limit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('customer_id', models.UUIDField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('batch_id', 'phone_number'), name='staged_salary_batch_phone_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+from django.db.models import Case, CharField, Count, Sum, Value, When
+
+# Copied from core.portfolio as it stood when the counters were added, so
+# later changes there cannot change what this migration does
+BOOK = ('book', 'all')
+NEW_CUSTOMER_BAND = '31-50'
+TENURE_BUCKET = Case(
+    When(tenure__gt=0, tenure__lte=12, then=Value('<=12')),
+    When(tenure__gt=12, tenure__lte=36, then=Value('13-36')),
+    When(tenure__gt=36, tenure__lte=60, then=Value('37-60')),
+    When(tenure__gt=60, tenure__lte=120, then=Value('61-120')),
+    default=Value('>120'),
+    output_field=CharField(),
+)
+
+
+def backfill_portfolio(apps, schema_editor):
+    """
+    Fill the portfolio counters added in 0003 from the loans and customers
+    that existed before them, as `rebuild_portfolio` does (with the
+    historical models). Skipped when counters already exist: the signal
+    handlers or a manual `rebuild_portfolio` keep them from then on.
+    """
+    Customer = apps.get_model('core', 'Customer')
+    CustomerCreditScore = apps.get_model('core', 'CustomerCreditScore')
+    Loan = apps.get_model('core', 'Loan')
+    PortfolioBucket = apps.get_model('core', 'PortfolioBucket')
+
+    if PortfolioBucket.objects.exists():
+        return
+
+    missing = Customer.objects.filter(credit_score__isnull=True).values_list('pk', flat=True)
+    CustomerCreditScore.objects.bulk_create(
+        [CustomerCreditScore(customer_id=pk, band=NEW_CUSTOMER_BAND, stale=True) for pk in missing.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    rows = {}
+
+    def row(dimension, bucket):
+        return rows.setdefault(
+            (dimension, bucket), PortfolioBucket(dimension=dimension, bucket=bucket, shard=0)
+        )
+
+    loans = (
+        Loan.objects.filter(status='APPROVED')
+        .order_by()
+        .annotate(bucket=TENURE_BUCKET)
+        .values('bucket')
+        .annotate(loans=Count('pk'), principal=Sum('loan_amount'), emi=Sum('monthly_installment'))
+    )
+    book = row(*BOOK)
+    for entry in loans:
+        bucket = row('tenure', entry['bucket'])
+        bucket.loan_count = entry['loans']
+        bucket.outstanding_principal = entry['principal']
+        bucket.monthly_emi = entry['emi']
+        book.loan_count += entry['loans']
+        book.outstanding_principal += entry['principal']
+        book.monthly_emi += entry['emi']
+
+    bands = CustomerCreditScore.objects.order_by().values('band').annotate(customers=Count('pk'))
+    for entry in bands:
+        row('score_band', entry['band']).customer_count = entry['customers']
+        book.customer_count += entry['customers']
+
+    if book.loan_count or book.customer_count:
+        PortfolioBucket.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_staged_salary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_portfolio, migrations.RunPython.noop),
+    ]
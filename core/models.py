@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
 
@@ -31,10 +32,21 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental jobs look up rows changed since their last run
+            models.Index(fields=['updated_at'], name='customer_updated_at_idx'),
+            # Name search order and keyset pagination (core.search)
+            models.Index(fields=['last_name', 'first_name', 'customer_id'], name='customer_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.customer_id})"
 
+    @staticmethod
+    def approved_limit_for(monthly_salary):
+        """36 times the monthly salary, rounded to the nearest lakh (100,000)."""
+        return round(36 * monthly_salary, -5)
+
     def save(self, *args, **kwargs):
         # If this is a new customer, calculate approved limit
         if not self.approved_limit:
@@ -93,6 +105,10 @@ class Loan(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Incremental jobs look up rows changed since their last run
+            models.Index(fields=['updated_at'], name='loan_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"Loan {self.loan_id} - {self.customer.first_name} {self.customer.last_name}"
@@ -115,3 +131,323 @@ class Loan(models.Model):
             self.monthly_installment = round(monthly_payment, 2)
 
         super().save(*args, **kwargs)
+
+
+class LoanPayment(models.Model):
+    """
+    One EMI payment event, deduplicated by `payment_reference`.
+
+    Events are stored as they arrive and folded into `Loan.emis_paid_on_time`
+    in batches (see core.payments); `applied` marks the ones already counted.
+    """
+    payment_reference = models.CharField(max_length=64, unique=True)
+    loan = models.ForeignKey(
+        Loan,
+        on_delete=models.CASCADE,
+        related_name='payments'
+    )
+    paid_on_time = models.BooleanField(default=True)
+    paid_at = models.DateTimeField()
+    applied = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Only the unapplied backlog is scanned by the batch consumer
+            models.Index(
+                fields=['created_at'],
+                name='loanpayment_pending_idx',
+                condition=models.Q(applied=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.payment_reference} for loan {self.loan_id}"
+
+
+class CustomerCreditScore(models.Model):
+    """
+    Last computed credit score of a customer and its band.
+
+    Loan writes only flag the row `stale`; scores are recomputed in batches
+    by core.portfolio.refresh_stale_credit_scores, which also moves the
+    customer between the band counters of the portfolio summary.
+    """
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='credit_score'
+    )
+    score = models.FloatField(default=50)
+    band = models.CharField(max_length=5, default='31-50')
+    stale = models.BooleanField(default=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['customer'],
+                name='creditscore_stale_idx',
+                condition=models.Q(stale=True),
+            ),
+            models.Index(fields=['computed_at'], name='creditscore_computed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Score {self.score} ({self.band}) for customer {self.customer_id}"
+
+
+class PortfolioBucket(models.Model):
+    """
+    One shard of a running portfolio total (see core.portfolio).
+
+    Each (dimension, bucket) total is split over several shard rows so that
+    concurrent loan writes rarely wait on the same row lock; readers sum
+    the shards.
+    """
+    dimension = models.CharField(max_length=16)
+    bucket = models.CharField(max_length=16)
+    shard = models.PositiveSmallIntegerField(default=0)
+    loan_count = models.BigIntegerField(default=0)
+    outstanding_principal = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    monthly_emi = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    customer_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'bucket', 'shard'],
+                name='portfoliobucket_unique_shard',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.bucket} [{self.shard}]"
+
+
+class SimulationRun(models.Model):
+    """
+    One run of a portfolio simulation, with its parameters and result summary.
+
+    Written by the Celery tasks in core.tasks; `summary` holds the aggregate
+    results only, never per-path or per-loan data.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=32)
+    parameters = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='RUNNING'
+    )
+    summary = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} run {self.pk} ({self.status})"
+
+
+class LoanOffer(models.Model):
+    """
+    Pre-approved offer for a customer at one standard tenure.
+
+    Rebuilt by core.offers.refresh_loan_offers; `max_principal` is the
+    largest amount check-eligibility would approve at `interest_rate`
+    when the offer was computed (0 when the customer is not eligible).
+    """
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='offers'
+    )
+    tenure = models.PositiveIntegerField(help_text="Loan tenure in months")
+    max_principal = models.DecimalField(max_digits=12, decimal_places=2)
+    rate_floor = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Minimum rate for the customer's credit score band; null when not eligible"
+    )
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    monthly_installment = models.DecimalField(max_digits=12, decimal_places=2)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['tenure']
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'tenure'], name='loanoffer_customer_tenure'),
+        ]
+        indexes = [
+            models.Index(fields=['computed_at'], name='loanoffer_computed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Offer {self.max_principal} over {self.tenure} months for customer {self.customer_id}"
+
+
+class EligibilityDecision(models.Model):
+    """
+    Audit record of one eligibility decision and the inputs behind it.
+
+    Written in batches from the buffer in core.decision_log, never in the
+    request path. On PostgreSQL the table is range-partitioned by month on
+    `decided_at` (see migration 0006), so the primary key is (id,
+    decided_at) there. `customer_id` is a plain column, not a foreign key,
+    so the log outlives deleted customers.
+    """
+    decided_at = models.DateTimeField()
+    customer_id = models.UUIDField()
+    source = models.CharField(max_length=32)
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.PositiveIntegerField()
+    monthly_salary = models.DecimalField(max_digits=12, decimal_places=2)
+    current_debt = models.DecimalField(max_digits=12, decimal_places=2)
+    approved_limit = models.DecimalField(max_digits=12, decimal_places=2)
+    current_emis = models.DecimalField(max_digits=12, decimal_places=2)
+    credit_score = models.FloatField()
+    score_components = models.JSONField(default=dict)
+    approved = models.BooleanField()
+    corrected_interest_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    monthly_installment = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-decided_at']
+        indexes = [
+            models.Index(fields=['customer_id', 'decided_at'], name='decision_customer_idx'),
+            models.Index(fields=['decided_at'], name='decision_decided_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Decision for customer {self.customer_id} at {self.decided_at}"
+
+
+class ArchivedLoan(models.Model):
+    """
+    A closed or rejected loan moved out of `Loan` by core.archive.
+
+    Columns are copied as they were when the loan was archived. On
+    PostgreSQL the table is range-partitioned by year on `end_date` (see
+    migration 0007), so the primary key is (loan_id, end_date) there.
+    `customer` has no database constraint so the archive can be loaded
+    without touching the customer table's locks.
+    """
+    loan_id = models.UUIDField(primary_key=True, editable=False)
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='archived_loans'
+    )
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    tenure = models.PositiveIntegerField(help_text="Loan tenure in months")
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    monthly_installment = models.DecimalField(max_digits=12, decimal_places=2)
+    emis_paid_on_time = models.PositiveIntegerField(default=0)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=10, choices=Loan.LOAN_STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived loan {self.loan_id} ({self.status})"
+
+
+class CustomerLoanHistory(models.Model):
+    """
+    A customer's credit score inputs from archived loans.
+
+    Added to the aggregates over `Loan` wherever a credit score is computed
+    (see core.scoring.archived_history_aggregates), so archiving a loan
+    never changes a score. Only loans started before the current year are
+    archived, so there is no current-year count.
+    """
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='loan_history'
+    )
+    total_loans = models.PositiveIntegerField(default=0)
+    total_emis = models.PositiveBigIntegerField(default=0)
+    emis_paid_on_time = models.PositiveBigIntegerField(default=0)
+    total_approved_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.total_loans} archived loans for customer {self.customer_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A change to a customer or loan, written in the transaction that made it.
+
+    The relay (core.outbox) publishes unpublished events to the change
+    stream in `id` order and stamps `published_at`. Events are written
+    after the customer row is locked, so one customer's events get ids in
+    commit order. `customer_id` is a plain column so an event outlives its
+    customer.
+    """
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50)
+    aggregate_type = models.CharField(max_length=20)
+    aggregate_id = models.UUIDField()
+    customer_id = models.UUIDField()
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # The relay's backlog; stays small however large the table is
+            models.Index(
+                fields=['id'],
+                name='outbox_unpublished_idx',
+                condition=models.Q(published_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_id} (#{self.id})"
+
+
+class StagedSalary(models.Model):
+    """
+    One row of a payroll file, staged by core.payroll before the bulk
+    salary update. Rows live only for the duration of a run.
+    """
+    batch_id = models.UUIDField()
+    phone_number = models.CharField(max_length=15)
+    monthly_salary = models.DecimalField(max_digits=12, decimal_places=2)
+    # Computed when staged, with Customer.approved_limit_for
+    approved_limit = models.DecimalField(max_digits=12, decimal_places=2)
+    # Resolved from phone_number after staging; null for unknown numbers
+    customer_id = models.UUIDField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch_id', 'phone_number'], name='staged_salary_batch_phone_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Salary {self.monthly_salary} for {self.phone_number} (batch {self.batch_id})"
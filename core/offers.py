@@ -0,0 +1,145 @@
+"""
+Pre-approved loan offers.
+
+For every customer and standard tenure, the largest principal that
+check-eligibility would approve is found in closed form: the EMI headroom
+(50% of salary minus the EMIs of approved loans) is turned back into a
+principal by inverting the annuity formula,
+
+    P = H * ((1 + r)^n - 1) / (r * (1 + r)^n)
+
+at the offer rate: OFFER_BASE_RATE, or the minimum rate of the customer's
+credit score band if that is higher. Customers are handled a chunk at a
+time with NumPy and the results upserted into `LoanOffer`, so a lookup is
+a single indexed read.
+
+Incremental runs only recompute customers whose row, loans or stored
+credit score changed since the previous run.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import DecimalField, F, FloatField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .models import Customer, CustomerCreditScore, Loan, LoanOffer
+from .scenarios import DEFAULT_POLICY, annuity_payment, band_min_rates
+
+OFFER_TENURES = (12, 24, 36, 60, 120)
+
+# Offers are rounded down to this step so rounding the EMI to paise can
+# never push it over the headroom
+PRINCIPAL_STEP = 100
+
+
+def max_principal(headroom, annual_rate, tenure):
+    """Largest principal (multiple of PRINCIPAL_STEP) whose EMI fits `headroom`."""
+    monthly_rate = annual_rate / 1200
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + monthly_rate) ** tenure
+        principal = headroom * (growth - 1) / (monthly_rate * growth)
+    principal = np.where(monthly_rate > 0, principal, headroom * tenure)
+    return np.floor(np.maximum(principal, 0) / PRINCIPAL_STEP) * PRINCIPAL_STEP
+
+
+def changed_customer_ids(since):
+    """Customers whose row, loans or credit score changed at or after `since`."""
+    changed = set(Customer.objects.filter(updated_at__gte=since).values_list('pk', flat=True))
+    changed.update(Loan.objects.filter(updated_at__gte=since).values_list('customer_id', flat=True))
+    changed.update(
+        CustomerCreditScore.objects.filter(computed_at__gte=since).values_list('customer_id', flat=True)
+    )
+    return changed
+
+
+def _money(value):
+    return Decimal(f'{value:.2f}')
+
+
+def _offers_for(customer_ids, computed_at):
+    rows = list(
+        Customer.objects.filter(pk__in=customer_ids)
+        .order_by()
+        .annotate(
+            score=Coalesce(F('credit_score__score'), Value(50.0), output_field=FloatField()),
+            current_emis=Coalesce(
+                Sum('loans__monthly_installment', filter=Q(loans__status='APPROVED')),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        .values_list('pk', 'monthly_salary', 'score', 'current_emis')
+    )
+    if not rows:
+        return []
+
+    ids, salary, score, current_emis = zip(*rows)
+    salary = np.array(salary, dtype=np.float64)
+    score = np.array(score, dtype=np.float64)
+    headroom = salary * DEFAULT_POLICY['emi_cap_ratio'] - np.array(current_emis, dtype=np.float64)
+
+    floor = band_min_rates(score, DEFAULT_POLICY['min_rates'])
+    eligible = ~np.isnan(floor)
+    rate = np.fmax(np.nan_to_num(floor, nan=0.0), settings.OFFER_BASE_RATE)
+
+    offers = []
+    for tenure in OFFER_TENURES:
+        principal = np.where(eligible, max_principal(headroom, rate, tenure), 0.0)
+        emi = annuity_payment(principal, rate, tenure)
+        for i, customer_id in enumerate(ids):
+            offers.append(LoanOffer(
+                customer_id=customer_id,
+                tenure=tenure,
+                max_principal=_money(principal[i]),
+                rate_floor=_money(floor[i]) if eligible[i] else None,
+                interest_rate=_money(rate[i]),
+                monthly_installment=_money(emi[i]),
+                computed_at=computed_at,
+            ))
+    return offers
+
+
+def refresh_loan_offers(full=False, chunk_size=2000):
+    """
+    Recompute offers for changed customers, or every customer with `full`.
+
+    The first run is always full. Returns the number of customers and
+    offer rows written.
+    """
+    # Taken up front so changes made during the run are picked up next time
+    computed_at = timezone.now()
+    since = None if full else LoanOffer.objects.aggregate(last=Max('computed_at'))['last']
+
+    changed = None if since is None else sorted(changed_customer_ids(since))
+
+    customers = 0
+    written = 0
+    last = None
+    while True:
+        if changed is None:
+            # Keyset pagination over all customers
+            page = Customer.objects.order_by('pk').values_list('pk', flat=True)
+            if last is not None:
+                page = page.filter(pk__gt=last)
+            chunk = list(page[:chunk_size])
+        else:
+            chunk = changed[customers:customers + chunk_size]
+        if not chunk:
+            break
+        last = chunk[-1]
+        offers = _offers_for(chunk, computed_at)
+        LoanOffer.objects.bulk_create(
+            offers,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['customer', 'tenure'],
+            update_fields=['max_principal', 'rate_floor', 'interest_rate', 'monthly_installment', 'computed_at'],
+        )
+        customers += len(chunk)
+        written += len(offers)
+
+    metrics.inc('loan_offers_refreshed_total', written)
+    return {'customers': customers, 'offers': written, 'mode': 'full' if since is None else 'incremental'}
@@ -0,0 +1,311 @@
+"""
+Transactional outbox and the customer/loan change stream.
+
+Every write that other systems need to hear about adds an `OutboxEvent`
+row in its own transaction, so an event exists if and only if the change
+committed:
+
+- customer.registered: a customer registers
+- customer.salary_updated: a payroll file changes a customer's salary
+  and approved limit (core.payroll)
+- loan.created: create-loan approves a loan, or the importer loads one
+- loan.status_changed: the closure sweep closes a loan
+- loan.payments_applied: on-time EMI payments are applied to a loan
+
+Events are written after the customer's row is locked (the current_debt
+UPDATE, or an explicit SELECT ... FOR UPDATE), so two transactions touching
+the same customer take their event ids in commit order.
+
+The relay (`relay_batch`, run in a loop by `manage.py relay_outbox`) reads
+unpublished events in id order, appends them to the change stream and
+stamps `published_at` in one transaction. Relays lock the batch they read,
+so a second relay waits instead of publishing out of order. A relay that
+crashes after appending but before committing publishes the batch again:
+delivery is at least once, and consumers drop repeats by `event_id`. Within
+a customer, events appear in the stream in the order they committed.
+
+The stream backend is chosen by OUTBOX_BACKEND:
+
+- ``redis``: a Redis stream (OUTBOX_STREAM), trimmed to about
+  OUTBOX_STREAM_MAXLEN entries. Internal services read it with their own
+  consumer group; `outbox_consumer_lag` reports each group's lag.
+- ``memory``: a per-process list, for tests and single-process setups.
+
+External clients page through the stream with `read_stream` (the
+`events/` endpoint): each page returns the stream id to resume after. A
+cursor that points before entries already trimmed raises CursorExpired;
+the client has missed events and must resynchronise from the API.
+"""
+import json
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboxEvent
+
+STREAM_ID = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+# Published events deleted per statement by `prune_outbox`
+PRUNE_CHUNK_SIZE = 5000
+
+
+class CursorExpired(Exception):
+    """Events after the cursor were trimmed from the stream."""
+
+
+def event(event_type, aggregate_type, aggregate_id, customer_id, **payload):
+    """An unsaved OutboxEvent, for `record_events`."""
+    return OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        customer_id=customer_id,
+        payload=payload,
+    )
+
+
+def record_events(events):
+    """
+    Insert events in the caller's transaction.
+
+    Raises RuntimeError outside an atomic block: an event committed on its
+    own could be published for a change that then rolls back.
+    """
+    events = list(events)
+    if not events:
+        return 0
+    if not connection.in_atomic_block:
+        raise RuntimeError('Outbox events must be recorded inside the transaction that makes the change.')
+    OutboxEvent.objects.bulk_create(events, batch_size=1000)
+    metrics.inc('outbox_events_recorded_total', len(events))
+    return len(events)
+
+
+def record_event(event_type, aggregate_type, aggregate_id, customer_id, **payload):
+    return record_events([event(event_type, aggregate_type, aggregate_id, customer_id, **payload)])
+
+
+def parse_stream_id(value):
+    """(milliseconds, sequence) for a stream id; ValueError if malformed."""
+    match = STREAM_ID.match(value or '')
+    if match is None:
+        raise ValueError('Invalid cursor.')
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
+def to_entry(outbox_event):
+    """Stream fields for an event; every value is a string."""
+    return {
+        'event_id': str(outbox_event.id),
+        'event_type': outbox_event.event_type,
+        'aggregate_type': outbox_event.aggregate_type,
+        'aggregate_id': str(outbox_event.aggregate_id),
+        'customer_id': str(outbox_event.customer_id),
+        'occurred_at': outbox_event.created_at.isoformat(),
+        'payload': json.dumps(outbox_event.payload, cls=DjangoJSONEncoder, separators=(',', ':')),
+    }
+
+
+def from_entry(stream_id, fields):
+    """API representation of a stream entry."""
+    return {
+        'cursor': stream_id,
+        'event_id': int(fields['event_id']),
+        'event_type': fields['event_type'],
+        'aggregate_type': fields['aggregate_type'],
+        'aggregate_id': fields['aggregate_id'],
+        'customer_id': fields['customer_id'],
+        'occurred_at': fields['occurred_at'],
+        'payload': json.loads(fields['payload']),
+    }
+
+
+class MemoryStream:
+    """Per-process stand-in for the Redis stream."""
+
+    def __init__(self):
+        self.entries = []
+        self.max_deleted = (0, 0)
+        self._sequence = 0
+
+    def add(self, entries):
+        ids = []
+        for fields in entries:
+            self._sequence += 1
+            stream_id = f'{self._sequence}-0'
+            self.entries.append((stream_id, dict(fields)))
+            ids.append(stream_id)
+        excess = len(self.entries) - settings.OUTBOX_STREAM_MAXLEN
+        if excess > 0:
+            self.max_deleted = parse_stream_id(self.entries[excess - 1][0])
+            del self.entries[:excess]
+        return ids
+
+    def read(self, cursor, count):
+        after = parse_stream_id(cursor)
+        if (0, 0) < after < self.max_deleted:
+            raise CursorExpired(cursor)
+        return [entry for entry in self.entries if parse_stream_id(entry[0]) > after][:count]
+
+    def length(self):
+        return len(self.entries)
+
+    def groups(self):
+        return []
+
+
+class RedisStream:
+    """The change stream in Redis (see module docstring)."""
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(settings.OUTBOX_REDIS_URL, decode_responses=True)
+        return self._client
+
+    def add(self, entries):
+        pipe = self.client.pipeline(transaction=False)
+        for fields in entries:
+            # Approximate trimming is O(1) amortised
+            pipe.xadd(settings.OUTBOX_STREAM, fields, maxlen=settings.OUTBOX_STREAM_MAXLEN, approximate=True)
+        return pipe.execute()
+
+    def read(self, cursor, count):
+        after = parse_stream_id(cursor)
+        # Read and check for trimming atomically, so a trim in between
+        # cannot hide a gap
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xrange(settings.OUTBOX_STREAM, min=f'({after[0]}-{after[1]}', count=count)
+        pipe.xinfo_stream(settings.OUTBOX_STREAM)
+        try:
+            entries, info = pipe.execute()
+        except Exception as exc:
+            if 'no such key' in str(exc).lower():
+                # Nothing published yet
+                return []
+            raise
+        max_deleted = info.get('max-deleted-entry-id')
+        if max_deleted and (0, 0) < after < parse_stream_id(max_deleted):
+            raise CursorExpired(cursor)
+        return entries
+
+    def length(self):
+        return self.client.xlen(settings.OUTBOX_STREAM)
+
+    def groups(self):
+        try:
+            return self.client.xinfo_groups(settings.OUTBOX_STREAM)
+        except Exception as exc:
+            if 'no such key' in str(exc).lower():
+                return []
+            raise
+
+
+_streams = {}
+
+
+def get_stream():
+    backend = settings.OUTBOX_BACKEND
+    if backend not in _streams:
+        _streams[backend] = RedisStream() if backend == 'redis' else MemoryStream()
+    return _streams[backend]
+
+
+def relay_batch(batch_size=None):
+    """
+    Publish up to `batch_size` unpublished events in id order; returns the
+    number published. On PostgreSQL the batch is locked, so a concurrent
+    relay waits for this one and then skips the events it published.
+    """
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    started = time.perf_counter()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update()
+            .filter(published_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        try:
+            get_stream().add([to_entry(outbox_event) for outbox_event in events])
+        except Exception:
+            # Stream down: leave the batch for the next attempt
+            metrics.inc('outbox_relay_errors_total')
+            raise
+        OutboxEvent.objects.filter(pk__in=[outbox_event.pk for outbox_event in events]).update(
+            published_at=timezone.now()
+        )
+
+    metrics.inc('outbox_events_published_total', len(events))
+    metrics.observe('outbox_relay_batch_seconds', time.perf_counter() - started)
+    return len(events)
+
+
+def relay_pending(batch_size=None):
+    """Publish the whole backlog, one batch per transaction."""
+    published = 0
+    while True:
+        count = relay_batch(batch_size)
+        published += count
+        if count < (batch_size or settings.OUTBOX_RELAY_BATCH_SIZE):
+            return published
+
+
+def read_stream(cursor='0', limit=100):
+    """
+    Up to `limit` events after `cursor`, and the cursor to pass next time.
+    '0' starts at the oldest event still in the stream and never expires.
+    Raises ValueError for a malformed cursor and CursorExpired when events
+    after it were trimmed.
+    """
+    entries = get_stream().read(cursor, limit)
+    events = [from_entry(stream_id, fields) for stream_id, fields in entries]
+    return events, events[-1]['cursor'] if events else cursor
+
+
+def prune_outbox(retention_days, now=None):
+    """Delete events published more than `retention_days` ago; returns the count."""
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        # Chunked by id so each DELETE holds its locks briefly
+        ids = list(
+            OutboxEvent.objects.filter(published_at__lt=cutoff)
+            .order_by('id')
+            .values_list('id', flat=True)[:PRUNE_CHUNK_SIZE]
+        )
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(pk__in=ids).delete()[0]
+
+
+@metrics.register_collector
+def outbox_metrics():
+    """Relay backlog and, with the Redis backend, each consumer group's lag."""
+    backlog = OutboxEvent.objects.filter(published_at__isnull=True)
+    yield 'outbox_unpublished_events', {}, backlog.count()
+    oldest = backlog.order_by('id').values_list('created_at', flat=True).first()
+    yield 'outbox_oldest_unpublished_age_seconds', {}, (
+        round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0
+    )
+
+    stream = get_stream()
+    yield 'outbox_stream_length', {}, stream.length()
+    for group in stream.groups():
+        labels = {'group': group['name']}
+        yield 'outbox_consumer_pending', labels, group.get('pending', 0)
+        # Entries not yet delivered to the group; Redis reports none when
+        # trimming makes it unknowable
+        if group.get('lag') is not None:
+            yield 'outbox_consumer_lag', labels, group['lag']
@@ -0,0 +1,55 @@
+"""
+Range-partition maintenance for PostgreSQL tables.
+
+Used by the month-partitioned decision log and the year-partitioned loan
+archive. Each partitioned table has a `<table>_default` partition that
+catches rows with no matching range; partitions for a new range are
+created next to it and take over any such rows (see `create_partition`).
+Callers check `connection.vendor` first; other databases use plain tables.
+"""
+from django.db import connection, transaction
+
+
+def existing_partitions(table):
+    """Names of the partitions attached to `table`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [table],
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+def create_partition(table, name, column, start, end):
+    """
+    Attach partition `name` of `table` for `start` <= `column` < `end`.
+
+    Rows for that range already in the default partition are moved into
+    the new one first; otherwise attaching would fail.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Keeps writers out of the default partition while rows move
+        cursor.execute(f'LOCK TABLE {quote(table)} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(table + "_default")} '
+            f'WHERE {quote(column)} >= %s AND {quote(column)} < %s RETURNING *) '
+            f'INSERT INTO {quote(name)} SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(
+            f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+
+
+def drop_partition(table, name):
+    """Detach and drop partition `name`; instant whatever its size."""
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}')
+        cursor.execute(f'DROP TABLE {quote(name)}')
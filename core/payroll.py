@@ -0,0 +1,243 @@
+"""
+Bulk salary updates from payroll files.
+
+Payroll files (CSV, or Excel via pandas) have a header row with at least
+`phone_number` and `monthly_salary` columns. `update_salaries` runs in
+three steps:
+
+1. Stage: rows are validated and bulk-inserted into `StagedSalary` under a
+   fresh batch id. The approved limit is computed here, in Python, with
+   `Customer.approved_limit_for`, so it is exactly what registration
+   computes (including its half-even rounding to the lakh). When a phone
+   number appears more than once, the last row wins.
+2. Resolve: one UPDATE fills in each staged row's customer from the phone
+   number. Unknown numbers stay unresolved and are reported.
+3. Apply: one `UPDATE ... FROM` the staging table per chunk of staged rows
+   sets monthly_salary, approved_limit and updated_at on the customers
+   whose values actually change. RETURNING gives those customers, and in
+   the same transaction their credit scores are marked stale, their cache
+   entries dropped and a customer.salary_updated outbox event written.
+   The new updated_at puts them in the next incremental offer refresh
+   (core.offers).
+
+Unchanged customers are not written, so rerunning a file after a failure
+only applies what is left. The batch's staging rows are deleted at the end.
+"""
+import csv
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import metrics, outbox
+from .customer_cache import invalidate_customer
+from .models import Customer, StagedSalary
+from .portfolio import mark_scores_stale
+
+# Staging rows inserted per statement
+STAGE_CHUNK_SIZE = 5000
+# Staged rows applied per UPDATE and transaction
+APPLY_CHUNK_SIZE = 2000
+# Invalid rows reported by line number
+MAX_REPORTED_ERRORS = 20
+
+# Both columns are DECIMAL(12, 2)
+MAX_AMOUNT = Decimal('9999999999.99')
+CENTS = Decimal('0.01')
+
+
+def read_payroll(path):
+    """(line number, phone number, salary) for each data row of a payroll file."""
+    if str(path).lower().endswith(('.xlsx', '.xls')):
+        # Imported here: see import_excel_data in core.tasks
+        import pandas as pd
+
+        frame = pd.read_excel(path, dtype=str, keep_default_na=False)
+        for index, row in enumerate(frame.to_dict('records')):
+            yield index + 2, row.get('phone_number', ''), row.get('monthly_salary', '')
+        return
+
+    with open(path, newline='') as payroll:
+        reader = csv.DictReader(payroll)
+        for row in reader:
+            yield reader.line_num, row.get('phone_number') or '', row.get('monthly_salary') or ''
+
+
+def parse_row(phone_number, salary):
+    """(phone digits, salary, approved limit), or None for an invalid row."""
+    digits = ''.join(filter(str.isdigit, str(phone_number)))
+    if not digits or len(digits) > 15:
+        return None
+    try:
+        salary = Decimal(str(salary).strip()).quantize(CENTS)
+    except (InvalidOperation, ValueError):
+        return None
+    if not salary.is_finite() or salary < 0:
+        return None
+    approved_limit = Customer.approved_limit_for(salary)
+    if approved_limit > MAX_AMOUNT:
+        return None
+    return digits, salary, approved_limit
+
+
+def stage_payroll(rows, batch_id):
+    """
+    Stage (line, phone number, salary) rows under `batch_id`.
+
+    Returns (valid rows, line numbers of invalid rows).
+    """
+    valid = 0
+    invalid = []
+
+    def flush(chunk):
+        # Later rows for a number replace earlier ones, here and across chunks
+        StagedSalary.objects.bulk_create(
+            chunk.values(),
+            update_conflicts=True,
+            unique_fields=['batch_id', 'phone_number'],
+            update_fields=['monthly_salary', 'approved_limit'],
+        )
+
+    chunk = {}
+    for line, phone_number, salary in rows:
+        parsed = parse_row(phone_number, salary)
+        if parsed is None:
+            invalid.append(line)
+            continue
+        digits, salary, approved_limit = parsed
+        valid += 1
+        chunk[digits] = StagedSalary(
+            batch_id=batch_id, phone_number=digits, monthly_salary=salary, approved_limit=approved_limit
+        )
+        if len(chunk) >= STAGE_CHUNK_SIZE:
+            flush(chunk)
+            chunk = {}
+    if chunk:
+        flush(chunk)
+    return valid, invalid
+
+
+def resolve_customers(batch_id):
+    """Fill in the customer of every staged row; returns the number left unknown."""
+    staged = StagedSalary.objects.filter(batch_id=batch_id)
+    staged.update(customer_id=Subquery(
+        Customer.objects.filter(phone_number=OuterRef('phone_number')).values('pk')[:1]
+    ))
+    return staged.filter(customer_id__isnull=True).count()
+
+
+def _changes(batch_id, first_id, last_id):
+    """
+    Join condition between customers and the staged rows first_id..last_id
+    (aliased `s`) that change them, and its params.
+    """
+    table = connection.ops.quote_name(Customer._meta.db_table)
+    condition = (
+        f'{table}.customer_id = s.customer_id AND s.batch_id = %s AND s.id BETWEEN %s AND %s '
+        f'AND ({table}.monthly_salary <> s.monthly_salary OR {table}.approved_limit <> s.approved_limit)'
+    )
+    batch_field = StagedSalary._meta.get_field('batch_id')
+    return condition, [batch_field.get_db_prep_value(batch_id, connection), first_id, last_id]
+
+
+def _apply_chunk(batch_id, first_id, last_id):
+    """Update the customers changed by staged rows first_id..last_id; returns their ids."""
+    table = connection.ops.quote_name(Customer._meta.db_table)
+    staging = connection.ops.quote_name(StagedSalary._meta.db_table)
+    now = Customer._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+    condition, params = _changes(batch_id, first_id, last_id)
+    # SQLite has no table alias in UPDATE ... FROM, so the target is named in full
+    sql = (
+        f'UPDATE {table} '
+        f'SET monthly_salary = s.monthly_salary, approved_limit = s.approved_limit, updated_at = %s '
+        f'FROM {staging} AS s WHERE {condition} '
+        f'RETURNING {table}.customer_id'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now, *params])
+        return [Customer._meta.pk.to_python(row[0]) for row in cursor.fetchall()]
+
+
+def _count_changes(batch_id, first_id, last_id):
+    table = connection.ops.quote_name(Customer._meta.db_table)
+    staging = connection.ops.quote_name(StagedSalary._meta.db_table)
+    condition, params = _changes(batch_id, first_id, last_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {table} JOIN {staging} AS s ON {condition}', params)
+        return cursor.fetchone()[0]
+
+
+def apply_salaries(batch_id, chunk_size=APPLY_CHUNK_SIZE, dry_run=False):
+    """
+    Apply a resolved batch, one UPDATE and transaction per `chunk_size`
+    staged rows. Returns the number of customers updated (or that would be).
+    """
+    staged = StagedSalary.objects.filter(batch_id=batch_id, customer_id__isnull=False).order_by('id')
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(staged.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return updated
+        first_id, last_id = ids[0], ids[-1]
+        if dry_run:
+            updated += _count_changes(batch_id, first_id, last_id)
+            continue
+
+        with transaction.atomic():
+            # Lock in primary key order first, as the debt recompute does,
+            # so the two cannot deadlock
+            list(
+                Customer.objects.select_for_update()
+                .filter(pk__in=staged.filter(id__range=(first_id, last_id)).values('customer_id'))
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            changed = _apply_chunk(batch_id, first_id, last_id)
+            if not changed:
+                continue
+            mark_scores_stale(changed)
+            for customer_id in changed:
+                invalidate_customer(customer_id)
+            # The UPDATE holds the customers' row locks
+            outbox.record_events(
+                outbox.event('customer.salary_updated', 'customer', customer_id, customer_id,
+                             monthly_salary=monthly_salary, approved_limit=approved_limit)
+                for customer_id, monthly_salary, approved_limit in Customer.objects.filter(pk__in=changed)
+                .order_by('pk').values_list('pk', 'monthly_salary', 'approved_limit')
+            )
+        updated += len(changed)
+        metrics.inc('payroll_customers_updated_total', len(changed))
+
+
+def update_salaries(path, chunk_size=APPLY_CHUNK_SIZE, dry_run=False):
+    """
+    Stage, resolve and apply a payroll file (see module docstring).
+
+    Returns a summary: rows staged, invalid rows (and their first line
+    numbers), unknown phone numbers and customers updated.
+    """
+    started = time.perf_counter()
+    batch_id = uuid.uuid4()
+    try:
+        valid, invalid = stage_payroll(read_payroll(path), batch_id)
+        staged = StagedSalary.objects.filter(batch_id=batch_id).count()
+        unknown = resolve_customers(batch_id)
+        updated = apply_salaries(batch_id, chunk_size=chunk_size, dry_run=dry_run)
+    finally:
+        StagedSalary.objects.filter(batch_id=batch_id).delete()
+
+    return {
+        'rows': valid + len(invalid),
+        'staged': staged,
+        'duplicates': valid - staged,
+        'invalid': len(invalid),
+        'invalid_lines': invalid[:MAX_REPORTED_ERRORS],
+        'unknown_customers': unknown,
+        'customers_updated': updated,
+        'dry_run': dry_run,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,330 @@
+"""
+Running portfolio totals for the summary endpoint.
+
+Outstanding principal, monthly EMI inflow and loan counts are kept in
+`PortfolioBucket` rows and adjusted by a delta on every approved-loan write
+(the signal handlers below, and the closure sweep in core.maintenance), so
+reading the summary sums a few hundred counter rows instead of scanning
+`core_loan`. Every total is spread over PORTFOLIO_COUNTER_SHARDS rows and a
+writer picks one at random, so concurrent create-loan requests do not
+serialise on a single hot row.
+
+Customer counts per credit score band come from `CustomerCreditScore`.
+Loan writes only flag a customer's score stale; `refresh_stale_credit_scores`
+recomputes the flagged scores in batches with one grouped query and moves
+the customers between band counters.
+
+`rebuild_portfolio` recomputes every counter from the base tables. It is
+the one full scan, meant as a repair tool; migration 0011 runs the same
+backfill once on databases that predate the counters.
+"""
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import Customer, CustomerCreditScore, Loan, PortfolioBucket
+from .scoring import (
+    SCORE_BANDS, add_archived_history, archived_history_aggregates, credit_score_from_history,
+    history_aggregates, score_band
+)
+
+# Tenure buckets in months: (label, inclusive upper bound)
+TENURE_BUCKETS = (
+    ('<=12', 12),
+    ('13-36', 36),
+    ('37-60', 60),
+    ('61-120', 120),
+    ('>120', None),
+)
+
+BOOK = ('book', 'all')
+NEW_CUSTOMER_BAND = score_band(50)  # score of a customer without loans
+
+# Rows per pk__in filter; keeps SQLite under its bound-parameter limit
+STALE_CHUNK_SIZE = 400
+
+
+def tenure_bucket(tenure):
+    """Label of the TENURE_BUCKETS entry `tenure` falls in."""
+    for label, upper in TENURE_BUCKETS:
+        if upper is None or tenure <= upper:
+            return label
+
+
+def _add(dimension, bucket, loans=0, principal=0, emi=0, customers=0):
+    """Add the given deltas to a random shard of (dimension, bucket)."""
+    shard = random.randrange(settings.PORTFOLIO_COUNTER_SHARDS)
+    changes = {
+        'loan_count': F('loan_count') + loans,
+        'outstanding_principal': F('outstanding_principal') + principal,
+        'monthly_emi': F('monthly_emi') + emi,
+        'customer_count': F('customer_count') + customers,
+    }
+    row = PortfolioBucket.objects.filter(dimension=dimension, bucket=bucket, shard=shard)
+    if not row.update(**changes):
+        # First write to this shard; a concurrent creator wins harmlessly
+        PortfolioBucket.objects.bulk_create(
+            [PortfolioBucket(dimension=dimension, bucket=bucket, shard=shard)],
+            ignore_conflicts=True,
+        )
+        row.update(**changes)
+
+
+def apply_loan_deltas(loans, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) approved loans from the counters.
+
+    `loans` are (loan_amount, monthly_installment, tenure) tuples; they are
+    summed per tenure bucket first so a chunk costs one UPDATE per bucket.
+    """
+    per_bucket = {}
+    for amount, installment, tenure in loans:
+        totals = per_bucket.setdefault(tenure_bucket(tenure), [0, Decimal('0'), Decimal('0')])
+        totals[0] += 1
+        # Unsaved-instance values may still be floats (see Loan.save)
+        totals[1] += Decimal(str(amount))
+        totals[2] += Decimal(str(installment))
+    if not per_bucket:
+        return
+
+    book = [0, Decimal('0'), Decimal('0')]
+    for bucket, (count, principal, emi) in per_bucket.items():
+        _add('tenure', bucket, loans=sign * count, principal=sign * principal, emi=sign * emi)
+        book = [book[0] + count, book[1] + principal, book[2] + emi]
+    _add(*BOOK, loans=sign * book[0], principal=sign * book[1], emi=sign * book[2])
+
+
+def mark_scores_stale(customer_ids):
+    """Flag the credit scores of `customer_ids` for the next refresh."""
+    customer_ids = list(customer_ids)
+    for start in range(0, len(customer_ids), STALE_CHUNK_SIZE):
+        # No stale=False filter: the UPDATE has to wait on a row that a
+        # running refresh holds, or the refresh would clear the new flag
+        CustomerCreditScore.objects.filter(
+            pk__in=customer_ids[start:start + STALE_CHUNK_SIZE]
+        ).update(stale=True)
+
+
+def mark_loan_scores_stale(loan_ids):
+    """Flag the credit scores of the customers owning `loan_ids`."""
+    loan_ids = list(loan_ids)
+    for start in range(0, len(loan_ids), STALE_CHUNK_SIZE):
+        mark_scores_stale(
+            Loan.objects.filter(pk__in=loan_ids[start:start + STALE_CHUNK_SIZE])
+            .values_list('customer_id', flat=True).distinct()
+        )
+
+
+@receiver(post_save, sender=Loan, dispatch_uid='portfolio_loan_post_save')
+def track_loan_created(sender, instance, created, **kwargs):
+    # Loans are created with their final status; later status changes go
+    # through the closure sweep, which applies its own deltas
+    if created and instance.status == 'APPROVED':
+        apply_loan_deltas([(instance.loan_amount, instance.monthly_installment, instance.tenure)])
+    if created:
+        mark_scores_stale([instance.customer_id])
+
+
+@receiver(post_delete, sender=Loan, dispatch_uid='portfolio_loan_post_delete')
+def track_loan_deleted(sender, instance, **kwargs):
+    if instance.status == 'APPROVED':
+        apply_loan_deltas([(instance.loan_amount, instance.monthly_installment, instance.tenure)], sign=-1)
+    mark_scores_stale([instance.customer_id])
+
+
+@receiver(post_save, sender=Customer, dispatch_uid='portfolio_customer_post_save')
+def track_customer_created(sender, instance, created, **kwargs):
+    if not created:
+        # Salary or limit may have changed
+        mark_scores_stale([instance.pk])
+        return
+    # A customer without loans always scores 50, so no refresh is needed
+    CustomerCreditScore.objects.create(
+        customer=instance, score=50, band=NEW_CUSTOMER_BAND, stale=False, computed_at=timezone.now()
+    )
+    _add('score_band', NEW_CUSTOMER_BAND, customers=1)
+    _add(*BOOK, customers=1)
+
+
+@receiver(post_delete, sender=CustomerCreditScore, dispatch_uid='portfolio_score_post_delete')
+def track_customer_deleted(sender, instance, **kwargs):
+    # Deleted with (and just before) its customer
+    _add('score_band', instance.band, customers=-1)
+    _add(*BOOK, customers=-1)
+
+
+def refresh_stale_credit_scores(batch_size=1000):
+    """
+    Recompute stale credit scores, `batch_size` customers per transaction.
+
+    Each batch takes the flagged rows with SKIP LOCKED, so several workers
+    can share the backlog, computes their loan history in one grouped query
+    and writes the scores back with one bulk UPDATE. A loan written while a
+    batch is running waits on the score row lock and re-flags it afterwards.
+    Returns the number of scores refreshed and band changes.
+    """
+    refreshed = 0
+    band_changes = 0
+    while True:
+        with transaction.atomic():
+            stale = dict(
+                CustomerCreditScore.objects.filter(stale=True)
+                .select_for_update(skip_locked=True)
+                .order_by('pk')
+                .values_list('pk', 'band')[:batch_size]
+            )
+            if not stale:
+                break
+
+            current_year_start = timezone.now().replace(month=1, day=1)
+            histories = (
+                Customer.objects.filter(pk__in=list(stale))
+                .order_by()
+                .values('pk', 'current_debt', 'approved_limit', 'monthly_salary')
+                .annotate(
+                    **history_aggregates(current_year_start, prefix='loans__'),
+                    **archived_history_aggregates(),
+                )
+            )
+
+            now = timezone.now()
+            scores = []
+            moves = {}
+            for history in histories:
+                add_archived_history(history)
+                score = credit_score_from_history(
+                    history, history['current_debt'], history['approved_limit'], history['monthly_salary']
+                )
+                band = score_band(score)
+                old_band = stale[history['pk']]
+                if band != old_band:
+                    moves[old_band] = moves.get(old_band, 0) - 1
+                    moves[band] = moves.get(band, 0) + 1
+                    band_changes += 1
+                scores.append(CustomerCreditScore(
+                    customer_id=history['pk'], score=score, band=band, stale=False, computed_at=now
+                ))
+
+            CustomerCreditScore.objects.bulk_update(
+                scores, ['score', 'band', 'stale', 'computed_at'], batch_size=STALE_CHUNK_SIZE
+            )
+            for band, delta in moves.items():
+                if delta:
+                    _add('score_band', band, customers=delta)
+            refreshed += len(scores)
+
+    metrics.inc('credit_scores_refreshed_total', refreshed)
+    return {'refreshed': refreshed, 'band_changes': band_changes}
+
+
+def _tenure_bucket_case():
+    whens = []
+    lower = 0
+    for label, upper in TENURE_BUCKETS:
+        if upper is None:
+            default = Value(label)
+        else:
+            whens.append(When(tenure__gt=lower, tenure__lte=upper, then=Value(label)))
+            lower = upper
+    return Case(*whens, default=default, output_field=CharField())
+
+
+def rebuild_portfolio():
+    """
+    Recompute every portfolio counter from the base tables.
+
+    Creates missing score rows (flagged stale, counted in the new-customer
+    band until refreshed) and replaces all counters with single unsharded
+    rows. Loan writes are held off for the duration on PostgreSQL.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            table = connection.ops.quote_name(PortfolioBucket._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+
+        missing = Customer.objects.filter(credit_score__isnull=True).values_list('pk', flat=True)
+        CustomerCreditScore.objects.bulk_create(
+            [CustomerCreditScore(customer_id=pk, band=NEW_CUSTOMER_BAND, stale=True) for pk in missing.iterator()],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+        PortfolioBucket.objects.all().delete()
+        rows = {}
+
+        def row(dimension, bucket):
+            return rows.setdefault(
+                (dimension, bucket), PortfolioBucket(dimension=dimension, bucket=bucket, shard=0)
+            )
+
+        loans = (
+            Loan.objects.filter(status='APPROVED')
+            .order_by()
+            .annotate(bucket=_tenure_bucket_case())
+            .values('bucket')
+            .annotate(loans=Count('pk'), principal=Sum('loan_amount'), emi=Sum('monthly_installment'))
+        )
+        book = row(*BOOK)
+        for entry in loans:
+            bucket = row('tenure', entry['bucket'])
+            bucket.loan_count = entry['loans']
+            bucket.outstanding_principal = entry['principal']
+            bucket.monthly_emi = entry['emi']
+            book.loan_count += entry['loans']
+            book.outstanding_principal += entry['principal']
+            book.monthly_emi += entry['emi']
+
+        bands = CustomerCreditScore.objects.order_by().values('band').annotate(customers=Count('pk'))
+        for entry in bands:
+            row('score_band', entry['band']).customer_count = entry['customers']
+            book.customer_count += entry['customers']
+
+        PortfolioBucket.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def portfolio_summary():
+    """Current portfolio totals, summed over the counter shards."""
+    totals = {
+        (entry['dimension'], entry['bucket']): entry
+        for entry in PortfolioBucket.objects.order_by().values('dimension', 'bucket').annotate(
+            loans=Sum('loan_count'),
+            principal=Sum('outstanding_principal'),
+            emi=Sum('monthly_emi'),
+            customers=Sum('customer_count'),
+        )
+    }
+    empty = {'loans': 0, 'principal': Decimal('0'), 'emi': Decimal('0'), 'customers': 0}
+    book = totals.get(BOOK, empty)
+
+    return {
+        'outstanding_principal': str(book['principal'] or 0),
+        'monthly_emi_inflow': str(book['emi'] or 0),
+        'active_loans': book['loans'] or 0,
+        'customers': book['customers'] or 0,
+        'credit_score_bands': [
+            {'band': label, 'customers': totals.get(('score_band', label), empty)['customers'] or 0}
+            for label, _ in SCORE_BANDS
+        ],
+        'tenure_buckets': [
+            {
+                'bucket': label,
+                'loans': bucket['loans'] or 0,
+                'outstanding_principal': str(bucket['principal'] or 0),
+                'monthly_emi': str(bucket['emi'] or 0),
+            }
+            for label, _ in TENURE_BUCKETS
+            for bucket in [totals.get(('tenure', label), empty)]
+        ],
+        # Customers whose band may be out of date until the next refresh
+        'stale_scores': CustomerCreditScore.objects.filter(stale=True).count(),
+        'as_of': timezone.now().isoformat(),
+    }
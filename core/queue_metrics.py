@@ -0,0 +1,128 @@
+"""
+Celery queue depth and task latency metrics.
+
+Producers stamp every task message with a `published_at` header. In the
+worker, the signal handlers below time each task: wait is the time from
+publishing to the start of the run, runtime the time the task body took.
+Worker processes are never scraped, so they add their observations to one
+Redis hash per queue on the broker. `celery_queue_metrics`, a collector,
+reads those hashes, the queue lengths and the age of the oldest waiting
+message when /api/metrics/ is scraped. Tasks run eagerly (tests,
+CELERY_TASK_ALWAYS_EAGER) are observed in the local registry instead.
+"""
+import json
+import threading
+import time
+
+from celery import signals
+from django.conf import settings
+
+from . import metrics
+
+# Seconds; from sub-second interactive tasks to hour-long imports
+TASK_BUCKETS = (0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+STATS_KEY = 'celery-task-stats:{queue}'
+
+_started = threading.local()
+_client = None
+
+
+def queue_for(task_name):
+    """Queue `task_name` is routed to (CELERY_TASK_ROUTES)."""
+    route = settings.CELERY_TASK_ROUTES.get(task_name, {})
+    return route.get('queue', settings.CELERY_TASK_DEFAULT_QUEUE)
+
+
+def broker_client():
+    """Redis client for the broker, or None when the broker is not Redis."""
+    global _client
+    if not settings.CELERY_BROKER_URL.startswith('redis'):
+        return None
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    return _client
+
+
+def _bucket(value):
+    for bound in TASK_BUCKETS:
+        if value <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+def record_task_timing(queue, wait, runtime, eager=False):
+    """Add one task's wait (None when unknown) and runtime to the queue stats."""
+    timings = {'runtime': runtime} if wait is None else {'wait': wait, 'runtime': runtime}
+    client = None if eager else broker_client()
+    if client is None:
+        for kind, seconds in timings.items():
+            metrics.observe(f'celery_task_{kind}_seconds', seconds, buckets=TASK_BUCKETS, queue=queue)
+        return
+
+    key = STATS_KEY.format(queue=queue)
+    pipe = client.pipeline(transaction=False)
+    for kind, seconds in timings.items():
+        pipe.hincrby(key, f'{kind}:{_bucket(seconds)}', 1)
+        pipe.hincrby(key, f'{kind}:count', 1)
+        pipe.hincrbyfloat(key, f'{kind}:sum', seconds)
+    pipe.execute()
+
+
+@signals.before_task_publish.connect(dispatch_uid='queue_metrics_publish')
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@signals.task_prerun.connect(dispatch_uid='queue_metrics_prerun')
+def start_timer(task_id=None, **kwargs):
+    _started.value = (task_id, time.time(), time.perf_counter())
+
+
+@signals.task_postrun.connect(dispatch_uid='queue_metrics_postrun')
+def stop_timer(task_id=None, task=None, **kwargs):
+    started = getattr(_started, 'value', None)
+    if task is None or started is None or started[0] != task_id:
+        return
+    _, started_at, started_clock = started
+    _started.value = None
+    runtime = time.perf_counter() - started_clock
+    published_at = getattr(task.request, 'published_at', None)
+    wait = max(started_at - float(published_at), 0.0) if published_at else None
+    try:
+        record_task_timing(queue_for(task.name), wait, runtime, eager=bool(task.request.is_eager))
+    except Exception:
+        # Broker hiccups must never fail the task that just ran
+        metrics.inc('celery_task_metrics_errors_total')
+
+
+@metrics.register_collector
+def celery_queue_metrics():
+    """Depth, oldest message age and task timing histograms per queue."""
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        return
+    client = broker_client()
+    if client is None:
+        return
+
+    now = time.time()
+    for queue in settings.TASK_QUEUE_PROFILES:
+        labels = {'queue': queue}
+        yield 'celery_queue_depth', labels, client.llen(queue)
+
+        # Kombu pushes on the left and workers pop from the right
+        oldest = client.lindex(queue, -1)
+        published_at = json.loads(oldest).get('headers', {}).get('published_at') if oldest else None
+        yield 'celery_queue_oldest_message_age_seconds', labels, round(now - published_at, 3) if published_at else 0
+
+        stats = {field.decode(): value for field, value in client.hgetall(STATS_KEY.format(queue=queue)).items()}
+        for kind in ('wait', 'runtime'):
+            name = f'celery_task_{kind}_seconds'
+            cumulative = 0
+            for bound in (*map(str, TASK_BUCKETS), '+Inf'):
+                cumulative += int(stats.get(f'{kind}:{bound}', 0))
+                yield f'{name}_bucket', dict(labels, le=bound), cumulative, 'histogram'
+            yield f'{name}_sum', labels, float(stats.get(f'{kind}:sum', 0)), 'histogram'
+            yield f'{name}_count', labels, int(stats.get(f'{kind}:count', 0)), 'histogram'
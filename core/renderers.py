@@ -0,0 +1,171 @@
+"""
+Compact wire formats for API responses.
+
+Both renderers are registered in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+and picked per request by DRF's content negotiation on `Accept`:
+
+- `CompressedJSONRenderer`: application/json, the default.
+- `MessagePackRenderer`: application/msgpack. Serializers using
+  `core.serializers.NativeDecimalsMixin` hand it Decimals instead of
+  quoted strings, and they go out as doubles. Amounts and rates have at
+  most 12 significant digits, which a double round-trips exactly. UUIDs,
+  dates and datetimes go out as strings, as in JSON.
+
+Both compress their output when the request's `Accept-Encoding` allows it
+and the body is at least RESPONSE_COMPRESSION_MIN_BYTES. They use brotli
+when the client accepts it and the optional `brotli` package is installed,
+otherwise gzip. Smaller bodies go out as they are, because compressing
+them costs more CPU than the saved bytes are worth.
+
+The async read views are plain Django views, so they negotiate through
+`negotiate` and `rendered_response` and get the same formats.
+"""
+import datetime
+import gzip
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import Promise
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.request import Request
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it responses are only ever gzip-compressed
+    brotli = None
+
+
+def accepted_codings(header):
+    """Content codings and their q-values from an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def choose_encoding(header):
+    """'br' or 'gzip' for an Accept-Encoding header, or None for neither."""
+    codings = accepted_codings(header)
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if codings.get(coding, codings.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.RESPONSE_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical content
+    return gzip.compress(content, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMixin:
+    """Compress a renderer's output for clients that accept it."""
+
+    def compress(self, content, renderer_context):
+        renderer_context = renderer_context or {}
+        request = renderer_context.get('request')
+        response = renderer_context.get('response')
+        if request is None or response is None or response.has_header('Content-Encoding'):
+            return content
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return content
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return content
+
+        compressed = compress(content, encoding)
+        response['Content-Encoding'] = encoding
+        metrics.inc('response_compressed_total', encoding=encoding)
+        metrics.inc('response_compression_saved_bytes_total', len(content) - len(compressed), encoding=encoding)
+        return compressed
+
+
+class CompressedJSONRenderer(CompressionMixin, JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        content = super().render(data, accepted_media_type, renderer_context)
+        return self.compress(content, renderer_context)
+
+
+def _encode(value):
+    # Types msgpack does not know natively
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (uuid.UUID, Promise)):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialize {type(value).__name__} to MessagePack')
+
+
+class MessagePackRenderer(CompressionMixin, BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    # Read by NativeDecimalsMixin: Decimals are encoded as numbers
+    native_decimals = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        content = msgpack.packb(data, default=_encode, use_bin_type=True)
+        return self.compress(content, renderer_context)
+
+
+# Formats offered by the plain Django views; the browsable API needs a DRF view
+PLAIN_VIEW_RENDERERS = (CompressedJSONRenderer, MessagePackRenderer)
+
+
+def negotiate(request):
+    """
+    Pick the renderer for a plain Django view's request from `Accept`.
+
+    Sets `accepted_renderer` and `accepted_media_type` on the request, as
+    DRF does, and falls back to JSON when nothing offered is acceptable.
+    """
+    renderers = [renderer() for renderer in PLAIN_VIEW_RENDERERS]
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(Request(request), renderers)
+    except NotAcceptable:
+        renderer, media_type = renderers[0], renderers[0].media_type
+    request.accepted_renderer = renderer
+    request.accepted_media_type = media_type
+    return renderer
+
+
+def rendered_response(request, data, status=200):
+    """HttpResponse for `data` in the format `negotiate` picked for `request`."""
+    renderer = getattr(request, 'accepted_renderer', None) or negotiate(request)
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    response = HttpResponse(status=status, content_type=content_type)
+    response.content = renderer.render(
+        data, request.accepted_media_type, {'request': request, 'response': response}
+    )
+    return response
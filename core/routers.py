@@ -0,0 +1,93 @@
+"""
+Database routing for the optional read replica.
+
+Reads only go to the `replica` alias inside a `replica_reads()` block, which
+the read-only endpoints (view-loan, view-loans, check-eligibility) open
+around their queries. Everything else - writes, create-loan's eligibility
+re-check, the Excel importer, Celery jobs - stays on the primary.
+
+Replicas lag behind the primary, so after a customer's write their reads
+are pinned to the primary for REPLICA_STICKY_SECONDS (read-your-writes).
+The pin is stored in the shared cache so it holds across workers.
+"""
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def _sticky_key(customer_id):
+    return f'replica-sticky:customer:{customer_id}'
+
+
+def mark_customer_write(customer_id):
+    """Pin the customer's reads to the primary until the replica catches up."""
+    if replica_configured():
+        cache.set(_sticky_key(customer_id), 1, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def customer_recently_written(customer_id):
+    return cache.get(_sticky_key(customer_id)) is not None
+
+
+@contextmanager
+def replica_reads(customer_id=None):
+    """
+    Route reads inside the block to the replica when that is safe.
+
+    Yields True if the replica is in use, so callers can retry a miss on the
+    primary (e.g. a loan id created a moment ago).
+    """
+    use_replica = replica_configured() and not (
+        customer_id is not None and customer_recently_written(customer_id)
+    )
+    token = _use_replica.set(use_replica)
+    try:
+        yield use_replica
+    finally:
+        _use_replica.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(customer_id=None):
+    """Async variant of `replica_reads`; the ORM's worker threads inherit the routing."""
+    use_replica = replica_configured() and not (
+        customer_id is not None and await cache.aget(_sticky_key(customer_id)) is not None
+    )
+    token = _use_replica.set(use_replica)
+    try:
+        yield use_replica
+    finally:
+        _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica inside `replica_reads()`, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return None
+        # Reads that are part of a write transaction must see its own changes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
@@ -0,0 +1,170 @@
+"""
+Interest-rate shock scenarios over the loan book.
+
+Re-applies the eligibility rules of `decide_eligibility` to every active
+(APPROVED) and pending loan under a rate shift and/or changed band
+minimum rates and EMI cap, and reports which loans would flip. The book is
+read in one query together with each customer's salary and stored credit
+score (CustomerCreditScore, so a score still waiting for its scheduled
+refresh is used as stored), and converted to arrays a chunk at a time as
+`core.simulation.load_loan_book` does. EMIs are recomputed for all loans at
+once with NumPy, and each customer's other EMIs come from a bincount over
+the recomputed values, so the cost is a few array passes over the book.
+
+Results keep the counts for every affected customer but list at most
+`max_customer_ids` of them, since they are stored on a SimulationRun.
+"""
+import time
+
+import numpy as np
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Coalesce
+
+from .models import Loan
+from .scoring import SCORE_BANDS
+
+# The rules in decide_eligibility: minimum annual rate per score band
+# (None = never approved) and the share of salary total EMIs may take
+DEFAULT_POLICY = {
+    'min_rates': {'<=10': None, '11-30': 16.0, '31-50': 12.0, '>50': 0.0},
+    'emi_cap_ratio': 0.5,
+}
+
+
+def load_scenario_book(statuses=('APPROVED', 'PENDING'), chunk_size=50000):
+    """
+    Loans with `statuses` and their customer's salary and score, as arrays.
+
+    Rows are converted a chunk at a time so the Python objects for the
+    whole book never exist at once.
+    """
+    rows = (
+        Loan.objects.filter(status__in=statuses)
+        .order_by()
+        .annotate(score=Coalesce(F('customer__credit_score__score'), Value(50.0), output_field=FloatField()))
+        .values_list(
+            'customer_id', 'status', 'loan_amount', 'interest_rate', 'tenure',
+            'customer__monthly_salary', 'score'
+        )
+    )
+    id_chunks, status_chunks, number_chunks = [], [], []
+
+    def flush(chunk):
+        customer_ids, loan_status, *columns = zip(*chunk)
+        id_chunks.append(np.array(customer_ids, dtype=object))
+        status_chunks.append(np.array(loan_status, dtype=object))
+        number_chunks.append(np.array(list(zip(*columns)), dtype=np.float64))
+
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if number_chunks:
+        customer_ids = np.concatenate(id_chunks)
+        status = np.concatenate(status_chunks)
+        numbers = np.concatenate(number_chunks)
+    else:
+        customer_ids, status, numbers = np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty((0, 5))
+
+    customers, customer_index = np.unique(customer_ids, return_inverse=True)
+    amount, rate, tenure, salary, score = numbers.T
+    return {
+        'customers': customers,
+        'customer_index': customer_index,
+        'status': status,
+        'amount': amount,
+        'rate': rate,
+        'tenure': tenure,
+        'salary': salary,
+        'score': score,
+    }
+
+
+def annuity_payment(principal, annual_rate, tenure):
+    """Vectorised `monthly_installment`."""
+    monthly_rate = annual_rate / 1200
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + monthly_rate) ** tenure
+        emi = principal * monthly_rate * growth / (growth - 1)
+    return np.round(np.where(monthly_rate > 0, emi, principal / tenure), 2)
+
+
+def band_min_rates(score, min_rates):
+    """Minimum rate for each score under `min_rates`; NaN where never approved."""
+    result = np.full(score.shape, np.nan)
+    lower = -np.inf
+    for label, upper in SCORE_BANDS:
+        in_band = score > lower if upper is None else (score > lower) & (score <= upper)
+        minimum = min_rates.get(label)
+        result[in_band] = np.nan if minimum is None else minimum
+        lower = upper if upper is not None else lower
+    return result
+
+
+def evaluate(book, rate_shift=0.0, policy=None):
+    """Eligibility of every loan in `book` under the rate shift and policy."""
+    policy = {**DEFAULT_POLICY, **(policy or {})}
+    min_rates = {**DEFAULT_POLICY['min_rates'], **policy['min_rates']}
+
+    rate = np.maximum(book['rate'] + rate_shift, 0)
+    emi = annuity_payment(book['amount'], rate, book['tenure'])
+
+    # Other approved EMIs of the same customer, at the shifted rates
+    approved_emi = np.where(book['status'] == 'APPROVED', emi, 0)
+    customer_emi = np.bincount(book['customer_index'], weights=approved_emi, minlength=len(book['customers']))
+    other_emi = customer_emi[book['customer_index']] - approved_emi
+
+    band_minimum = band_min_rates(book['score'], min_rates)
+    within_cap = other_emi + emi <= book['salary'] * policy['emi_cap_ratio']
+    # Comparisons against NaN are False: the band is rejected outright
+    rate_allowed = rate >= band_minimum
+    return within_cap & rate_allowed
+
+
+def run_rate_shock(rate_shift=0.0, policy=None, statuses=('APPROVED', 'PENDING'), book=None,
+                   max_customer_ids=1000):
+    """
+    Compare eligibility under the current rules with the scenario.
+
+    Returns flip counts overall and per loan status, the number of
+    customers with at least one loan that flips, and up to
+    `max_customer_ids` of their ids.
+    """
+    started = time.perf_counter()
+    book = book if book is not None else load_scenario_book(statuses)
+    baseline = evaluate(book)
+    scenario = evaluate(book, rate_shift=rate_shift, policy=policy)
+
+    to_ineligible = baseline & ~scenario
+    to_eligible = ~baseline & scenario
+    flipped = to_ineligible | to_eligible
+    affected = book['customers'][np.unique(book['customer_index'][flipped])]
+
+    by_status = {}
+    for loan_status in statuses:
+        rows = book['status'] == loan_status
+        by_status[loan_status] = {
+            'loans': int(rows.sum()),
+            'flipped_to_ineligible': int((to_ineligible & rows).sum()),
+            'flipped_to_eligible': int((to_eligible & rows).sum()),
+        }
+
+    return {
+        'rate_shift': rate_shift,
+        'loans_evaluated': int(book['amount'].size),
+        'customers_evaluated': int(len(book['customers'])),
+        'eligible_before': int(baseline.sum()),
+        'eligible_after': int(scenario.sum()),
+        'flipped_to_ineligible': int(to_ineligible.sum()),
+        'flipped_to_eligible': int(to_eligible.sum()),
+        'by_status': by_status,
+        'affected_customers': int(affected.size),
+        'affected_customer_ids': [str(customer_id) for customer_id in affected[:max_customer_ids]],
+        'affected_customer_ids_truncated': bool(affected.size > max_customer_ids),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,210 @@
+"""
+Credit scoring and eligibility rules shared by the sync and async views.
+
+Everything here is pure Python working on pre-fetched numbers so the same
+rules can run after a sync `aggregate()` or an async `aaggregate()` call.
+"""
+from django.db.models import Count, Max, Q, Sum
+
+
+# Credit score bands, as used by get_corrected_interest_rate:
+# (label, inclusive upper bound)
+SCORE_BANDS = (
+    ('<=10', 10),
+    ('11-30', 30),
+    ('31-50', 50),
+    ('>50', None),
+)
+
+
+def history_aggregates(current_year_start, prefix=''):
+    """
+    Aggregates over a customer's loans needed by the credit score.
+
+    Collapses the loan history into a single query instead of loading every
+    loan and issuing one count/sum query per score component. Pass
+    prefix='loans__' to annotate customers instead of aggregating loans.
+    """
+    return {
+        'total_loans': Count(f'{prefix}pk'),
+        'total_emis': Sum(f'{prefix}tenure'),
+        'emis_paid_on_time': Sum(f'{prefix}emis_paid_on_time'),
+        'current_year_loans': Count(f'{prefix}pk', filter=Q(**{f'{prefix}start_date__gte': current_year_start})),
+        'total_approved_amount': Sum(f'{prefix}loan_amount'),
+    }
+
+
+# Aggregates also kept for archived loans (CustomerLoanHistory); archived
+# loans all started before the current year
+ARCHIVED_HISTORY_FIELDS = ('total_loans', 'total_emis', 'emis_paid_on_time', 'total_approved_amount')
+
+
+def archived_history_aggregates():
+    """
+    Aggregates reading a customer's CustomerLoanHistory, to combine with
+    `history_aggregates(prefix='loans__')` on a Customer queryset. The
+    relation is one-to-one, so Max() just reads the stored value.
+    """
+    return {f'archived_{field}': Max(f'loan_history__{field}') for field in ARCHIVED_HISTORY_FIELDS}
+
+
+def add_archived_history(history):
+    """Fold the `archived_history_aggregates` values into `history`."""
+    for field in ARCHIVED_HISTORY_FIELDS:
+        archived = history.pop(f'archived_{field}', None)
+        if archived:
+            history[field] = (history[field] or 0) + archived
+    return history
+
+
+def score_band(credit_score):
+    """Label of the SCORE_BANDS entry `credit_score` falls in."""
+    for label, upper in SCORE_BANDS:
+        if upper is None or credit_score <= upper:
+            return label
+
+
+def credit_score_from_history(history, current_debt, approved_limit, monthly_salary):
+    """
+    Calculate credit score based on customer's loan history.
+    Returns a score between 0 and 100.
+    """
+    return credit_score_components(history, current_debt, approved_limit, monthly_salary)['credit_score']
+
+
+def credit_score_components(history, current_debt, approved_limit, monthly_salary):
+    """
+    The credit score with the part each rule contributed.
+
+    Returns a dict with `credit_score`, the four weighted components (None
+    when a short-circuit rule decided the score) and `rule`, naming the
+    short-circuit rule that applied, if any.
+    """
+    components = {
+        'credit_score': None,
+        'rule': None,
+        'payment_score': None,
+        'loan_count_score': None,
+        'current_year_score': None,
+        'volume_score': None,
+    }
+    total_loans = history['total_loans'] or 0
+
+    if not total_loans:
+        # No loan history - moderate score
+        components.update(credit_score=50, rule='no_history')
+        return components
+
+    total_emis = history['total_emis'] or 0  # Total EMIs across all loans
+    emis_paid_on_time = history['emis_paid_on_time'] or 0
+    current_year_loans = history['current_year_loans'] or 0
+    total_approved_amount = history['total_approved_amount'] or 0
+
+    # Check if current debt exceeds approved limit - Immediate disqualification
+    if current_debt > approved_limit:
+        components.update(credit_score=0, rule='debt_over_limit')
+        return components
+
+    # 1. Past Loans paid on time (35%)
+    if total_emis > 0:
+        payment_score = (emis_paid_on_time / total_emis) * 35
+    else:
+        payment_score = 17.5  # Neutral score for no history
+
+    # 2. Number of loans taken in past (15%)
+    # More loans means more credit history, but not too many
+    loan_count_score = min(total_loans * 5, 15)
+
+    # 3. Loan activity in current year (15%)
+    # Moderate activity is good, too many loans in current year is risky
+    current_year_score = 15 * (1 - min(current_year_loans / 4, 1))  # Penalize if more than 4 loans in current year
+
+    # 4. Loan approved volume vs salary (35%)
+    # Check if total approved amount is reasonable compared to annual salary
+    annual_salary = float(monthly_salary) * 12
+    loan_volume_ratio = float(total_approved_amount) / annual_salary if annual_salary > 0 else float('inf')
+
+    if loan_volume_ratio <= 3:  # Up to 3 years of salary is ideal
+        volume_score = 35
+    elif loan_volume_ratio <= 5:  # Up to 5 years of salary is okay
+        volume_score = 25
+    elif loan_volume_ratio <= 8:  # Up to 8 years of salary is risky
+        volume_score = 15
+    else:  # More than 8 years of salary is very risky
+        volume_score = 5
+
+    # Combine all scores
+    credit_score = payment_score + loan_count_score + current_year_score + volume_score
+
+    # Final adjustments
+    components.update(
+        credit_score=min(max(credit_score, 0), 100),  # Ensure score is between 0 and 100
+        payment_score=payment_score,
+        loan_count_score=loan_count_score,
+        current_year_score=current_year_score,
+        volume_score=volume_score,
+    )
+    return components
+
+
+def monthly_installment(principal, annual_rate, tenure):
+    """Calculate EMI using compound interest formula"""
+    monthly_rate = float(annual_rate) / (12 * 100)
+    if monthly_rate > 0:
+        emi = float(principal) * (monthly_rate * (1 + monthly_rate) ** tenure) / ((1 + monthly_rate) ** tenure - 1)
+    else:
+        emi = float(principal) / tenure
+    return round(emi, 2)
+
+
+def decide_eligibility(credit_score, loan_amount, interest_rate, tenure, current_emis, monthly_salary):
+    """
+    Apply the credit score bands and the 50%-of-salary EMI cap.
+    Returns a tuple of (is_eligible, message, corrected_rate, monthly_installment)
+
+    Credit score rules:
+    - credit_score > 50: approve at any rate
+    - 30 < credit_score <= 50: approve if rate >= 12%
+    - 10 < credit_score <= 30: approve if rate >= 16%
+    - credit_score <= 10: no approval
+    """
+    interest_rate = float(interest_rate)
+    corrected_rate = None
+
+    # First check: Credit score based approval
+    if credit_score <= 10:
+        return False, "Low credit score (≤ 10), loan cannot be approved", None, None
+
+    # Determine corrected interest rate based on credit score bands
+    if 10 < credit_score <= 30 and interest_rate < 16:
+        corrected_rate = 16.0  # Minimum rate for this band
+    elif 30 < credit_score <= 50 and interest_rate < 12:
+        corrected_rate = 12.0  # Minimum rate for this band
+
+    # Use corrected rate if needed, otherwise use original rate
+    final_rate = corrected_rate if corrected_rate else interest_rate
+
+    # Calculate monthly installment using final rate
+    installment = monthly_installment(loan_amount, final_rate, tenure)
+
+    # Check if total EMIs exceed 50% of monthly salary
+    total_emi_with_new_loan = float(current_emis or 0) + installment
+    if total_emi_with_new_loan > (float(monthly_salary) * 0.5):
+        return False, "Total EMIs would exceed 50% of monthly salary", corrected_rate, installment
+
+    # Final approval decision based on credit score bands and interest rates
+    if credit_score > 50:
+        # Approve at any interest rate
+        return True, None, corrected_rate, installment
+    elif 30 < credit_score <= 50:
+        # Must have at least 12% interest rate
+        if interest_rate < 12:
+            return False, "Interest rate must be at least 12% for credit score between 31-50", 12.0, installment
+        return True, None, corrected_rate, installment
+    elif 10 < credit_score <= 30:
+        # Must have at least 16% interest rate
+        if interest_rate < 16:
+            return False, "Interest rate must be at least 16% for credit score between 11-30", 16.0, installment
+        return True, None, corrected_rate, installment
+
+    return False, "Invalid credit score scenario", None, None  # Fallback case
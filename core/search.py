@@ -0,0 +1,154 @@
+"""
+Customer search by phone number prefix or name, for support staff.
+
+A query made only of digits (spaces, `+`, `-` and parentheses are ignored)
+is a phone number prefix. Anything else is a name search: every word has
+to appear in the first or the last name, case-insensitively, and at least
+one word needs NAME_MIN_LENGTH characters for the trigram index to narrow
+the search.
+
+Both searches are served by indexes on PostgreSQL (migration 0008):
+
+- Phone prefix: `phone_number LIKE '<digits>%'`. This uses the
+  varchar_pattern_ops index Django creates next to the unique index. The
+  matches are sorted after the lookup, and PHONE_MIN_DIGITS keeps that
+  set small. SQLite's LIKE cannot use an index, so there the prefix
+  becomes a range on the unique index.
+- Names: trigram GIN indexes on UPPER(first_name) and UPPER(last_name)
+  match the UPPER(...) LIKE that `icontains` compiles to. Results are
+  ordered by (last_name, first_name, customer_id), which
+  `customer_name_idx` covers. SQLite has no trigram indexes and scans.
+
+Pages are keyset-paginated: the cursor holds the sort key of the last row
+returned, so page 1000 costs the same as page 1. On PostgreSQL a search
+that runs longer than CUSTOMER_SEARCH_TIMEOUT_MS is cancelled
+(SearchTimeout) rather than left to hold a connection.
+"""
+import base64
+import json
+import re
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Q
+
+from . import metrics
+from .models import Customer
+
+NAME_MIN_LENGTH = 3
+PHONE_MIN_DIGITS = 4
+MAX_NAME_WORDS = 4
+
+PHONE_QUERY = re.compile(r'^[\d\s+()-]+$')
+
+ORDERING = {
+    'phone': ('phone_number',),
+    'name': ('last_name', 'first_name', 'customer_id'),
+}
+
+
+class SearchTimeout(Exception):
+    """The search ran longer than CUSTOMER_SEARCH_TIMEOUT_MS."""
+
+
+def parse_query(query):
+    """
+    ('phone', digits) or ('name', words) for a search string.
+
+    Raises ValueError if the query is too short to be served by an index.
+    """
+    query = query.strip()
+    if PHONE_QUERY.match(query):
+        digits = re.sub(r'\D', '', query)
+        if len(digits) < PHONE_MIN_DIGITS:
+            raise ValueError(f'Enter at least {PHONE_MIN_DIGITS} digits of the phone number.')
+        return 'phone', digits
+    words = query.split()[:MAX_NAME_WORDS]
+    if not any(len(word) >= NAME_MIN_LENGTH for word in words):
+        raise ValueError(f'Enter at least {NAME_MIN_LENGTH} characters of a name.')
+    return 'name', words
+
+
+def encode_cursor(kind, customer):
+    key = [str(getattr(customer, field)) for field in ORDERING[kind]]
+    return base64.urlsafe_b64encode(json.dumps([kind, *key]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(kind, cursor):
+    """The sort key in `cursor`; ValueError if it is malformed or for another kind of search."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_kind, *key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor.')
+    if cursor_kind != kind or len(key) != len(ORDERING[kind]) or not all(isinstance(v, str) for v in key):
+        raise ValueError('Invalid cursor.')
+    return key
+
+
+def _phone_prefix(digits, vendor):
+    if vendor == 'postgresql':
+        return Q(phone_number__startswith=digits)
+    # Digits only, so the prefix's successor is the last digit + 1 (':' after '9')
+    return Q(phone_number__gte=digits, phone_number__lt=digits[:-1] + chr(ord(digits[-1]) + 1))
+
+
+def _after(kind, key):
+    """Rows after `key` in the search's order."""
+    if kind == 'phone':
+        return Q(phone_number__gt=key[0])
+    last_name, first_name, customer_id = key
+    # The redundant last_name >= bound lets the index scan start at the key
+    return Q(last_name__gte=last_name) & (
+        Q(last_name__gt=last_name)
+        | Q(last_name=last_name, first_name__gt=first_name)
+        | Q(last_name=last_name, first_name=first_name, customer_id__gt=customer_id)
+    )
+
+
+def search_queryset(query, cursor, vendor):
+    """The search's kind and its ordered, unsliced queryset."""
+    kind, terms = parse_query(query)
+    if kind == 'phone':
+        condition = _phone_prefix(terms, vendor)
+    else:
+        condition = Q()
+        for word in terms:
+            condition &= Q(first_name__icontains=word) | Q(last_name__icontains=word)
+    if cursor:
+        condition &= _after(kind, decode_cursor(kind, cursor))
+    return kind, Customer.objects.filter(condition).order_by(*ORDERING[kind])
+
+
+def search_customers(query, limit=20, cursor=None):
+    """
+    One page of customers matching `query`.
+
+    Returns (customers, next cursor or None). Raises ValueError for a bad
+    query or cursor and SearchTimeout when the search is cancelled.
+    """
+    alias = router.db_for_read(Customer)
+    connection = connections[alias]
+    kind, queryset = search_queryset(query, cursor, connection.vendor)
+    started = time.perf_counter()
+    try:
+        with transaction.atomic(using=alias):
+            if connection.vendor == 'postgresql' and settings.CUSTOMER_SEARCH_TIMEOUT_MS:
+                with connection.cursor() as db_cursor:
+                    db_cursor.execute(f'SET LOCAL statement_timeout = {int(settings.CUSTOMER_SEARCH_TIMEOUT_MS)}')
+            # One extra row tells whether there is a next page
+            customers = list(queryset.using(alias)[:limit + 1])
+    except OperationalError as exc:
+        # psycopg's QueryCanceled is an OperationalError; anything else is not ours
+        if getattr(exc.__cause__, 'sqlstate', None) != '57014':
+            raise
+        metrics.inc('customer_search_timeouts_total', kind=kind)
+        raise SearchTimeout(kind) from exc
+    metrics.observe('customer_search_seconds', time.perf_counter() - started, kind=kind)
+
+    next_cursor = None
+    if len(customers) > limit:
+        customers = customers[:limit]
+        next_cursor = encode_cursor(kind, customers[-1])
+    return customers, next_cursor
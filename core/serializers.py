@@ -1,6 +1,26 @@
 from rest_framework import serializers
 from decimal import Decimal
-from .models import Customer, Loan
+from .models import Customer, Loan, LoanOffer
+from .scoring import SCORE_BANDS
+
+
+class NativeDecimalsMixin:
+    """
+    Decimals as numbers rather than strings for binary renderers.
+
+    Applies when the request's renderer sets `native_decimals`
+    (core.renderers.MessagePackRenderer); JSON keeps DRF's quoted strings.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if getattr(getattr(request, 'accepted_renderer', None), 'native_decimals', False):
+            for field in fields.values():
+                if isinstance(field, serializers.DecimalField):
+                    field.coerce_to_string = False
+        return fields
+
 
 class CustomerRegistrationSerializer(serializers.Serializer):
     first_name = serializers.CharField(max_length=100)
@@ -13,7 +33,7 @@ class CustomerRegistrationSerializer(serializers.Serializer):
         # Convert monthly_income to monthly_salary and calculate approved_limit
         monthly_salary = validated_data.pop('monthly_income')
         # Round to nearest lakh (100,000)
-        approved_limit = round(36 * monthly_salary, -5)
+        approved_limit = Customer.approved_limit_for(monthly_salary)
         
         return Customer.objects.create(
             monthly_salary=monthly_salary,
@@ -80,7 +100,7 @@ class LoanCustomerSerializer(serializers.ModelSerializer):
         fields = ['customer_id', 'first_name', 'last_name', 'age', 'phone_number']
 
 
-class LoanDetailsSerializer(serializers.ModelSerializer):
+class LoanDetailsSerializer(NativeDecimalsMixin, serializers.ModelSerializer):
     customer = LoanCustomerSerializer(read_only=True)
     
     class Meta:
@@ -88,7 +108,11 @@ class LoanDetailsSerializer(serializers.ModelSerializer):
         fields = ['loan_id', 'loan_amount', 'interest_rate', 'tenure', 'monthly_installment', 'customer']
 
 
-class CustomerLoanListSerializer(serializers.ModelSerializer):
+class LoanBatchLookupSerializer(serializers.Serializer):
+    loan_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+
+
+class CustomerLoanListSerializer(NativeDecimalsMixin, serializers.ModelSerializer):
     repayments_left = serializers.SerializerMethodField()
     
     class Meta:
@@ -97,3 +121,69 @@ class CustomerLoanListSerializer(serializers.ModelSerializer):
     
     def get_repayments_left(self, obj):
         return obj.tenure - obj.emis_paid_on_time
+
+
+class LoanOfferSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanOffer
+        fields = ['tenure', 'max_principal', 'interest_rate', 'rate_floor', 'monthly_installment']
+
+
+class LoanPaymentSerializer(serializers.Serializer):
+    payment_reference = serializers.CharField(max_length=64)
+    loan_id = serializers.UUIDField()
+    paid_on_time = serializers.BooleanField(default=True)
+    paid_at = serializers.DateTimeField(required=False)
+
+
+class LoanPaymentBatchSerializer(serializers.Serializer):
+    payments = LoanPaymentSerializer(many=True, allow_empty=False, max_length=5000)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    # Not `format`: DRF reserves that query parameter for renderer selection
+    file_format = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    compress = serializers.ChoiceField(choices=['gzip'], required=False)
+    status = serializers.ChoiceField(choices=Loan.LOAN_STATUS_CHOICES, required=False)
+    created_from = serializers.DateField(required=False)
+    created_to = serializers.DateField(required=False)
+    start_date_from = serializers.DateField(required=False)
+    start_date_to = serializers.DateField(required=False)
+
+
+class CustomerSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    cursor = serializers.CharField(max_length=500, required=False)
+
+
+class CustomerSearchResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ['customer_id', 'first_name', 'last_name', 'phone_number', 'age']
+
+
+class EventStreamQuerySerializer(serializers.Serializer):
+    cursor = serializers.RegexField(r'^\d+(-\d+)?$', max_length=41, default='0')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class RateShockScenarioSerializer(serializers.Serializer):
+    rate_shift = serializers.FloatField(min_value=-50, max_value=50, default=0.0)
+    # Minimum annual rate per credit score band; null means never approved
+    min_rates = serializers.DictField(
+        child=serializers.FloatField(min_value=0, max_value=100, allow_null=True),
+        required=False
+    )
+    emi_cap_ratio = serializers.FloatField(min_value=0, max_value=1, required=False)
+    statuses = serializers.MultipleChoiceField(
+        choices=['APPROVED', 'PENDING'],
+        default=['APPROVED', 'PENDING']
+    )
+    max_customer_ids = serializers.IntegerField(min_value=0, max_value=100000, default=1000)
+
+    def validate_min_rates(self, value):
+        unknown = set(value) - {label for label, _ in SCORE_BANDS}
+        if unknown:
+            raise serializers.ValidationError(f"Unknown score bands: {', '.join(sorted(unknown))}")
+        return value
@@ -0,0 +1,208 @@
+"""
+Monte Carlo default and cash-flow simulation over the active loan book.
+
+The approved loans are loaded once as NumPy arrays (principal, rate, tenure,
+EMI, EMIs paid, credit score). Each path walks every loan month by month
+over its remaining term, and all paths in a batch advance together as one
+(paths x loans) array, so there is no Python loop over loans. Per month a
+loan that is still open either defaults (probability from the customer's
+credit score, scaled by the scenario), prepays in full, or pays its EMI.
+
+Paths are split into batches sized so a batch's working arrays stay within
+`memory_limit_mb`, and the batches run on a process pool. Each batch gets
+an independent seed from one SeedSequence, so results are reproducible for
+a given seed whatever the worker count.
+
+The kernel is plain NumPy and this module only imports Django models
+inside `load_loan_book`, so pool workers never need Django set up.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Annual default probability by credit score: a logistic curve that is
+# ~24% at score 0, ~3% at 50 (the no-history score) and under 0.2% above 80
+MAX_ANNUAL_DEFAULT = 0.25
+SCORE_MIDPOINT = 30.0
+SCORE_SCALE = 10.0
+
+# Working arrays per (path, loan) cell: uniform draws, balances, masks
+_BYTES_PER_CELL = 8 * 4
+
+BOOK_FIELDS = ('principal', 'monthly_rate', 'tenure', 'emi', 'paid', 'score')
+
+# Book arrays shared with pool workers through the initializer
+_worker_book = None
+
+
+def load_loan_book(chunk_size=50000):
+    """
+    The approved loans as a dict of float64 arrays keyed by BOOK_FIELDS.
+
+    Scores come from the stored CustomerCreditScore (50 when missing).
+    Rows are converted a chunk at a time so the Python objects for the
+    whole book never exist at once.
+    """
+    from django.db.models import F, FloatField, Value
+    from django.db.models.functions import Coalesce
+
+    from .models import Loan
+
+    rows = (
+        Loan.objects.filter(status='APPROVED')
+        .order_by()
+        .annotate(score=Coalesce(F('customer__credit_score__score'), Value(50.0), output_field=FloatField()))
+        .values_list('loan_amount', 'interest_rate', 'tenure', 'monthly_installment', 'emis_paid_on_time', 'score')
+    )
+    chunks = []
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            chunks.append(np.array(chunk, dtype=np.float64))
+            chunk = []
+    if chunk:
+        chunks.append(np.array(chunk, dtype=np.float64))
+
+    table = np.concatenate(chunks) if chunks else np.empty((0, len(BOOK_FIELDS)))
+    book = dict(zip(BOOK_FIELDS, table.T.copy()))
+    book['monthly_rate'] = book['monthly_rate'] / 1200
+    return book
+
+
+def monthly_default_probability(scores, multiplier=1.0):
+    """Monthly default hazard for each credit score."""
+    annual = MAX_ANNUAL_DEFAULT / (1 + np.exp((np.asarray(scores) - SCORE_MIDPOINT) / SCORE_SCALE))
+    annual = np.clip(annual * multiplier, 0.0, 1.0)
+    return 1 - (1 - annual) ** (1 / 12)
+
+
+def outstanding_balance(principal, monthly_rate, tenure, instalments_paid):
+    """Amortised principal left after `instalments_paid` EMIs."""
+    k = np.minimum(instalments_paid, tenure)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth_n = (1 + monthly_rate) ** tenure
+        growth_k = (1 + monthly_rate) ** k
+        amortised = principal * (growth_n - growth_k) / (growth_n - 1)
+    linear = principal * (1 - k / tenure)
+    return np.where(monthly_rate > 0, amortised, linear)
+
+
+def _simulate_batch(book, paths, seed, default_multiplier, prepayment_rate, loss_given_default):
+    rng = np.random.default_rng(seed)
+    principal, rate, tenure = book['principal'], book['monthly_rate'], book['tenure']
+    emi, paid = book['emi'], book['paid']
+
+    remaining = np.maximum(tenure - paid, 0)
+    horizon = int(remaining.max()) if remaining.size else 0
+    hazard = monthly_default_probability(book['score'], default_multiplier)
+    # Annual prepayment rate to a single-month rate
+    prepay = 1 - (1 - prepayment_rate) ** (1 / 12)
+
+    open_loans = np.broadcast_to(remaining > 0, (paths, remaining.size)).copy()
+    cash = np.zeros((paths, horizon))
+    losses = np.zeros(paths)
+    defaults = np.zeros(paths)
+    prepayments = np.zeros(paths)
+
+    for month in range(horizon):
+        open_loans &= month < remaining
+        balance = outstanding_balance(principal, rate, tenure, paid + month)
+        after_payment = outstanding_balance(principal, rate, tenure, paid + month + 1)
+
+        draws = rng.random(open_loans.shape)
+        defaulted = open_loans & (draws < hazard)
+        prepaid = open_loans & ~defaulted & (draws < hazard + prepay)
+        paying = open_loans & ~defaulted
+
+        cash[:, month] = (
+            paying @ emi
+            + prepaid @ after_payment
+            + (defaulted @ balance) * (1 - loss_given_default)
+        )
+        losses += (defaulted @ balance) * loss_given_default
+        defaults += defaulted.sum(axis=1)
+        prepayments += prepaid.sum(axis=1)
+        open_loans &= ~(defaulted | prepaid)
+
+    return cash.sum(axis=0), losses, defaults, prepayments
+
+
+def _init_worker(book):
+    global _worker_book
+    _worker_book = book
+
+
+def _run_batch(paths, seed, *scenario):
+    return _simulate_batch(_worker_book, paths, seed, *scenario)
+
+
+def _pool_context():
+    # fork shares the book with workers without pickling it per worker
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def simulate_portfolio(book, paths=2000, default_multiplier=1.0, prepayment_rate=0.05,
+                       loss_given_default=0.6, seed=None, workers=None, memory_limit_mb=256):
+    """
+    Run `paths` simulated paths over `book` and return a result summary.
+
+    `default_multiplier` scales every default probability (the stress
+    scenario), `prepayment_rate` is the annual share of open loans repaid
+    early and `loss_given_default` the share of a defaulted balance lost.
+    `workers=1` runs in-process; daemonic processes (e.g. Celery prefork
+    children) cannot start a pool and also run in-process.
+    """
+    started = time.perf_counter()
+    loans = book['principal'].size
+    batch_paths = max(1, min(paths, (memory_limit_mb << 20) // max(1, loans * _BYTES_PER_CELL)))
+    sizes = [batch_paths] * (paths // batch_paths)
+    if paths % batch_paths:
+        sizes.append(paths % batch_paths)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    scenario = (default_multiplier, prepayment_rate, loss_given_default)
+
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        workers = 1
+        results = [_simulate_batch(book, size, batch_seed, *scenario) for size, batch_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=_pool_context(), initializer=_init_worker, initargs=(book,)
+        ) as pool:
+            results = list(pool.map(
+                _run_batch, sizes, seeds, *([value] * len(sizes) for value in scenario)
+            ))
+
+    cash = sum(result[0] for result in results)
+    losses = np.concatenate([result[1] for result in results])
+    defaults = np.concatenate([result[2] for result in results])
+    prepayments = np.concatenate([result[3] for result in results])
+    expected_cash = cash / paths
+
+    exposure = float(outstanding_balance(
+        book['principal'], book['monthly_rate'], book['tenure'], book['paid']
+    ).sum())
+    expected_loss = float(losses.mean())
+    return {
+        'loans': int(loans),
+        'paths': int(paths),
+        'batches': len(sizes),
+        'workers': workers,
+        'exposure': round(exposure, 2),
+        'expected_loss': round(expected_loss, 2),
+        'expected_loss_rate': round(expected_loss / exposure, 6) if exposure else 0.0,
+        'loss_percentiles': {
+            str(q): round(float(np.percentile(losses, q)), 2) for q in (50, 95, 99)
+        },
+        'expected_defaults': round(float(defaults.mean()), 2),
+        'expected_prepayments': round(float(prepayments.mean()), 2),
+        'expected_total_cash_flow': round(float(expected_cash.sum()), 2),
+        'expected_monthly_cash_flow': [round(float(value), 2) for value in expected_cash],
+        'seconds': round(time.perf_counter() - started, 3),
+    }
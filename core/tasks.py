@@ -1,8 +1,14 @@
-import pandas as pd
 from celery import shared_task
 from datetime import datetime
+from django.conf import settings
 from django.db import transaction
-from .models import Customer, Loan
+from django.utils import timezone
+from . import outbox, tracing
+from .maintenance import close_matured_loans, reconcile_current_debt
+from .models import Customer, Loan, SimulationRun
+from .payments import apply_pending_payments, record_payments
+from .portfolio import refresh_stale_credit_scores
+from .routers import replica_reads
 
 @shared_task
 def example_task():
@@ -14,13 +20,19 @@ def import_excel_data(customer_file_path, loan_file_path):
     """
     Import customer and loan data from Excel files.
     """
+    # Imported here: pandas costs every web and worker process about half a
+    # second of boot time and tens of MB, and only the importer needs it
+    import pandas as pd
+
     try:
         # Read customer data
-        df_customers = pd.read_excel(customer_file_path)
-        df_loans = pd.read_excel(loan_file_path)
+        with tracing.span('read_excel'):
+            df_customers = pd.read_excel(customer_file_path)
+            df_loans = pd.read_excel(loan_file_path)
         
         # Process customers first
-        with transaction.atomic():
+        with tracing.span('import_customers', rows=len(df_customers)), transaction.atomic():
+            events = []
             for _, row in df_customers.iterrows():
                 customer = Customer(
                     first_name=row['first_name'],
@@ -30,13 +42,25 @@ def import_excel_data(customer_file_path, loan_file_path):
                     age=int(row['age'])
                 )
                 customer.save()  # This will auto-calculate approved_limit
+                events.append(outbox.event(
+                    'customer.registered', 'customer', customer.customer_id, customer.customer_id,
+                    age=customer.age,
+                    monthly_salary=customer.monthly_salary,
+                    approved_limit=customer.approved_limit,
+                ))
+            outbox.record_events(events)
         
         # Process loans
-        with transaction.atomic():
+        with tracing.span('import_loans', rows=len(df_loans)), transaction.atomic():
+            events = []
             for _, row in df_loans.iterrows():
-                # Get customer by phone number (assuming it's unique)
+                # Get customer by phone number (assuming it's unique); locked
+                # so the loan's outbox event is ordered with the customer's
+                # other events
                 try:
-                    customer = Customer.objects.get(phone_number=str(row['customer_phone_number']))
+                    customer = Customer.objects.select_for_update().get(
+                        phone_number=str(row['customer_phone_number'])
+                    )
                     
                     # Parse dates
                     start_date = pd.to_datetime(row['start_date']).date()
@@ -57,13 +81,250 @@ def import_excel_data(customer_file_path, loan_file_path):
                         status=row.get('status', 'APPROVED')
                     )
                     loan.save()  # This will auto-calculate monthly_installment
+                    events.append(outbox.event(
+                        'loan.created', 'loan', loan.loan_id, customer.customer_id,
+                        loan_amount=loan.loan_amount,
+                        interest_rate=loan.interest_rate,
+                        tenure=loan.tenure,
+                        monthly_installment=loan.monthly_installment,
+                        start_date=loan.start_date,
+                        end_date=loan.end_date,
+                        status=loan.status,
+                    ))
                     
                 except Customer.DoesNotExist:
                     print(f"Customer with phone number {row['customer_phone_number']} not found")
                 except Exception as e:
                     print(f"Error processing loan: {str(e)}")
+            outbox.record_events(events)
         
         return "Data import completed successfully"
     
     except Exception as e:
         return f"Error importing data: {str(e)}"
+
+
+@shared_task
+def update_salaries_task(payroll_file_path):
+    """
+    Apply a monthly payroll file: salaries, approved limits and the stale
+    flags that follow from them (see core.payroll).
+    """
+    from .payroll import update_salaries
+
+    return update_salaries(payroll_file_path)
+
+
+@shared_task
+def ingest_loan_payments(payments):
+    """
+    Store a batch of payment events and fold them into the loan counters.
+
+    `payments` are dicts as accepted by the /api/payments/ endpoint.
+    """
+    accepted, duplicates, unknown = record_payments(payments)
+    summary = apply_pending_payments()
+    summary.update(accepted=accepted, duplicates=duplicates, unknown_loans=len(unknown))
+    return summary
+
+
+@shared_task
+def apply_loan_payments(batch_size=10000):
+    """Drain the unapplied payment backlog in batches of `batch_size`."""
+    totals = {'events': 0, 'rejected': 0, 'loans_updated': 0, 'seconds': 0.0}
+    while True:
+        summary = apply_pending_payments(batch_size)
+        if not summary['events']:
+            break
+        for key in totals:
+            totals[key] += summary[key]
+    totals['events_per_sec'] = round(totals['events'] / totals['seconds'], 1) if totals['seconds'] else 0.0
+    return totals
+
+
+@shared_task
+def close_matured_loans_task(chunk_size=1000):
+    """
+    Close approved loans past their end date or fully paid, and recompute
+    the affected customers' current_debt. Scheduled nightly by Celery beat.
+    """
+    return close_matured_loans(chunk_size=chunk_size)
+
+
+@shared_task
+def archive_loans_task(chunk_size=1000):
+    """
+    Move old closed and rejected loans to the archive (see core.archive).
+    Scheduled nightly by Celery beat, after the closure sweep.
+    """
+    from .archive import archive_loans
+
+    return archive_loans(chunk_size=chunk_size)
+
+
+@shared_task
+def reconcile_current_debt_task(dry_run=False):
+    """Repair Customer.current_debt drift and return the drift report."""
+    return reconcile_current_debt(dry_run=dry_run)
+
+
+@shared_task
+def refresh_credit_scores(batch_size=1000):
+    """
+    Recompute credit scores flagged stale by loan writes and update the
+    portfolio band counters. Scheduled every few minutes by Celery beat.
+    """
+    return refresh_stale_credit_scores(batch_size=batch_size)
+
+
+@shared_task
+def refresh_loan_offers_task(full=False):
+    """
+    Recompute pre-approved offers (see core.offers) for customers changed
+    since the last run, after bringing stale credit scores up to date.
+    Scheduled nightly by Celery beat.
+    """
+    from .offers import refresh_loan_offers
+
+    refresh_stale_credit_scores()
+    return refresh_loan_offers(full=full)
+
+
+@shared_task
+def write_eligibility_decisions(records):
+    """Insert a batch of buffered eligibility decisions (core.decision_log)."""
+    from .decision_log import write_decisions
+
+    return write_decisions(records)
+
+
+@shared_task
+def drain_decision_log():
+    """
+    Write the eligibility decisions buffered in Redis (or in this worker's
+    memory buffer). Scheduled every few seconds by Celery beat.
+    """
+    from .decision_log import drain
+
+    return drain()
+
+
+@shared_task
+def maintain_decision_log():
+    """
+    Create upcoming monthly partitions of the decision log and drop the
+    ones past DECISION_LOG_RETENTION_MONTHS. Scheduled daily.
+    """
+    from .decision_log import ensure_partitions, prune_decision_log
+
+    created = ensure_partitions()
+    pruned = prune_decision_log(settings.DECISION_LOG_RETENTION_MONTHS)
+    return {'created': created, 'pruned': pruned}
+
+
+@shared_task
+def prune_outbox_task():
+    """
+    Delete outbox events published more than OUTBOX_RETENTION_DAYS ago
+    (see core.outbox). Scheduled daily.
+    """
+    from .outbox import prune_outbox
+
+    return prune_outbox(settings.OUTBOX_RETENTION_DAYS)
+
+
+@shared_task
+def snapshot_loan_book(incremental=True):
+    """
+    Write a Parquet snapshot of the loan book (see core.snapshots) and
+    return a short summary of its manifest.
+    """
+    from .snapshots import write_loan_snapshot
+
+    manifest = write_loan_snapshot(incremental=incremental)
+    return {
+        'snapshot_id': manifest['snapshot_id'],
+        'mode': manifest['mode'],
+        'row_count': manifest['row_count'],
+        'files': len(manifest['files']),
+    }
+
+
+@shared_task
+def run_portfolio_simulation(paths=2000, default_multiplier=1.0, prepayment_rate=0.05,
+                             loss_given_default=0.6, seed=None):
+    """
+    Monte Carlo default and cash-flow simulation of the approved loan book
+    (see core.simulation). The summary is stored on a SimulationRun.
+
+    The process pool needs a non-daemonic worker, e.g. a worker started
+    with `--pool solo`; under prefork the paths run in the task process.
+    """
+    from .simulation import load_loan_book, simulate_portfolio
+
+    parameters = {
+        'paths': paths,
+        'default_multiplier': default_multiplier,
+        'prepayment_rate': prepayment_rate,
+        'loss_given_default': loss_given_default,
+        'seed': seed,
+    }
+    run = SimulationRun.objects.create(kind='monte_carlo', parameters=parameters)
+    try:
+        summary = simulate_portfolio(
+            load_loan_book(),
+            workers=settings.SIMULATION_WORKERS,
+            memory_limit_mb=settings.SIMULATION_MEMORY_MB,
+            **parameters
+        )
+    except Exception as exc:
+        SimulationRun.objects.filter(pk=run.pk).update(
+            status='FAILED', error=str(exc), finished_at=timezone.now()
+        )
+        raise
+
+    SimulationRun.objects.filter(pk=run.pk).update(
+        status='COMPLETED', summary=summary, finished_at=timezone.now()
+    )
+    return {
+        'run_id': run.pk,
+        'loans': summary['loans'],
+        'expected_loss': summary['expected_loss'],
+        'seconds': summary['seconds'],
+    }
+
+
+@shared_task
+def run_rate_shock_scenario(run_id):
+    """
+    Evaluate the rate shock scenario stored on SimulationRun `run_id` (see
+    core.scenarios) and store its summary there. The rate-shock endpoint
+    queues this for books too large to evaluate within a request.
+    """
+    from .scenarios import run_rate_shock
+
+    run = SimulationRun.objects.get(pk=run_id)
+    parameters = dict(run.parameters)
+    try:
+        with replica_reads():
+            summary = run_rate_shock(
+                rate_shift=parameters.pop('rate_shift'),
+                statuses=tuple(parameters.pop('statuses')),
+                max_customer_ids=parameters.pop('max_customer_ids'),
+                policy=parameters,
+            )
+    except Exception as exc:
+        SimulationRun.objects.filter(pk=run.pk).update(
+            status='FAILED', error=str(exc), finished_at=timezone.now()
+        )
+        raise
+
+    SimulationRun.objects.filter(pk=run.pk).update(
+        status='COMPLETED', summary=summary, finished_at=timezone.now()
+    )
+    return {
+        'run_id': run.pk,
+        'loans': summary['loans_evaluated'],
+        'flipped': summary['flipped_to_ineligible'] + summary['flipped_to_eligible'],
+        'seconds': summary['seconds'],
+    }
@@ -1,9 +1,48 @@
+import gzip
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import msgpack
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connections
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
 from decimal import Decimal
-from .models import Customer, Loan
+from . import admission, metrics, outbox, renderers, tracing
+from .archive import archive_loans
+from .customer_cache import get_customer
+from .decision_log import MemoryBuffer, prune_decision_log
+from .maintenance import close_matured_loans, reconcile_current_debt
+from .models import (
+    ArchivedLoan, Customer, CustomerCreditScore, CustomerLoanHistory, EligibilityDecision, Loan,
+    LoanOffer, LoanPayment, OutboxEvent, PortfolioBucket, SimulationRun, StagedSalary
+)
+from .scenarios import evaluate, load_scenario_book, run_rate_shock
+from .offers import refresh_loan_offers
+from .payments import apply_pending_payments
+from .payroll import update_salaries
+from .queue_metrics import queue_for
+from .portfolio import portfolio_summary, rebuild_portfolio, refresh_stale_credit_scores
+from .routers import PrimaryReplicaRouter, replica_reads
+from .simulation import load_loan_book, simulate_portfolio
+from .snapshots import write_loan_snapshot
+from .tasks import example_task, run_portfolio_simulation
+from .views import (
+    AsyncCustomerLoanListView, AsyncLoanDetailsView, AsyncLoanEligibilityView, BaseLoanEligibilityMixin,
+    ExportView
+)
 
 @pytest.fixture
 def api_client():
@@ -186,3 +225,1470 @@ class TestLoanCreation:
         else:
             # For 400, check field-specific validation error
             assert error_key in response.data
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncReadViews:
+    @pytest.fixture
+    def customer_with_loan(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        loan = api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id,
+            "loan_amount": 500000,
+            "interest_rate": 12.5,
+            "tenure": 24
+        }, format='json').data
+        return customer_id, loan['loan_id']
+
+    def test_loan_details_matches_sync_view(self, api_client, customer_with_loan):
+        _, loan_id = customer_with_loan
+        request = AsyncRequestFactory().get(f'/api/view-loan/{loan_id}/')
+        response = async_to_sync(AsyncLoanDetailsView.as_view())(request, loan_id=loan_id)
+
+        assert response.status_code == status.HTTP_200_OK
+        sync_data = api_client.get(reverse('view-loan', args=[loan_id])).json()
+        assert json.loads(response.content) == sync_data
+
+    def test_customer_loans_matches_sync_view(self, api_client, customer_with_loan):
+        customer_id, _ = customer_with_loan
+        request = AsyncRequestFactory().get(f'/api/view-loans/{customer_id}/')
+        response = async_to_sync(AsyncCustomerLoanListView.as_view())(request, customer_id=customer_id)
+
+        assert response.status_code == status.HTTP_200_OK
+        sync_data = api_client.get(reverse('view-customer-loans', args=[customer_id])).json()
+        assert json.loads(response.content) == sync_data
+
+    def test_eligibility_matches_sync_view(self, api_client, customer_with_loan):
+        customer_id, _ = customer_with_loan
+        payload = {"customer_id": customer_id, "loan_amount": 100000, "interest_rate": 8, "tenure": 12}
+        request = AsyncRequestFactory().post('/api/check-eligibility/', payload, content_type='application/json')
+        response = async_to_sync(AsyncLoanEligibilityView.as_view())(request)
+
+        assert response.status_code == status.HTTP_200_OK
+        sync_data = api_client.post(reverse('check-loan-eligibility'), payload, format='json').json()
+        assert json.loads(response.content) == sync_data
+
+    def test_unrepresentable_eligibility_answer_is_400_like_sync_view(self, api_client, customer_with_loan):
+        customer_id, _ = customer_with_loan
+        # The EMI of a one-month loan at 999% overflows monthly_installment
+        payload = {"customer_id": customer_id, "loan_amount": 9999999999, "interest_rate": 999, "tenure": 1}
+        request = AsyncRequestFactory().post('/api/check-eligibility/', payload, content_type='application/json')
+        response = async_to_sync(AsyncLoanEligibilityView.as_view())(request)
+
+        sync_response = api_client.post(reverse('check-loan-eligibility'), payload, format='json')
+        assert sync_response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'monthly_installment' in json.loads(response.content)
+
+    def test_missing_loan_returns_404(self):
+        loan_id = "00000000-0000-0000-0000-000000000000"
+        request = AsyncRequestFactory().get(f'/api/view-loan/{loan_id}/')
+        response = async_to_sync(AsyncLoanDetailsView.as_view())(request, loan_id=loan_id)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+class FakePool:
+    max_size = 4
+
+    def get_stats(self):
+        return {'pool_size': 3, 'pool_available': 1, 'requests_num': 12, 'requests_wait_ms': 250, 'requests_waiting': 0}
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_metrics_endpoint_renders_prometheus_text(self, api_client):
+        metrics.reset()
+        metrics.inc('loans_created_total', status='APPROVED')
+        metrics.observe('request_seconds', 0.02)
+
+        response = api_client.get(reverse('metrics'))
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.content.decode()
+        assert 'loans_created_total{status="APPROVED"} 1' in body
+        assert 'request_seconds_bucket{le="0.025"} 1' in body
+        assert 'request_seconds_count 1' in body
+
+    def test_histogram_buckets_render_in_bound_order(self):
+        metrics.reset()
+        metrics.observe('request_seconds', 3.0, path='/a')
+        metrics.observe('request_seconds', 3.0, path='/b')
+
+        lines = [line for line in metrics.render_prometheus().splitlines() if line.startswith('request_seconds')]
+        bounds = [line.split('le="')[1].split('"')[0] for line in lines if 'path="/a"' in line and '_bucket' in line]
+        assert bounds == [str(bound) for bound in metrics.DEFAULT_BUCKETS] + ['+Inf']
+        assert lines[len(bounds)] == 'request_seconds_sum{path="/a"} 3.0'
+        assert lines[len(bounds) + 1] == 'request_seconds_count{path="/a"} 1'
+
+    def test_label_values_are_escaped(self):
+        metrics.reset()
+        metrics.inc('odd_total', reason='say "hi"\\now\nplease')
+
+        assert 'odd_total{reason="say \\"hi\\"\\\\now\\nplease"} 1' in metrics.render_prometheus()
+
+    def test_pool_metrics_report_existing_pools(self, monkeypatch):
+        from django.db import connections
+        monkeypatch.setattr(type(connections['default']), '_connection_pools', {'default': FakePool()}, raising=False)
+
+        values = {name: value for name, labels, value, *_ in metrics.database_pool_metrics()}
+
+        assert values['db_pool_in_use'] == 2
+        assert values['db_pool_utilization'] == 0.5
+        assert values['db_pool_checkouts_total'] == 12
+        assert values['db_pool_wait_seconds_total'] == 0.25
+
+        body = metrics.render_prometheus()
+        assert '# TYPE db_pool_checkouts_total counter' in body
+        assert '# TYPE db_pool_wait_seconds_total counter' in body
+        assert '# TYPE db_pool_in_use gauge' in body
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+class TestReplicaRouting:
+    @pytest.fixture(autouse=True)
+    def replica_settings(self, settings):
+        settings.DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 100000, "interest_rate": 12, "tenure": 12
+        }, format='json')
+        return customer_id
+
+    def test_reads_stick_to_primary_after_a_write(self, api_client, customer_id):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = api_client.get(reverse('view-customer-loans', args=[customer_id]))
+
+        assert response.data['total_loans'] == 1
+        assert len(replica_queries) == 0
+
+    def test_reads_go_to_replica_once_sticky_window_passes(self, api_client, customer_id):
+        cache.clear()
+        get_customer(customer_id)  # customer lookups are served by the customer cache
+        with CaptureQueriesContext(connections['replica']) as replica_queries, \
+                CaptureQueriesContext(connections['default']) as primary_queries:
+            response = api_client.get(reverse('view-customer-loans', args=[customer_id]))
+
+        assert response.data['total_loans'] == 1
+        assert len(replica_queries) > 0
+        assert len(primary_queries) == 0
+
+    def test_writes_stay_on_primary(self):
+        router = PrimaryReplicaRouter()
+        with replica_reads():
+            assert router.db_for_read(Loan) == 'replica'
+            assert router.db_for_write(Loan) == 'default'
+        assert router.db_for_read(Loan) is None
+        assert router.allow_migrate('replica', 'core') is False
+
+
+@pytest.mark.django_db
+class TestCustomerCache:
+    @pytest.fixture
+    def customer(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return Customer.objects.get(customer_id=customer_id)
+
+    def test_second_lookup_is_served_from_local_tier(self, customer, django_assert_num_queries):
+        get_customer(customer.customer_id)
+        with django_assert_num_queries(0):
+            cached = get_customer(customer.customer_id)
+
+        assert cached.monthly_salary == customer.monthly_salary
+        assert cached.approved_limit == customer.approved_limit
+        assert metrics.get_counter('customer_cache_requests_total', tier='local', result='hit') >= 1
+
+    def test_save_invalidates_cached_customer(self, customer):
+        get_customer(customer.customer_id)
+        customer.monthly_salary = 90000
+        customer.save()
+
+        assert get_customer(customer.customer_id).monthly_salary == 90000
+
+    def test_loan_creation_refreshes_current_debt(self, api_client, customer):
+        get_customer(customer.customer_id)
+        api_client.post(reverse('create-loan'), {
+            "customer_id": str(customer.customer_id), "loan_amount": 100000, "interest_rate": 12, "tenure": 12
+        }, format='json')
+
+        assert get_customer(customer.customer_id).current_debt == Decimal('100000.00')
+
+    def test_loan_creation_reads_customer_from_primary(self, api_client, customer):
+        get_customer(customer.customer_id)
+        # A change the cached copy has not seen yet
+        Customer.objects.filter(pk=customer.pk).update(monthly_salary=0)
+        response = api_client.post(reverse('create-loan'), {
+            "customer_id": str(customer.customer_id), "loan_amount": 100000, "interest_rate": 12, "tenure": 12
+        }, format='json')
+
+        assert response.data['loan_approved'] is False
+
+    def test_missing_customer_raises(self):
+        with pytest.raises(Customer.DoesNotExist):
+            get_customer("00000000-0000-0000-0000-000000000000")
+
+
+@pytest.mark.django_db
+class TestLoanPayments:
+    @pytest.fixture(autouse=True)
+    def producer(self, api_client, django_user_model):
+        api_client.force_authenticate(django_user_model.objects.create_user('payments'))
+
+    @pytest.fixture
+    def loan_id(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 100000, "interest_rate": 12, "tenure": 12
+        }, format='json').data['loan_id']
+
+    def test_payments_increment_on_time_counter(self, api_client, loan_id):
+        payments = [
+            {"payment_reference": "ref-1", "loan_id": loan_id, "paid_on_time": True},
+            {"payment_reference": "ref-2", "loan_id": loan_id, "paid_on_time": True},
+            {"payment_reference": "ref-3", "loan_id": loan_id, "paid_on_time": False},
+        ]
+        response = api_client.post(reverse('loan-payments'), {"payments": payments}, format='json')
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['accepted'] == 3
+        assert Loan.objects.get(loan_id=loan_id).emis_paid_on_time == 2
+        assert not LoanPayment.objects.filter(applied=False).exists()
+
+    def test_replayed_payments_are_counted_once(self, api_client, loan_id):
+        payments = [{"payment_reference": "ref-1", "loan_id": loan_id}]
+        api_client.post(reverse('loan-payments'), {"payments": payments}, format='json')
+        response = api_client.post(reverse('loan-payments'), {"payments": payments + payments}, format='json')
+
+        assert response.data['accepted'] == 0
+        assert response.data['duplicates'] == 2
+        assert Loan.objects.get(loan_id=loan_id).emis_paid_on_time == 1
+
+    def test_on_time_count_is_capped_at_tenure(self, api_client, loan_id):
+        payments = [{"payment_reference": f"ref-{i}", "loan_id": loan_id} for i in range(14)]
+        api_client.post(reverse('loan-payments'), {"payments": payments[:10]}, format='json')
+        api_client.post(reverse('loan-payments'), {"payments": payments[10:]}, format='json')
+
+        assert Loan.objects.get(loan_id=loan_id).emis_paid_on_time == 12
+        assert metrics.get_counter('loan_payments_rejected_total') >= 2
+        LoanPayment.objects.create(payment_reference='ref-late', loan_id=loan_id, paid_at=timezone.now())
+        assert apply_pending_payments()['rejected'] == 1
+
+    def test_anonymous_payments_are_refused(self, loan_id):
+        payments = [{"payment_reference": "ref-1", "loan_id": loan_id}]
+        response = APIClient().post(reverse('loan-payments'), {"payments": payments}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not LoanPayment.objects.exists()
+
+    def test_unknown_loans_are_reported(self, api_client):
+        payments = [{"payment_reference": "ref-x", "loan_id": "00000000-0000-0000-0000-000000000000"}]
+        response = api_client.post(reverse('loan-payments'), {"payments": payments}, format='json')
+
+        assert response.data['accepted'] == 0
+        assert response.data['unknown_loans'] == ["ref-x"]
+
+
+@pytest.mark.django_db
+class TestLoanClosureSweep:
+    @pytest.fixture
+    def customer(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return Customer.objects.get(customer_id=customer_id)
+
+    def make_loan(self, customer, amount, end_date, emis_paid_on_time=0, tenure=12):
+        return Loan.objects.create(
+            customer=customer, loan_amount=amount, interest_rate=12, tenure=tenure,
+            start_date=end_date - timedelta(days=30 * tenure), end_date=end_date,
+            emis_paid_on_time=emis_paid_on_time, status='APPROVED'
+        )
+
+    def test_closes_matured_and_fully_paid_loans(self, customer):
+        today = date.today()
+        matured = self.make_loan(customer, 100000, today - timedelta(days=1))
+        paid_off = self.make_loan(customer, 50000, today + timedelta(days=90), emis_paid_on_time=12)
+        active = self.make_loan(customer, 70000, today + timedelta(days=90))
+        Customer.objects.filter(pk=customer.pk).update(current_debt=220000)
+
+        result = close_matured_loans(chunk_size=1)
+
+        assert result['loans_closed'] == 2
+        assert Loan.objects.get(pk=matured.pk).status == 'CLOSED'
+        assert Loan.objects.get(pk=paid_off.pk).status == 'CLOSED'
+        assert Loan.objects.get(pk=active.pk).status == 'APPROVED'
+        assert Customer.objects.get(pk=customer.pk).current_debt == Decimal('70000.00')
+
+    def test_sweep_is_idempotent(self, customer):
+        self.make_loan(customer, 100000, date.today() - timedelta(days=1))
+        close_matured_loans()
+
+        assert close_matured_loans() == {'loans_closed': 0, 'customers_updated': 0}
+        assert Customer.objects.get(pk=customer.pk).current_debt == 0
+
+
+@pytest.mark.django_db
+class TestDebtReconciliation:
+    @pytest.fixture
+    def customers(self):
+        customers = []
+        for index, debt in enumerate([0, 50000, 999]):
+            customer = Customer.objects.create(
+                first_name='Test', last_name=str(index), phone_number=f'90000000{index}',
+                monthly_salary=50000, approved_limit=1800000, age=30
+            )
+            Customer.objects.filter(pk=customer.pk).update(current_debt=debt)
+            Loan.objects.create(
+                customer=customer, loan_amount=50000, interest_rate=12, tenure=12,
+                start_date=date.today(), end_date=date.today() + timedelta(days=360), status='APPROVED'
+            )
+            customers.append(customer)
+        return customers
+
+    def test_dry_run_reports_without_repairing(self, customers):
+        report = reconcile_current_debt(dry_run=True)
+
+        assert report['mismatched'] == 2
+        assert report['under_stated'] == 2
+        assert report['repaired'] == 0
+        assert Customer.objects.get(pk=customers[0].pk).current_debt == 0
+
+    def test_repairs_drift_in_batches(self, customers):
+        report = reconcile_current_debt(batch_size=1)
+
+        assert report['repaired'] == 2
+        assert report['total_absolute_drift'] == '99001.00'
+        assert set(Customer.objects.values_list('current_debt', flat=True)) == {Decimal('50000.00')}
+        assert reconcile_current_debt()['mismatched'] == 0
+
+
+@pytest.mark.django_db
+class TestExport:
+    @pytest.fixture(autouse=True)
+    def staff(self, api_client, admin_user):
+        api_client.force_authenticate(admin_user)
+        return admin_user
+
+    @pytest.fixture
+    def loans(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return [
+            api_client.post(reverse('create-loan'), {
+                "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+            }, format='json').data['loan_id']
+        ]
+
+    def test_ndjson_export_streams_loans(self, api_client, loans):
+        response = api_client.get(reverse('export', args=['loans']), {'status': 'APPROVED'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert [row['loan_id'] for row in rows] == loans
+        assert rows[0]['loan_amount'] == '10000.00'
+
+    def test_gzipped_csv_export(self, api_client, loans):
+        response = api_client.get(reverse('export', args=['customers']), {'file_format': 'csv', 'compress': 'gzip'})
+
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        header, row = body.splitlines()
+        assert header.startswith('customer_id,first_name')
+        assert '1234567890' in row
+
+    def test_status_filter_excludes_other_loans(self, api_client, loans):
+        response = api_client.get(reverse('export', args=['loans']), {'status': 'CLOSED'})
+        assert b''.join(response.streaming_content) == b''
+
+    def test_export_is_staff_only(self, loans):
+        assert APIClient().get(reverse('export', args=['customers'])).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_asgi_requests_stream_asynchronously(self, loans, staff):
+        from rest_framework.test import force_authenticate
+
+        request = AsyncRequestFactory().get(reverse('export', args=['loans']))
+        force_authenticate(request, staff)
+        response = ExportView.as_view()(request, kind='loans')
+
+        async def read():
+            return [chunk async for chunk in response.streaming_content]
+
+        assert response.is_async
+        rows = [json.loads(line) for line in b''.join(async_to_sync(read)()).splitlines()]
+        assert [row['loan_id'] for row in rows] == loans
+
+
+@pytest.mark.django_db
+class TestLoanSnapshots:
+    @pytest.fixture
+    def loan(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        loan_id = api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+        }, format='json').data['loan_id']
+        return Loan.objects.get(loan_id=loan_id)
+
+    def test_full_snapshot_is_partitioned_with_manifest(self, loan, tmp_path):
+        pq = pytest.importorskip('pyarrow.parquet')
+        manifest = write_loan_snapshot(incremental=False, snapshot_dir=tmp_path)
+
+        assert manifest['mode'] == 'full'
+        assert manifest['row_count'] == 1
+        entry = manifest['files'][0]
+        assert entry['path'] == f'start_year={loan.start_date.year}/status=APPROVED/part-0.parquet'
+        table = pq.read_table(tmp_path / manifest['snapshot_id'] / entry['path'])
+        assert table.column('loan_id').to_pylist() == [str(loan.loan_id)]
+        assert table.column('monthly_salary').to_pylist() == [Decimal('50000.00')]
+
+    def test_incremental_snapshot_only_exports_changed_loans(self, loan, tmp_path):
+        pytest.importorskip('pyarrow')
+        write_loan_snapshot(incremental=True, snapshot_dir=tmp_path)
+
+        assert write_loan_snapshot(incremental=True, snapshot_dir=tmp_path)['row_count'] == 0
+
+        Loan.objects.filter(pk=loan.pk).update(emis_paid_on_time=1, updated_at=timezone.now())
+        manifest = write_loan_snapshot(incremental=True, snapshot_dir=tmp_path)
+        assert manifest['mode'] == 'incremental'
+        assert manifest['row_count'] == 1
+
+    def test_rows_committed_after_the_watermark_are_picked_up(self, loan, tmp_path):
+        pytest.importorskip('pyarrow')
+        Loan.objects.filter(pk=loan.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        watermark = datetime.fromisoformat(write_loan_snapshot(snapshot_dir=tmp_path)['watermark'])
+
+        # Stamped before the watermark by a transaction that was still open
+        Loan.objects.filter(pk=loan.pk).update(emis_paid_on_time=1, updated_at=watermark - timedelta(seconds=30))
+        assert write_loan_snapshot(snapshot_dir=tmp_path)['row_count'] == 1
+        # Exported once: the overlap does not repeat it
+        manifest = write_loan_snapshot(snapshot_dir=tmp_path)
+        assert manifest['row_count'] == 0
+        assert manifest['skipped_already_exported'] == 1
+
+    def test_archived_loans_are_tombstoned(self, loan, tmp_path):
+        pq = pytest.importorskip('pyarrow.parquet')
+        write_loan_snapshot(snapshot_dir=tmp_path)
+
+        Loan.objects.filter(pk=loan.pk).update(
+            status='CLOSED', start_date=date(2020, 1, 1), end_date=date(2021, 1, 1)
+        )
+        assert archive_loans()['loans_archived'] == 1
+        manifest = write_loan_snapshot(snapshot_dir=tmp_path)
+
+        assert manifest['tombstones']['rows'] == 1
+        table = pq.read_table(tmp_path / manifest['snapshot_id'] / manifest['tombstones']['path'])
+        assert table.column('loan_id').to_pylist() == [str(loan.loan_id)]
+        assert write_loan_snapshot(snapshot_dir=tmp_path)['tombstones']['rows'] == 0
+
+
+@pytest.mark.django_db
+class TestPortfolioSummary:
+    @pytest.fixture
+    def loan(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        loan_id = api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+        }, format='json').data['loan_id']
+        return Loan.objects.get(loan_id=loan_id)
+
+    def bands(self, summary):
+        return {entry['band']: entry['customers'] for entry in summary['credit_score_bands']}
+
+    def test_summary_is_staff_only(self, api_client, loan, django_user_model):
+        assert api_client.get(reverse('portfolio-summary')).status_code == status.HTTP_403_FORBIDDEN
+        api_client.force_authenticate(django_user_model.objects.create_user('analyst'))
+        assert api_client.get(reverse('portfolio-summary')).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_counters_follow_loan_writes(self, api_client, loan, admin_user):
+        api_client.force_authenticate(admin_user)
+        response = api_client.get(reverse('portfolio-summary'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['active_loans'] == 1
+        assert Decimal(response.data['outstanding_principal']) == Decimal('10000')
+        assert Decimal(response.data['monthly_emi_inflow']) == loan.monthly_installment
+        assert response.data['tenure_buckets'][0] == {
+            'bucket': '<=12', 'loans': 1,
+            'outstanding_principal': response.data['outstanding_principal'],
+            'monthly_emi': response.data['monthly_emi_inflow'],
+        }
+        assert response.data['customers'] == 1
+        assert response.data['stale_scores'] == 1
+        assert self.bands(response.data)['31-50'] == 1
+
+    def test_refresh_moves_customer_between_bands(self, loan):
+        assert refresh_stale_credit_scores() == {'refreshed': 1, 'band_changes': 1}
+
+        summary = portfolio_summary()
+        assert summary['stale_scores'] == 0
+        assert self.bands(summary) == {'<=10': 0, '11-30': 0, '31-50': 0, '>50': 1}
+
+    def test_sweep_takes_closed_loans_off_the_book(self, loan):
+        Loan.objects.filter(pk=loan.pk).update(end_date=date.today() - timedelta(days=1))
+        close_matured_loans()
+
+        summary = portfolio_summary()
+        assert summary['active_loans'] == 0
+        assert Decimal(summary['outstanding_principal']) == 0
+        assert summary['tenure_buckets'][0]['loans'] == 0
+
+    def test_rebuild_matches_incremental_counters(self, loan):
+        Loan.objects.create(
+            customer=loan.customer, loan_amount=200000, interest_rate=10, tenure=48,
+            start_date=date.today(), end_date=date.today() + timedelta(days=1440), status='APPROVED'
+        )
+        refresh_stale_credit_scores()
+        incremental = portfolio_summary()
+
+        rebuild_portfolio()
+        refresh_stale_credit_scores()
+        rebuilt = portfolio_summary()
+
+        for key in ('active_loans', 'customers', 'credit_score_bands'):
+            assert rebuilt[key] == incremental[key]
+        for key in ('outstanding_principal', 'monthly_emi_inflow'):
+            assert Decimal(rebuilt[key]) == Decimal(incremental[key])
+        assert [entry['loans'] for entry in rebuilt['tenure_buckets']] == [1, 0, 1, 0, 0]
+
+    def test_migration_backfills_counters_for_existing_loans(self, loan):
+        from django.apps import apps
+        backfill = importlib.import_module('core.migrations.0011_backfill_portfolio').backfill_portfolio
+        incremental = portfolio_summary()
+        incremental.pop('as_of')
+        # The state before 0003: loans and customers, but no counters yet
+        CustomerCreditScore.objects.all().delete()
+        PortfolioBucket.objects.all().delete()
+
+        backfill(apps, None)
+
+        backfilled = portfolio_summary()
+        backfilled.pop('as_of')
+        assert backfilled == incremental
+        # Counters that already exist are left to the signal handlers
+        PortfolioBucket.objects.update(loan_count=0)
+        backfill(apps, None)
+        assert portfolio_summary()['active_loans'] == 0
+
+
+@pytest.mark.django_db
+class TestPortfolioSimulation:
+    @pytest.fixture
+    def loans(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        for amount, tenure in [(10000, 12), (20000, 24)]:
+            api_client.post(reverse('create-loan'), {
+                "customer_id": customer_id, "loan_amount": amount, "interest_rate": 12, "tenure": tenure
+            }, format='json')
+        return list(Loan.objects.all())
+
+    def test_without_defaults_or_prepayments_cash_flow_is_the_emi_schedule(self, loans):
+        summary = simulate_portfolio(
+            load_loan_book(), paths=4, default_multiplier=0, prepayment_rate=0, workers=1
+        )
+
+        assert summary['loans'] == 2
+        assert summary['expected_loss'] == 0
+        assert len(summary['expected_monthly_cash_flow']) == 24
+        expected = sum(float(loan.monthly_installment) * loan.tenure for loan in loans)
+        assert summary['expected_total_cash_flow'] == pytest.approx(expected)
+
+    def test_batches_on_a_process_pool_are_reproducible(self, loans):
+        book = load_loan_book()
+        in_process = simulate_portfolio(book, paths=20, seed=3, default_multiplier=5, workers=1, memory_limit_mb=0)
+        pooled = simulate_portfolio(book, paths=20, seed=3, default_multiplier=5, workers=2, memory_limit_mb=0)
+
+        assert pooled['batches'] == 20
+        assert pooled['workers'] == 2
+        assert pooled['expected_loss'] == in_process['expected_loss'] > 0
+
+    def test_task_stores_summary(self, loans):
+        result = run_portfolio_simulation.delay(paths=10, seed=1).get()
+
+        run = SimulationRun.objects.get(pk=result['run_id'])
+        assert run.status == 'COMPLETED'
+        assert run.summary['loans'] == 2
+        assert run.parameters['paths'] == 10
+
+
+@pytest.mark.django_db
+class TestRateShockScenario:
+    @pytest.fixture(autouse=True)
+    def staff(self, api_client, admin_user):
+        api_client.force_authenticate(admin_user)
+
+    @pytest.fixture
+    def loan(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        # EMI of ~22,244 against a 25,000 cap (50% of salary)
+        return Loan.objects.create(
+            customer_id=customer_id, loan_amount=1000000, interest_rate=12, tenure=60,
+            start_date=date.today(), end_date=date.today() + timedelta(days=1800), status='APPROVED'
+        )
+
+    def test_baseline_matches_eligibility_rules(self, loan):
+        book = load_scenario_book()
+        assert evaluate(book).tolist() == [True]
+        assert evaluate(book, rate_shift=6).tolist() == [False]
+
+    def test_rate_shift_flips_loans_over_the_emi_cap(self, loan):
+        assert run_rate_shock(rate_shift=5)['flipped_to_ineligible'] == 0
+
+        result = run_rate_shock(rate_shift=6)
+        assert result['flipped_to_ineligible'] == 1
+        assert result['by_status']['APPROVED']['flipped_to_ineligible'] == 1
+        assert result['affected_customer_ids'] == [str(loan.customer_id)]
+
+    def test_endpoint_applies_band_minimum_override(self, api_client, loan):
+        response = api_client.post(reverse('rate-shock-scenario'), {
+            "min_rates": {"31-50": 14}
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['flipped_to_ineligible'] == 1
+        assert SimulationRun.objects.get(pk=response.data['run_id']).kind == 'rate_shock'
+
+    def test_summary_lists_at_most_max_customer_ids(self, loan):
+        result = run_rate_shock(rate_shift=6, max_customer_ids=0)
+        assert result['affected_customers'] == 1
+        assert result['affected_customer_ids'] == []
+        assert result['affected_customer_ids_truncated'] is True
+
+    def test_book_is_loaded_in_chunks(self, loan):
+        Loan.objects.create(
+            customer_id=loan.customer_id, loan_amount=10000, interest_rate=12, tenure=12,
+            start_date=date.today(), end_date=date.today() + timedelta(days=365), status='PENDING'
+        )
+        book = load_scenario_book(chunk_size=1)
+        assert sorted(book['status'].tolist()) == ['APPROVED', 'PENDING']
+        assert [str(customer_id) for customer_id in book['customers']] == [str(loan.customer_id)]
+
+    def test_large_books_run_as_a_task(self, api_client, loan, settings):
+        settings.RATE_SHOCK_SYNC_MAX_LOANS = 0
+        response = api_client.post(reverse('rate-shock-scenario'), {
+            "rate_shift": 6, "max_customer_ids": 0
+        }, format='json')
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        # Celery runs eagerly in tests
+        run = api_client.get(reverse('simulation-run', args=[response.data['run_id']])).data
+        assert run['status'] == 'COMPLETED'
+        assert run['summary']['flipped_to_ineligible'] == 1
+        assert run['summary']['affected_customer_ids'] == []
+
+    def test_scenarios_are_staff_only(self, api_client, loan, django_user_model):
+        api_client.force_authenticate(None)
+        response = api_client.post(reverse('rate-shock-scenario'), {"rate_shift": 6}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not SimulationRun.objects.exists()
+
+        run = SimulationRun.objects.create(kind='rate_shock', parameters={})
+        api_client.force_authenticate(django_user_model.objects.create_user('analyst'))
+        assert api_client.get(reverse('simulation-run', args=[run.pk])).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_endpoint_rejects_unknown_band(self, api_client):
+        response = api_client.post(reverse('rate-shock-scenario'), {
+            "min_rates": {"51-60": 10}
+        }, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestLoanOffers:
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        return api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+
+    def check(self, api_client, customer_id, amount, tenure):
+        return api_client.post(reverse('check-loan-eligibility'), {
+            "customer_id": customer_id, "loan_amount": amount, "interest_rate": 12, "tenure": tenure
+        }, format='json').data['approval']
+
+    def test_offer_is_the_largest_approvable_amount(self, api_client, customer_id):
+        assert refresh_loan_offers() == {'customers': 1, 'offers': 5, 'mode': 'full'}
+
+        response = api_client.get(reverse('loan-offers', args=[customer_id]))
+        assert response.status_code == status.HTTP_200_OK
+        assert [offer['tenure'] for offer in response.data['offers']] == [12, 24, 36, 60, 120]
+        offer = response.data['offers'][0]
+        # Score 50 without loans: the 31-50 band floor of 12% applies
+        assert Decimal(offer['rate_floor']) == Decimal('12')
+        assert Decimal(offer['interest_rate']) == Decimal('12')
+
+        amount = float(offer['max_principal'])
+        assert self.check(api_client, customer_id, amount, 12) is True
+        assert self.check(api_client, customer_id, amount + 100, 12) is False
+
+    def test_incremental_refresh_only_recomputes_changed_customers(self, api_client, customer_id):
+        other = Customer.objects.create(
+            first_name='Jane', last_name='Roe', phone_number='5550000000',
+            monthly_salary=80000, approved_limit=2900000, age=40
+        )
+        refresh_loan_offers()
+        assert refresh_loan_offers()['customers'] == 0
+
+        api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+        }, format='json')
+        result = refresh_loan_offers()
+
+        assert result == {'customers': 1, 'offers': 5, 'mode': 'incremental'}
+        assert LoanOffer.objects.filter(customer=other).count() == 5
+
+    def test_unknown_customer_returns_404(self, api_client):
+        response = api_client.get(reverse('loan-offers', args=['00000000-0000-0000-0000-000000000000']))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestDecisionLog:
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        return api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+
+    def record(self, index=0):
+        return {
+            'decided_at': timezone.now().isoformat(), 'customer_id': '00000000-0000-0000-0000-000000000000',
+            'source': 'test', 'loan_amount': str(index), 'interest_rate': '12', 'tenure': 12,
+            'monthly_salary': '1', 'current_debt': '0', 'approved_limit': '1', 'current_emis': '0',
+            'credit_score': 50, 'score_components': {}, 'approved': True,
+            'corrected_interest_rate': None, 'monthly_installment': None, 'message': '',
+        }
+
+    def test_eligibility_checks_are_logged_with_inputs(self, api_client, customer_id):
+        api_client.post(reverse('check-loan-eligibility'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 8, "tenure": 12
+        }, format='json')
+        api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+        }, format='json')
+
+        quote, creation = EligibilityDecision.objects.order_by('id')
+        assert quote.source == 'check-eligibility'
+        assert quote.approved is False
+        assert quote.corrected_interest_rate == Decimal('12.00')
+        assert quote.score_components['rule'] == 'no_history'
+        assert quote.monthly_salary == Decimal('50000.00')
+        assert creation.source == 'create-loan'
+        assert creation.approved is True
+
+    def test_records_are_handed_off_in_batches(self, settings):
+        settings.DECISION_LOG_BATCH_SIZE = 3
+        buffer = MemoryBuffer()
+        buffer.append(self.record())
+        buffer.append(self.record())
+        assert EligibilityDecision.objects.count() == 0
+
+        buffer.append(self.record())
+        assert EligibilityDecision.objects.count() == 3
+        assert len(buffer) == 0
+
+    @pytest.mark.parametrize("policy,kept,written", [
+        ('drop_newest', ['0', '1'], 0),
+        ('drop_oldest', ['1', '2'], 0),
+        ('write_through', ['0', '1'], 1),
+    ])
+    def test_overflow_policy(self, settings, policy, kept, written):
+        settings.DECISION_LOG_BATCH_SIZE = 100
+        settings.DECISION_LOG_MAX_BUFFER = 2
+        settings.DECISION_LOG_OVERFLOW = policy
+        buffer = MemoryBuffer()
+        for index in range(3):
+            buffer.append(self.record(index))
+
+        assert [record['loan_amount'] for record in buffer._records] == kept
+        assert EligibilityDecision.objects.count() == written
+
+    def test_failed_hand_off_keeps_records(self, settings, monkeypatch):
+        def broker_down(records):
+            raise ConnectionError
+        monkeypatch.setattr('core.decision_log._hand_off', broker_down)
+        buffer = MemoryBuffer()
+        buffer.append(self.record())
+
+        assert len(buffer) == 1
+        assert buffer.flush() == 0
+
+    def test_prune_removes_expired_decisions(self):
+        old, recent = self.record(), self.record()
+        old['decided_at'] = (timezone.now() - timedelta(days=400)).isoformat()
+        MemoryBuffer().append(old)
+        MemoryBuffer().append(recent)
+
+        assert prune_decision_log(retention_months=6) == 1
+        assert EligibilityDecision.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestLoanArchive:
+    @pytest.fixture
+    def customer(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return Customer.objects.get(customer_id=customer_id)
+
+    def make_loan(self, customer, amount, years_ago, loan_status='CLOSED', emis_paid_on_time=12):
+        end_date = date.today() - timedelta(days=365 * years_ago)
+        return Loan.objects.create(
+            customer=customer, loan_amount=amount, interest_rate=12, tenure=12,
+            start_date=end_date - timedelta(days=365), end_date=end_date,
+            emis_paid_on_time=emis_paid_on_time, status=loan_status
+        )
+
+    def breakdown(self, customer):
+        return BaseLoanEligibilityMixin().credit_score_breakdown(
+            customer, timezone.now().replace(month=1, day=1)
+        )
+
+    def test_archiving_keeps_credit_score_exact(self, customer):
+        old = [
+            self.make_loan(customer, 100000, 3, emis_paid_on_time=10),
+            self.make_loan(customer, 200000, 2, loan_status='REJECTED', emis_paid_on_time=0),
+        ]
+        recent = self.make_loan(customer, 50000, 0)
+        self.make_loan(customer, 80000, -1, loan_status='APPROVED')
+        before = self.breakdown(customer)
+
+        result = archive_loans(chunk_size=1)
+
+        assert result['loans_archived'] == 2
+        assert set(ArchivedLoan.objects.values_list('pk', flat=True)) == {loan.pk for loan in old}
+        assert Loan.objects.filter(pk=recent.pk).exists()
+        history = CustomerLoanHistory.objects.get(pk=customer.pk)
+        assert (history.total_loans, history.total_emis, history.emis_paid_on_time) == (2, 24, 10)
+        assert history.total_approved_amount == Decimal('300000.00')
+        assert self.breakdown(customer) == before
+
+        CustomerCreditScore.objects.filter(pk=customer.pk).update(stale=True)
+        refresh_stale_credit_scores()
+        assert CustomerCreditScore.objects.get(pk=customer.pk).score == before['credit_score']
+
+    def test_loans_with_unapplied_payments_are_kept(self, customer):
+        loan = self.make_loan(customer, 100000, 3)
+        LoanPayment.objects.create(payment_reference='late', loan=loan, paid_at=timezone.now())
+
+        assert archive_loans()['loans_archived'] == 0
+        LoanPayment.objects.update(applied=True)
+        assert archive_loans()['loans_archived'] == 1
+        assert not LoanPayment.objects.exists()
+
+    def test_view_loan_falls_back_to_archive(self, api_client, customer):
+        loan = self.make_loan(customer, 100000, 3)
+        expected = api_client.get(reverse('view-loan', args=[loan.pk])).json()
+        archive_loans()
+
+        assert api_client.get(reverse('view-loan', args=[loan.pk])).json() == expected
+        request = AsyncRequestFactory().get(f'/api/view-loan/{loan.pk}/')
+        response = async_to_sync(AsyncLoanDetailsView.as_view())(request, loan_id=loan.pk)
+        assert json.loads(response.content) == expected
+
+
+@pytest.mark.django_db
+class TestTaskQueues:
+    def test_every_task_is_routed_with_its_queue_profile(self, settings):
+        from credit_approval.celery import app
+
+        task_names = {name for name in app.tasks if name.startswith('core.tasks.')} - {'core.tasks.example_task'}
+        assert task_names == set(settings.CELERY_TASK_ROUTES)
+        assert app.amqp.router.route({}, 'core.tasks.import_excel_data')['queue'].name == 'imports'
+        assert app.tasks['core.tasks.refresh_credit_scores'].acks_late is True
+        assert app.tasks['core.tasks.write_eligibility_decisions'].time_limit == 60
+
+    def test_worker_takes_its_queue_profile(self):
+        from types import SimpleNamespace
+        from credit_approval.celery import apply_queue_profile
+
+        conf = SimpleNamespace(worker_concurrency=None, worker_prefetch_multiplier=4)
+        apply_queue_profile(conf=conf, options={'queues': ['analytics']})
+        assert (conf.worker_concurrency, conf.worker_prefetch_multiplier) == (2, 1)
+
+        conf = SimpleNamespace(worker_concurrency=None, worker_prefetch_multiplier=4)
+        apply_queue_profile(conf=conf, options={'queues': 'analytics,imports'})
+        assert (conf.worker_concurrency, conf.worker_prefetch_multiplier) == (None, 4)
+
+    def test_task_runtime_is_observed_per_queue(self):
+        from .tasks import refresh_credit_scores
+
+        metrics.reset()
+        refresh_credit_scores.delay()
+
+        assert queue_for('core.tasks.refresh_credit_scores') == 'analytics'
+        counts = {
+            labels['queue']: value for _, name, labels, value in metrics.collect()
+            if name == 'celery_task_runtime_seconds_count'
+        }
+        assert counts == {'analytics': 1}
+
+    def test_broker_timings_render_as_histograms(self, settings, monkeypatch):
+        from . import queue_metrics
+
+        class FakeBroker:
+            def llen(self, queue):
+                return 0
+
+            def lindex(self, queue, index):
+                return None
+
+            def hgetall(self, key):
+                return {b'wait:0.05': b'2', b'wait:sum': b'0.04', b'wait:count': b'2'}
+
+        settings.CELERY_TASK_ALWAYS_EAGER = False
+        settings.CELERY_BROKER_URL = 'redis://broker:6379/0'
+        monkeypatch.setattr(queue_metrics, '_client', FakeBroker())
+        metrics.reset()
+
+        body = metrics.render_prometheus()
+        assert '# TYPE celery_task_wait_seconds histogram' in body
+        assert '# TYPE celery_task_wait_seconds_bucket' not in body
+        assert 'celery_task_wait_seconds_count{queue="analytics"} 2' in body
+
+
+@pytest.mark.django_db
+class TestAdmissionControl:
+    @pytest.fixture(autouse=True)
+    def clean_state(self):
+        admission.reset()
+        metrics.reset()
+        yield
+        admission.reset()
+
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        return api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+
+    def create_loan(self, api_client, customer_id, **extra):
+        return api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10000, "interest_rate": 12, "tenure": 12
+        }, format='json', **extra)
+
+    def test_client_bucket_rejects_before_any_query(self, settings, api_client, customer_id):
+        settings.ADMISSION_RULES = [{'name': 'create-loan', 'client_rate': 0.01, 'client_burst': 2}]
+        assert self.create_loan(api_client, customer_id).status_code == status.HTTP_201_CREATED
+        assert self.create_loan(api_client, customer_id).status_code == status.HTTP_201_CREATED
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.create_loan(api_client, customer_id)
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response['Retry-After']) >= 99
+        assert len(queries) == 0
+        # Other clients have their own bucket
+        other = self.create_loan(api_client, customer_id, REMOTE_ADDR='10.0.0.2')
+        assert other.status_code == status.HTTP_201_CREATED
+        assert metrics.get_counter('admission_rejected_total', rule='create-loan', reason='client') == 1
+        assert metrics.get_counter('admission_admitted_total', rule='create-loan') == 3
+
+    def test_endpoint_bucket_is_shared_by_clients(self, settings, api_client, customer_id):
+        settings.ADMISSION_RULES = [{'name': 'create-loan', 'rate': 0.01, 'burst': 1}]
+        self.create_loan(api_client, customer_id, REMOTE_ADDR='10.0.0.1')
+        response = self.create_loan(api_client, customer_id, REMOTE_ADDR='10.0.0.2')
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert metrics.get_counter('admission_rejected_total', rule='create-loan', reason='endpoint') == 1
+
+    def test_forwarded_client_behind_proxy(self, rf, settings):
+        settings.ADMISSION_PROXY_COUNT = 1
+        request = rf.get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.9', REMOTE_ADDR='172.18.0.5')
+        assert admission.client_id(request) == '10.0.0.9'
+
+    def test_high_query_latency_sheds_writes_before_reads(self, settings, api_client, customer_id):
+        settings.ADMISSION_RULES = [
+            {'name': 'view-*', 'priority': 'read'},
+            {'name': 'create-loan'},
+        ]
+        settings.ADMISSION_DB_P95_MS = 10
+        now = time.monotonic()
+        admission._samples.extend((now, 0.02) for _ in range(admission.MIN_SAMPLES))
+
+        response = self.create_loan(api_client, customer_id)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response['Retry-After'] == str(settings.ADMISSION_SHED_RETRY_AFTER)
+        assert api_client.get(reverse('view-customer-loans', args=[customer_id])).status_code == status.HTTP_200_OK
+        assert metrics.get_counter('admission_rejected_total', rule='create-loan', reason='overload') == 1
+
+    def test_async_requests_are_admitted_through_the_same_buckets(self, settings):
+        settings.ADMISSION_RULES = [{'name': 'view-loan', 'client_rate': 0.01, 'client_burst': 1}]
+
+        async def view(request):
+            return JsonResponse({})
+
+        middleware = admission.AdmissionControlMiddleware(view)
+        path = reverse('view-loan', args=['00000000-0000-0000-0000-000000000000'])
+        first = async_to_sync(middleware)(AsyncRequestFactory().get(path))
+        second = async_to_sync(middleware)(AsyncRequestFactory().get(path))
+
+        assert (first.status_code, second.status_code) == (200, 429)
+
+
+class TestStartupImports:
+    def test_boot_does_not_import_heavy_dependencies(self, settings):
+        # What web and worker processes import at boot; pandas, NumPy and
+        # pyarrow are only imported by the tasks and endpoints that use them
+        code = (
+            "import sys, django; django.setup(); import core.tasks, core.views; "
+            "print(','.join(m for m in ('pandas', 'numpy', 'pyarrow') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='credit_approval.test_settings'),
+            capture_output=True, text=True, check=True,
+        )
+        assert result.stdout.strip() == ''
+
+
+@pytest.mark.django_db
+class TestWireFormats:
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        for amount in (100000, 200000):
+            api_client.post(reverse('create-loan'), {
+                "customer_id": customer_id, "loan_amount": amount, "interest_rate": 12.5, "tenure": 24
+            }, format='json')
+        return customer_id
+
+    def test_msgpack_sends_decimals_as_numbers(self, api_client, customer_id):
+        url = reverse('view-customer-loans', args=[customer_id])
+        response = api_client.get(url, HTTP_ACCEPT='application/msgpack')
+
+        assert response['Content-Type'] == 'application/msgpack'
+        data = msgpack.unpackb(response.content)
+        json_data = api_client.get(url).json()
+        assert data['total_loans'] == json_data['total_loans'] == 2
+        for packed, loan in zip(data['loans'], json_data['loans']):
+            assert packed['loan_id'] == loan['loan_id']
+            assert isinstance(packed['loan_amount'], float)
+            assert Decimal(str(packed['loan_amount'])) == Decimal(loan['loan_amount'])
+
+    def test_json_is_compressed_above_threshold(self, api_client, customer_id, settings):
+        settings.RESPONSE_COMPRESSION_MIN_BYTES = 100
+        url = reverse('view-customer-loans', args=[customer_id])
+        response = api_client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        assert json.loads(gzip.decompress(response.content)) == api_client.get(url).json()
+
+    def test_small_bodies_are_not_compressed(self, api_client, customer_id, settings):
+        settings.RESPONSE_COMPRESSION_MIN_BYTES = 100000
+        response = api_client.get(reverse('view-customer-loans', args=[customer_id]), HTTP_ACCEPT_ENCODING='gzip')
+
+        assert not response.has_header('Content-Encoding')
+        assert response.json()['total_loans'] == 2
+
+    @pytest.mark.skipif(renderers.brotli is None, reason='brotli is not installed')
+    def test_brotli_is_preferred(self, api_client, customer_id, settings):
+        settings.RESPONSE_COMPRESSION_MIN_BYTES = 100
+        url = reverse('view-customer-loans', args=[customer_id])
+        response = api_client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip, br')
+
+        assert response['Content-Encoding'] == 'br'
+        assert msgpack.unpackb(renderers.brotli.decompress(response.content))['total_loans'] == 2
+
+    def test_choose_encoding_honours_q_values(self):
+        assert renderers.choose_encoding('') is None
+        assert renderers.choose_encoding('identity') is None
+        assert renderers.choose_encoding('gzip;q=0, deflate') is None
+        assert renderers.choose_encoding('br;q=0, *') == 'gzip'
+        assert renderers.choose_encoding('gzip;q=0.5') == 'gzip'
+
+    def test_async_view_negotiates(self, customer_id, settings):
+        settings.RESPONSE_COMPRESSION_MIN_BYTES = 100
+        request = AsyncRequestFactory().get(
+            f'/api/view-loans/{customer_id}/', headers={'Accept': 'application/msgpack', 'Accept-Encoding': 'gzip'}
+        )
+        response = async_to_sync(AsyncCustomerLoanListView.as_view())(request, customer_id=customer_id)
+        assert response['Content-Type'] == 'application/msgpack'
+        assert response['Content-Encoding'] == 'gzip'
+        data = msgpack.unpackb(gzip.decompress(response.content))
+        assert data['total_loans'] == 2
+        assert all(isinstance(loan['interest_rate'], float) for loan in data['loans'])
+
+
+@pytest.mark.django_db
+class TestTracing:
+    @pytest.fixture
+    def traces(self, settings, tmp_path):
+        settings.TRACING_SAMPLE_RATIO = 1
+        settings.TRACING_FILE = str(tmp_path / 'traces.jsonl')
+
+        def read():
+            path = tmp_path / 'traces.jsonl'
+            if not path.exists():
+                return []
+            lines = path.read_text().splitlines()
+            return [json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans'] for line in lines]
+        return read
+
+    def test_create_loan_phases_and_queries_are_spans(self, api_client, sample_customer_data, traces):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        response = api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 100000, "interest_rate": 12.5, "tenure": 12
+        }, format='json')
+
+        spans = traces()[-1]
+        root = next(span for span in spans if not span['parentSpanId'])
+        assert root['name'] == 'POST create-loan'
+        assert response['X-Trace-Id'] == root['traceId']
+        assert {span['traceId'] for span in spans} == {root['traceId']}
+
+        by_id = {span['spanId']: span for span in spans}
+        phases = {span['name'] for span in spans if span['parentSpanId'] == root['spanId']}
+        assert {'validate_request', 'transaction', 'serialize_response'} <= phases
+        # The customer is read and checked under the lock the loan is written with
+        transaction_span = next(span for span in spans if span['name'] == 'transaction')
+        assert {'get_customer', 'credit_score'} <= {
+            span['name'] for span in spans if span['parentSpanId'] == transaction_span['spanId']
+        }
+        inserts = [span for span in spans if span['name'] == 'INSERT']
+        assert all(span['kind'] == tracing.CLIENT for span in inserts)
+        # The loan itself, and the audit log write in its (eager) task
+        assert {by_id[span['parentSpanId']]['name'] for span in inserts} == {
+            'transaction', 'core.tasks.write_eligibility_decisions'
+        }
+
+    def test_nothing_is_recorded_when_disabled(self, api_client, sample_customer_data, traces, settings):
+        settings.TRACING_SAMPLE_RATIO = 0
+        response = api_client.post(reverse('customer-register'), sample_customer_data, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not response.has_header('X-Trace-Id')
+        assert traces() == []
+
+    def test_traceparent_continues_the_trace_in_the_worker(self, traces):
+        headers = {}
+        with tracing.activate(tracing.start_span('request')) as root:
+            tracing.inject_traceparent(headers=headers)
+
+        parent = tracing.parse_traceparent(headers['traceparent'])
+        with tracing.activate(tracing.start_span('core.tasks.import_excel_data', parent=parent)) as task:
+            pass
+
+        assert (task.trace_id, task.parent_id) == (root.trace_id, root.span_id)
+        # Each process exports its own part of the trace
+        assert [[span['name'] for span in spans] for spans in traces()] == [
+            ['request'], ['core.tasks.import_excel_data']
+        ]
+
+    def test_unsampled_parent_is_not_recorded(self, traces):
+        parent = tracing.parse_traceparent(f"00-{'a' * 32}-{'b' * 16}-00")
+        with tracing.activate(tracing.start_span('task', parent=parent)) as task:
+            with tracing.span('child') as child:
+                assert child is task
+        assert not task.recording
+        assert traces() == []
+
+    def test_eager_task_nests_in_active_span(self, traces):
+        with tracing.activate(tracing.start_span('request')) as root:
+            example_task.delay()
+
+        spans = traces()[-1]
+        task = next(span for span in spans if span['name'] == 'core.tasks.example_task')
+        assert task['parentSpanId'] == root.span_id
+
+    def test_spans_over_the_limit_are_dropped(self, traces, settings):
+        settings.TRACING_MAX_SPANS = 3
+        with tracing.activate(tracing.start_span('request')):
+            for _ in range(5):
+                with tracing.span('phase'):
+                    pass
+
+        spans = traces()[-1]
+        assert len(spans) == 4
+        root = spans[-1]
+        assert {'key': 'tracing.dropped_spans', 'value': {'intValue': '2'}} in root['attributes']
+
+
+@pytest.mark.django_db
+class TestCustomerSearch:
+    @pytest.fixture(autouse=True)
+    def user(self, api_client, django_user_model):
+        api_client.force_authenticate(django_user_model.objects.create_user('support'))
+
+    @pytest.fixture(autouse=True)
+    def customers(self):
+        people = [
+            ('Asha', 'Kumar', '9876500001'), ('Ravi', 'Kumar', '9876500002'), ('Anil', 'Kumaran', '9876599999'),
+            ('Meera', 'Shah', '9877000000'), ('Kumar', 'Iyer', '9123400000'), ('John', 'Doe', '9876400000'),
+        ]
+        for first_name, last_name, phone_number in people:
+            Customer.objects.create(
+                first_name=first_name, last_name=last_name, phone_number=phone_number,
+                monthly_salary=50000, age=30
+            )
+
+    def search(self, api_client, **params):
+        return api_client.get(reverse('customer-search'), params)
+
+    def pages(self, api_client, q, limit):
+        results, cursor = [], None
+        while True:
+            params = {'q': q, 'limit': limit, **({'cursor': cursor} if cursor else {})}
+            response = self.search(api_client, **params)
+            assert response.status_code == status.HTTP_200_OK
+            results += response.data['results']
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return results
+
+    def test_phone_prefix_pages_in_phone_order(self, api_client):
+        results = self.pages(api_client, '98765', limit=2)
+        assert [c['phone_number'] for c in results] == ['9876500001', '9876500002', '9876599999']
+
+    def test_anonymous_searches_are_refused(self, api_client):
+        api_client.force_authenticate(None)
+        assert self.search(api_client, q='Kumar').status_code == status.HTTP_403_FORBIDDEN
+
+    def test_phone_prefix_ignores_formatting(self, api_client):
+        response = self.search(api_client, q='+ (987) 64')
+        assert [c['last_name'] for c in response.data['results']] == ['Doe']
+
+    def test_name_words_match_first_or_last_name(self, api_client):
+        results = self.pages(api_client, 'kum', limit=2)
+        assert [(c['last_name'], c['first_name']) for c in results] == [
+            ('Iyer', 'Kumar'), ('Kumar', 'Asha'), ('Kumar', 'Ravi'), ('Kumaran', 'Anil')
+        ]
+        response = self.search(api_client, q='KUMAR ra')
+        assert [c['first_name'] for c in response.data['results']] == ['Ravi', 'Anil']
+
+    @pytest.mark.parametrize('q', ['98', 'al', 'a b'])
+    def test_too_short_queries_are_rejected(self, api_client, q):
+        assert self.search(api_client, q=q).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cursor_must_match_the_search(self, api_client):
+        cursor = self.search(api_client, q='98765', limit=1).data['next_cursor']
+        assert self.search(api_client, q='kumar', cursor=cursor).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.search(api_client, q='kumar', cursor='not-a-cursor').status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+class TestLoanBatchDetails:
+    @pytest.fixture
+    def loan_ids(self, api_client, sample_customer_data):
+        customer_id = api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+        return [
+            api_client.post(reverse('create-loan'), {
+                "customer_id": customer_id, "loan_amount": amount, "interest_rate": 12, "tenure": 12
+            }, format='json').data['loan_id']
+            for amount in (10000, 20000, 30000)
+        ]
+
+    def lookup(self, api_client, loan_ids):
+        return api_client.post(reverse('view-loans-batch'), {'loan_ids': loan_ids}, format='json')
+
+    def test_results_match_view_loan_in_one_query(self, api_client, loan_ids):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            response = self.lookup(api_client, list(reversed(loan_ids)))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(replica) + len(primary) == 1
+        results = response.json()['results']
+        assert list(results) == list(reversed(loan_ids))
+        for loan_id in loan_ids:
+            assert results[loan_id] == api_client.get(reverse('view-loan', args=[loan_id])).json()
+
+    def test_unknown_and_archived_loans(self, api_client, loan_ids):
+        archived = Loan.objects.get(loan_id=loan_ids[0])
+        fields = {f.name: getattr(archived, f.name) for f in Loan._meta.concrete_fields}
+        Loan.objects.filter(pk=archived.pk).delete()
+        ArchivedLoan.objects.create(**fields)
+        unknown = '00000000-0000-0000-0000-000000000000'
+
+        results = self.lookup(api_client, [loan_ids[0], unknown, loan_ids[1], unknown]).json()['results']
+
+        assert list(results) == [loan_ids[0], unknown, loan_ids[1]]
+        assert results[unknown] == {'error': 'Loan not found'}
+        assert results[loan_ids[0]]['loan_amount'] == '10000.00'
+
+    def test_batch_size_is_limited(self, api_client):
+        ids = [f'00000000-0000-0000-0000-{i:012d}' for i in range(501)]
+        assert self.lookup(api_client, ids).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.lookup(api_client, []).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    @pytest.fixture(autouse=True)
+    def consumer(self, api_client, django_user_model):
+        api_client.force_authenticate(django_user_model.objects.create_user('consumer'))
+
+    @pytest.fixture(autouse=True)
+    def stream(self, monkeypatch):
+        stream = outbox.MemoryStream()
+        monkeypatch.setitem(outbox._streams, 'memory', stream)
+        return stream
+
+    @pytest.fixture
+    def customer_id(self, api_client, sample_customer_data):
+        return api_client.post(reverse('customer-register'), sample_customer_data, format='json').data['customer_id']
+
+    def create_loan(self, api_client, customer_id, amount=100000):
+        return api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": amount, "interest_rate": 12, "tenure": 12
+        }, format='json').data['loan_id']
+
+    def read(self, api_client, **params):
+        return api_client.get(reverse('event-stream'), params)
+
+    def test_writes_record_events_in_their_transaction(self, api_client, customer_id):
+        loan_id = self.create_loan(api_client, customer_id)
+        api_client.post(reverse('loan-payments'), {"payments": [
+            {"payment_reference": "ref-1", "loan_id": loan_id},
+            {"payment_reference": "ref-2", "loan_id": loan_id},
+        ]}, format='json')
+        Loan.objects.filter(pk=loan_id).update(end_date=date.today() - timedelta(days=1))
+        close_matured_loans()
+
+        events = list(OutboxEvent.objects.values_list('event_type', 'aggregate_id', 'customer_id', 'payload'))
+        assert [(event_type, str(aggregate)) for event_type, aggregate, _, _ in events] == [
+            ('customer.registered', customer_id),
+            ('loan.created', loan_id),
+            ('loan.payments_applied', loan_id),
+            ('loan.status_changed', loan_id),
+        ]
+        assert {str(customer) for _, _, customer, _ in events} == {customer_id}
+        assert events[1][3]['loan_amount'] == '100000.00'
+        assert events[2][3] == {'paid_on_time': 2, 'emis_paid_on_time': 2}
+        assert events[3][3] == {'previous_status': 'APPROVED', 'status': 'CLOSED'}
+
+    def test_rejected_loans_and_failed_registrations_record_nothing(self, api_client, customer_id, sample_customer_data):
+        api_client.post(reverse('create-loan'), {
+            "customer_id": customer_id, "loan_amount": 10 ** 9, "interest_rate": 12, "tenure": 12
+        }, format='json')
+        api_client.post(reverse('customer-register'), sample_customer_data, format='json')
+        assert list(OutboxEvent.objects.values_list('event_type', flat=True)) == ['customer.registered']
+
+    @pytest.mark.django_db(transaction=True)
+    def test_events_need_a_transaction(self, customer_id):
+        with pytest.raises(RuntimeError):
+            outbox.record_event('customer.registered', 'customer', customer_id, customer_id)
+
+    def test_relay_publishes_in_order_once(self, api_client, customer_id, stream):
+        loan_ids = [self.create_loan(api_client, customer_id, amount) for amount in (10000, 20000, 30000)]
+
+        assert outbox.relay_pending(batch_size=2) == 4
+        assert outbox.relay_pending() == 0
+        assert not OutboxEvent.objects.filter(published_at__isnull=True).exists()
+        assert [fields['aggregate_id'] for _, fields in stream.entries] == [customer_id, *loan_ids]
+        event_ids = [int(fields['event_id']) for _, fields in stream.entries]
+        assert event_ids == sorted(event_ids)
+
+    def test_failed_publish_leaves_the_batch_for_the_next_run(self, customer_id, stream, monkeypatch):
+        def unavailable(entries):
+            raise ConnectionError('stream down')
+
+        monkeypatch.setattr(stream, 'add', unavailable)
+        with pytest.raises(ConnectionError):
+            outbox.relay_batch()
+        assert OutboxEvent.objects.filter(published_at__isnull=True).count() == 1
+
+    def test_cursor_pages_through_the_stream(self, api_client, customer_id):
+        loan_ids = [self.create_loan(api_client, customer_id, amount) for amount in (10000, 20000)]
+        outbox.relay_pending()
+
+        first = self.read(api_client, limit=2).json()
+        assert [e['event_type'] for e in first['events']] == ['customer.registered', 'loan.created']
+        assert first['events'][1]['payload']['loan_amount'] == '10000.00'
+        second = self.read(api_client, cursor=first['next_cursor']).json()
+        assert [e['aggregate_id'] for e in second['events']] == [loan_ids[1]]
+        empty = self.read(api_client, cursor=second['next_cursor']).json()
+        assert empty == {'events': [], 'next_cursor': second['next_cursor']}
+        assert self.read(api_client, cursor='latest').status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_anonymous_readers_are_refused(self, api_client):
+        api_client.force_authenticate(None)
+        assert self.read(api_client).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_trimmed_cursor_is_gone(self, api_client, customer_id, settings):
+        settings.OUTBOX_STREAM_MAXLEN = 1
+        for amount in (10000, 20000):
+            self.create_loan(api_client, customer_id, amount)
+        outbox.relay_pending()
+
+        # 1-0 and 2-0 were trimmed: a client at 1-0 missed 2-0, one at 2-0 did not
+        assert self.read(api_client, cursor='1-0').status_code == status.HTTP_410_GONE
+        assert self.read(api_client, cursor='2-0').json()['events'][0]['cursor'] == '3-0'
+        assert [e['cursor'] for e in self.read(api_client).json()['events']] == ['3-0']
+
+    def test_backlog_metrics_and_pruning(self, customer_id):
+        collected = {name: value for name, _, value in outbox.outbox_metrics()}
+        assert collected['outbox_unpublished_events'] == 1
+        assert collected['outbox_stream_length'] == 0
+
+        outbox.relay_pending()
+        assert outbox.prune_outbox(7) == 0
+        assert outbox.prune_outbox(7, now=timezone.now() + timedelta(days=8)) == 1
+
+
+@pytest.mark.django_db
+class TestPayrollUpdate:
+    @pytest.fixture
+    def customers(self, api_client):
+        ids = []
+        for phone_number, income in (('9000000001', 50000), ('9000000002', 40000), ('9000000003', 30000)):
+            ids.append(api_client.post(reverse('customer-register'), {
+                "first_name": "Pay", "last_name": "Roll", "age": 30,
+                "monthly_income": income, "phone_number": phone_number
+            }, format='json').data['customer_id'])
+        return ids
+
+    def payroll(self, tmp_path, rows):
+        path = tmp_path / 'payroll.csv'
+        path.write_text('phone_number,monthly_salary\n' + ''.join(f'{phone},{salary}\n' for phone, salary in rows))
+        return str(path)
+
+    def test_limits_match_registration(self, api_client, tmp_path, customers):
+        # 36 x 62500 = 2,250,000 sits on a half-lakh boundary
+        path = self.payroll(tmp_path, [('9000000001', 62500), ('90000 00002', '41666.67')])
+        summary = update_salaries(path)
+
+        registered = api_client.post(reverse('customer-register'), {
+            "first_name": "New", "last_name": "Joiner", "age": 30,
+            "monthly_income": 62500, "phone_number": "9000000009"
+        }, format='json').data
+        updated = Customer.objects.get(pk=customers[0])
+        assert summary['customers_updated'] == 2
+        assert updated.monthly_salary == Decimal('62500.00')
+        assert updated.approved_limit == Decimal(registered['approved_limit'])
+        assert Customer.objects.get(pk=customers[1]).approved_limit == Decimal('1500000.00')
+        assert not StagedSalary.objects.exists()
+
+    def test_one_update_per_chunk_and_only_changed_customers(self, tmp_path, customers):
+        path = self.payroll(tmp_path, [('9000000001', 50000), ('9000000002', 45000), ('9000000003', 35000)])
+        with CaptureQueriesContext(connections['default']) as queries:
+            summary = update_salaries(path, chunk_size=2)
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_customer"')]
+        assert len(updates) == 2
+        assert summary['customers_updated'] == 2
+        assert Customer.objects.get(pk=customers[0]).approved_limit == Decimal('1800000.00')
+
+    def test_marks_scores_and_offers_stale(self, tmp_path, customers):
+        refresh_stale_credit_scores()
+        refresh_loan_offers(full=True)
+        assert not CustomerCreditScore.objects.filter(stale=True).exists()
+
+        update_salaries(self.payroll(tmp_path, [('9000000002', 90000)]))
+
+        assert list(CustomerCreditScore.objects.filter(stale=True).values_list('pk', flat=True)) == [
+            Customer.objects.get(phone_number='9000000002').pk
+        ]
+        assert refresh_loan_offers()['customers'] == 1
+        offer = LoanOffer.objects.get(customer__phone_number='9000000002', tenure=12)
+        assert offer.max_principal > 0
+        assert OutboxEvent.objects.filter(event_type='customer.salary_updated').count() == 1
+
+    def test_reports_bad_duplicate_and_unknown_rows(self, tmp_path, customers):
+        path = self.payroll(tmp_path, [
+            ('9000000001', 'abc'), ('', 1000), ('9000000002', -1),
+            ('9000000003', 10000), ('9000000003', 20000), ('9999999999', 5000),
+        ])
+        summary = update_salaries(path)
+
+        assert summary['invalid_lines'] == [2, 3, 4]
+        assert summary['duplicates'] == 1
+        assert summary['unknown_customers'] == 1
+        assert summary['customers_updated'] == 1
+        assert Customer.objects.get(phone_number='9000000003').monthly_salary == Decimal('20000.00')
+
+    def test_dry_run_changes_nothing(self, tmp_path, customers):
+        summary = update_salaries(self.payroll(tmp_path, [('9000000001', 70000)]), dry_run=True)
+
+        assert summary['customers_updated'] == 1
+        assert Customer.objects.get(pk=customers[0]).monthly_salary == Decimal('50000.00')
+        assert not StagedSalary.objects.exists()
@@ -0,0 +1,365 @@
+"""
+OpenTelemetry-style request and task tracing.
+
+`TracingMiddleware` opens a server span for a sampled share of requests
+(TRACING_SAMPLE_RATIO; 0 turns tracing off). The views add a child span per
+phase with `span()`, for example validation, the credit score, the EMI cap
+aggregate, the `create-loan` transaction and the response serializer.
+Every SQL statement run while a span is recording gets a client span of
+its own (a connection execute wrapper). Tasks published inside a sampled
+request carry a W3C `traceparent` header, and the worker continues the
+trace in a consumer span around the task. Eagerly run tasks nest in the
+caller's span directly. Requests always start new traces. Clients are
+external, so their `traceparent` headers are ignored and cannot force
+sampling.
+
+A process exports its part of a trace when that part's root span ends:
+one OTLP/JSON line (`resourceSpans`) appended to TRACING_FILE. The
+OpenTelemetry Collector can ingest the file with its `otlpjsonfile`
+receiver, and `jq` can read it as is. At most TRACING_MAX_SPANS spans are
+kept per trace part, and the rest are counted on the root span as
+`tracing.dropped_spans`.
+
+An unsampled request costs one random draw. Its phase spans and SQL
+statements only cost a context variable lookup each.
+"""
+import json
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+# OTLP span kinds and status codes
+INTERNAL, SERVER, CLIENT, CONSUMER = 1, 2, 3, 5
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+STATEMENT_MAX_LENGTH = 2000
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = ContextVar('tracing_span', default=None)
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class SpanContext:
+    """
+    A span that is not recorded: an unsampled one, or a parent from
+    another process. It only carries the ids to propagate.
+    """
+
+    recording = False
+
+    def __init__(self, trace_id, span_id, sampled=False):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+
+# Returned for every span while tracing is off; propagates nothing
+DISABLED = SpanContext(None, None)
+
+
+class _TracePart:
+    """The spans of one trace recorded in this process, under one root."""
+
+    def __init__(self):
+        self.root = None
+        self.spans = []
+        self.dropped = 0
+
+
+class Span:
+    """A recorded span."""
+
+    recording = True
+    sampled = True
+
+    def __init__(self, name, trace_id, parent_id, kind, attributes, part):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.status = (STATUS_UNSET, '')
+        self.part = part
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.status = (STATUS_ERROR, f'{type(exc).__name__}: {exc}')
+        self.attributes['exception.type'] = type(exc).__qualname__
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        part = self.part
+        if part.root is self:
+            if part.dropped:
+                self.attributes['tracing.dropped_spans'] = part.dropped
+            part.spans.append(self)
+            export(part.spans)
+        elif len(part.spans) < settings.TRACING_MAX_SPANS:
+            part.spans.append(self)
+        else:
+            part.dropped += 1
+
+
+def current_span():
+    """The active span, or DISABLED outside any span."""
+    return _current.get() or DISABLED
+
+
+def start_span(name, kind=INTERNAL, parent=None, attributes=None):
+    """
+    Start a span under `parent` (default: the active span); a new trace,
+    sampled at TRACING_SAMPLE_RATIO, when there is none.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        ratio = settings.TRACING_SAMPLE_RATIO
+        if not ratio:
+            return DISABLED
+        if random.random() >= ratio:
+            return SpanContext(_new_id(128), _new_id(64))
+        return _root_span(name, _new_id(128), None, kind, attributes)
+    if parent.recording:
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes or {}, parent.part)
+    if parent.sampled:
+        # Sampled upstream, in another process
+        return _root_span(name, parent.trace_id, parent.span_id, kind, attributes)
+    return parent
+
+
+def _root_span(name, trace_id, parent_id, kind, attributes):
+    part = _TracePart()
+    part.root = Span(name, trace_id, parent_id, kind, attributes or {}, part)
+    return part.root
+
+
+@contextmanager
+def activate(span):
+    """Make `span` the active span for the block, then end it."""
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_exception(exc)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+@contextmanager
+def span(name, kind=INTERNAL, **attributes):
+    """Run the block in a child span of the active span (no-op if unsampled)."""
+    with activate(start_span(name, kind, attributes=attributes)) as current:
+        yield current
+
+
+def format_traceparent(current):
+    flags = '01' if current.sampled else '00'
+    return f'00-{current.trace_id}-{current.span_id}-{flags}'
+
+
+def parse_traceparent(header):
+    """A remote SpanContext from a W3C traceparent header, or None."""
+    match = TRACEPARENT.match(header or '')
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return SpanContext(trace_id, span_id, sampled=bool(int(flags, 16) & 1))
+
+
+# Export
+
+def _value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _attributes(attributes):
+    return [{'key': key, 'value': _value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(spans):
+    """OTLP/JSON `resourceSpans` document for the spans of one trace part."""
+    resource = {'service.name': settings.TRACING_SERVICE_NAME, 'process.pid': os.getpid()}
+    return {'resourceSpans': [{
+        'resource': {'attributes': _attributes(resource)},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [
+                {
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': span.kind,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': _attributes(span.attributes),
+                    'status': {'code': span.status[0], 'message': span.status[1]},
+                }
+                for span in spans
+            ],
+        }],
+    }]}
+
+
+def export(spans):
+    line = json.dumps(to_otlp(spans), separators=(',', ':')).encode() + b'\n'
+    try:
+        # One unbuffered append, so lines from concurrent processes never interleave
+        with open(settings.TRACING_FILE, 'ab', buffering=0) as exported:
+            exported.write(line)
+    except OSError:
+        metrics.inc('tracing_export_errors_total')
+        return
+    metrics.inc('tracing_spans_exported_total', len(spans))
+
+
+# SQL statements
+
+def _trace_query(execute, sql, params, many, context):
+    if not isinstance(_current.get(), Span):
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    attributes = {
+        'db.system': connection.vendor,
+        'db.name': connection.alias,
+        'db.statement': sql[:STATEMENT_MAX_LENGTH],
+    }
+    if many:
+        attributes['db.executemany'] = True
+    operation = sql.split(None, 1)[0].upper() if sql.strip() else 'SQL'
+    with span(operation, kind=CLIENT, **attributes):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid='tracing_trace_queries')
+def trace_queries(sender, connection, **kwargs):
+    if _trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_trace_query)
+
+
+# Requests
+
+class TracingMiddleware:
+    """A server span around each sampled request (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _start(request):
+        return start_span(request.method, kind=SERVER, attributes={
+            'http.request.method': request.method,
+            'url.path': request.path,
+        })
+
+    @staticmethod
+    def _finish(current, request, response):
+        if not current.recording:
+            return
+        # Resolved by now; named like OpenTelemetry's Django instrumentation
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            current.name = f'{request.method} {match.url_name}'
+            current.set_attribute('http.route', match.url_name)
+        current.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            current.status = (STATUS_ERROR, '')
+        response['X-Trace-Id'] = current.trace_id
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with activate(self._start(request)) as current:
+            response = self.get_response(request)
+            self._finish(current, request, response)
+        return response
+
+    async def __acall__(self, request):
+        with activate(self._start(request)) as current:
+            response = await self.get_response(request)
+            self._finish(current, request, response)
+        return response
+
+
+# Celery tasks
+
+_task_spans = {}
+
+
+@signals.before_task_publish.connect(dispatch_uid='tracing_publish')
+def inject_traceparent(headers=None, **kwargs):
+    current = _current.get()
+    if headers is not None and current is not None and current.trace_id:
+        headers.setdefault('traceparent', format_traceparent(current))
+
+
+@signals.task_prerun.connect(dispatch_uid='tracing_prerun')
+def start_task_span(task_id=None, task=None, **kwargs):
+    if task is None:
+        return
+    # Eager tasks have no headers and nest in the caller's active span
+    parent = parse_traceparent(getattr(task.request, 'traceparent', None))
+    current = start_span(task.name, kind=CONSUMER, parent=parent, attributes={
+        'celery.task_id': task_id,
+        'messaging.system': 'celery',
+    })
+    _task_spans[task_id] = (current, _current.set(current))
+
+
+@signals.task_postrun.connect(dispatch_uid='tracing_postrun')
+def end_task_span(task_id=None, state=None, retval=None, **kwargs):
+    current, token = _task_spans.pop(task_id, (None, None))
+    if current is None:
+        return
+    if isinstance(retval, BaseException):
+        current.record_exception(retval)
+    current.set_attribute('celery.state', state or '')
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Set in another context; the next task sets its own
+        _current.set(None)
+    current.end()
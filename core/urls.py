@@ -1,13 +1,39 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
+from django.views.decorators.csrf import csrf_exempt
 from .views import (
     CustomerRegistrationView, LoanEligibilityView,
-    LoanCreationView, LoanDetailsView, CustomerLoanListView
+    LoanCreationView, LoanDetailsView, CustomerLoanListView,
+    AsyncLoanEligibilityView, AsyncLoanDetailsView, AsyncCustomerLoanListView,
+    LoanPaymentIngestView, ExportView, MetricsView, PortfolioSummaryView,
+    RateShockScenarioView, SimulationRunView, LoanOfferView, CustomerSearchView, LoanBatchDetailsView,
+    EventStreamView
 )
 
+if settings.ASYNC_READ_VIEWS:
+    # Async ORM read path, meant for ASGI workers (see credit_approval/asgi.py)
+    eligibility_view = csrf_exempt(AsyncLoanEligibilityView.as_view())
+    loan_details_view = AsyncLoanDetailsView.as_view()
+    customer_loans_view = AsyncCustomerLoanListView.as_view()
+else:
+    eligibility_view = LoanEligibilityView.as_view()
+    loan_details_view = LoanDetailsView.as_view()
+    customer_loans_view = CustomerLoanListView.as_view()
+
 urlpatterns = [
     path('register/', CustomerRegistrationView.as_view(), name='customer-register'),
-    path('check-eligibility/', LoanEligibilityView.as_view(), name='check-loan-eligibility'),
+    path('customers/search/', CustomerSearchView.as_view(), name='customer-search'),
+    path('check-eligibility/', eligibility_view, name='check-loan-eligibility'),
     path('create-loan/', LoanCreationView.as_view(), name='create-loan'),
-    path('view-loan/<uuid:loan_id>/', LoanDetailsView.as_view(), name='view-loan'),
-    path('view-loans/<uuid:customer_id>/', CustomerLoanListView.as_view(), name='view-customer-loans'),
+    path('view-loan/<uuid:loan_id>/', loan_details_view, name='view-loan'),
+    path('view-loans/<uuid:customer_id>/', customer_loans_view, name='view-customer-loans'),
+    path('view-loans/batch/', LoanBatchDetailsView.as_view(), name='view-loans-batch'),
+    path('payments/', LoanPaymentIngestView.as_view(), name='loan-payments'),
+    path('events/', EventStreamView.as_view(), name='event-stream'),
+    re_path(r'^export/(?P<kind>customers|loans)/$', ExportView.as_view(), name='export'),
+    path('offers/<uuid:customer_id>/', LoanOfferView.as_view(), name='loan-offers'),
+    path('portfolio/summary/', PortfolioSummaryView.as_view(), name='portfolio-summary'),
+    path('scenarios/rate-shock/', RateShockScenarioView.as_view(), name='rate-shock-scenario'),
+    path('scenarios/runs/<int:run_id>/', SimulationRunView.as_view(), name='simulation-run'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,87 +1,83 @@
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from django.conf import settings
 from django.db import IntegrityError, transaction, models
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.utils import timezone
-from django.db.models import Sum, Count, Q, F
-from .models import Customer, Loan
+from django.db.models import Sum
+from . import metrics, outbox, tracing
+from .customer_cache import aget_customer, get_customer, invalidate_customer
+from .export import CONTENT_TYPES, astream_export, stream_export
+from .models import ArchivedLoan, Customer, Loan, LoanOffer, SimulationRun
+from .payments import record_payments
+from .portfolio import portfolio_summary
+from .renderers import negotiate, rendered_response
+from .routers import areplica_reads, mark_customer_write, replica_reads
+from .decision_log import build_record, record_decision
+from .search import SearchTimeout, search_customers
+from .scoring import (
+    add_archived_history, archived_history_aggregates, credit_score_components,
+    decide_eligibility, history_aggregates, monthly_installment
+)
+from .tasks import apply_loan_payments, run_rate_shock_scenario
 from .serializers import (
     CustomerRegistrationSerializer, CustomerResponseSerializer,
     LoanEligibilityRequestSerializer, LoanEligibilityResponseSerializer,
     LoanCreationRequestSerializer, LoanCreationResponseSerializer,
-    LoanDetailsSerializer, CustomerLoanListSerializer
+    LoanDetailsSerializer, LoanBatchLookupSerializer, CustomerLoanListSerializer, LoanPaymentBatchSerializer,
+    ExportQuerySerializer, RateShockScenarioSerializer, LoanOfferSerializer,
+    CustomerSearchQuerySerializer, EventStreamQuerySerializer, CustomerSearchResultSerializer
 )
 
 
 class BaseLoanEligibilityMixin:
+    # Recorded with each decision in the audit log (core.decision_log)
+    decision_source = 'unknown'
+
     def calculate_credit_score(self, customer, current_year_start):
         """
         Calculate credit score based on customer's loan history.
         Returns a score between 0 and 100.
         """
-        loans = customer.loans.all()
-        
-        if not loans:
-            # No loan history - moderate score
-            return 50
-            
-        # Get loan statistics
-        total_loans = loans.count()
-        total_emis = sum(loan.tenure for loan in loans)  # Total EMIs across all loans
-        emis_paid_on_time = sum(loan.emis_paid_on_time for loan in loans)
-        current_year_loans = loans.filter(start_date__gte=current_year_start).count()
-        total_approved_amount = loans.aggregate(total=Sum('loan_amount'))['total'] or 0
-        current_debt = customer.current_debt
-
-        # Check if current debt exceeds approved limit - Immediate disqualification
-        if current_debt > customer.approved_limit:
-            return 0
-
-        # 1. Past Loans paid on time (35%)
-        if total_emis > 0:
-            payment_score = (emis_paid_on_time / total_emis) * 35
-        else:
-            payment_score = 17.5  # Neutral score for no history
-
-        # 2. Number of loans taken in past (15%)
-        # More loans means more credit history, but not too many
-        loan_count_score = min(total_loans * 5, 15)
-
-        # 3. Loan activity in current year (15%)
-        # Moderate activity is good, too many loans in current year is risky
-        current_year_score = 15 * (1 - min(current_year_loans / 4, 1))  # Penalize if more than 4 loans in current year
-
-        # 4. Loan approved volume vs salary (35%)
-        # Check if total approved amount is reasonable compared to annual salary
-        annual_salary = float(customer.monthly_salary) * 12
-        loan_volume_ratio = float(total_approved_amount) / annual_salary if annual_salary > 0 else float('inf')
-        
-        if loan_volume_ratio <= 3:  # Up to 3 years of salary is ideal
-            volume_score = 35
-        elif loan_volume_ratio <= 5:  # Up to 5 years of salary is okay
-            volume_score = 25
-        elif loan_volume_ratio <= 8:  # Up to 8 years of salary is risky
-            volume_score = 15
-        else:  # More than 8 years of salary is very risky
-            volume_score = 5
-
-        # Combine all scores
-        credit_score = payment_score + loan_count_score + current_year_score + volume_score
-        
-        # Final adjustments
-        credit_score = min(max(credit_score, 0), 100)  # Ensure score is between 0 and 100
-        
-        return credit_score
+        return self.credit_score_breakdown(customer, current_year_start)['credit_score']
+
+    def _history_query(self, customer, current_year_start):
+        # Live loans plus the summary of archived ones, in one query
+        return Customer.objects.filter(pk=customer.pk), {
+            **history_aggregates(current_year_start, prefix='loans__'),
+            **archived_history_aggregates(),
+        }
+
+    def credit_score_breakdown(self, customer, current_year_start):
+        """The credit score and its components (see `credit_score_components`)."""
+        customers, aggregates = self._history_query(customer, current_year_start)
+        history = add_archived_history(customers.aggregate(**aggregates))
+        return credit_score_components(
+            history, customer.current_debt, customer.approved_limit, customer.monthly_salary
+        )
+
+    async def acalculate_credit_score(self, customer, current_year_start):
+        """Async variant of `calculate_credit_score`."""
+        return (await self.acredit_score_breakdown(customer, current_year_start))['credit_score']
+
+    async def acredit_score_breakdown(self, customer, current_year_start):
+        """Async variant of `credit_score_breakdown`."""
+        customers, aggregates = self._history_query(customer, current_year_start)
+        history = add_archived_history(await customers.aaggregate(**aggregates))
+        return credit_score_components(
+            history, customer.current_debt, customer.approved_limit, customer.monthly_salary
+        )
 
     def calculate_monthly_installment(self, principal, annual_rate, tenure):
         """Calculate EMI using compound interest formula"""
-        monthly_rate = float(annual_rate) / (12 * 100)
-        if monthly_rate > 0:
-            emi = float(principal) * (monthly_rate * (1 + monthly_rate) ** tenure) / ((1 + monthly_rate) ** tenure - 1)
-        else:
-            emi = float(principal) / tenure
-        return round(emi, 2)
+        return monthly_installment(principal, annual_rate, tenure)
 
     def get_corrected_interest_rate(self, credit_score, requested_rate):
         """
@@ -105,65 +101,61 @@ class BaseLoanEligibilityMixin:
         """
         Check loan eligibility based on credit score and EMI constraints.
         Returns a tuple of (is_eligible, message, corrected_rate, monthly_installment)
-        
-        Credit score rules:
-        - credit_score > 50: approve at any rate
-        - 30 < credit_score <= 50: approve if rate >= 12%
-        - 10 < credit_score <= 30: approve if rate >= 16%
-        - credit_score <= 10: no approval
+
+        See `core.scoring.decide_eligibility` for the credit score rules.
         """
         current_year_start = timezone.now().replace(month=1, day=1)
-        credit_score = self.calculate_credit_score(customer, current_year_start)
-        interest_rate = float(interest_rate)
-        corrected_rate = None
-        
-        # First check: Credit score based approval
-        if credit_score <= 10:
-            return False, "Low credit score (≤ 10), loan cannot be approved", None, None
-        
-        # Determine corrected interest rate based on credit score bands
-        if 10 < credit_score <= 30 and interest_rate < 16:
-            corrected_rate = 16.0  # Minimum rate for this band
-        elif 30 < credit_score <= 50 and interest_rate < 12:
-            corrected_rate = 12.0  # Minimum rate for this band
-        
-        # Use corrected rate if needed, otherwise use original rate
-        final_rate = corrected_rate if corrected_rate else interest_rate
-        
-        # Calculate monthly installment using final rate
-        monthly_installment = self.calculate_monthly_installment(
-            loan_amount,
-            final_rate,
-            tenure
+        with tracing.span('credit_score') as span:
+            components = self.credit_score_breakdown(customer, current_year_start)
+            credit_score = components['credit_score']
+            span.set_attribute('credit_score', credit_score)
+
+        current_emis = 0
+        if credit_score > 10:
+            with tracing.span('emi_cap'):
+                current_emis = customer.loans.filter(
+                    status='APPROVED'
+                ).aggregate(
+                    total_emi=Sum('monthly_installment')
+                )['total_emi'] or 0
+
+        result = decide_eligibility(
+            credit_score, loan_amount, interest_rate, tenure, current_emis, customer.monthly_salary
         )
-        
-        # Check if total EMIs exceed 50% of monthly salary
-        current_emis = customer.loans.filter(
-            status='APPROVED'
-        ).aggregate(
-            total_emi=Sum('monthly_installment')
-        )['total_emi'] or 0
-        
-        total_emi_with_new_loan = float(current_emis) + monthly_installment
-        if total_emi_with_new_loan > (float(customer.monthly_salary) * 0.5):
-            return False, "Total EMIs would exceed 50% of monthly salary", corrected_rate, monthly_installment
-        
-        # Final approval decision based on credit score bands and interest rates
-        if credit_score > 50:
-            # Approve at any interest rate
-            return True, None, corrected_rate, monthly_installment
-        elif 30 < credit_score <= 50:
-            # Must have at least 12% interest rate
-            if interest_rate < 12:
-                return False, "Interest rate must be at least 12% for credit score between 31-50", 12.0, monthly_installment
-            return True, None, corrected_rate, monthly_installment
-        elif 10 < credit_score <= 30:
-            # Must have at least 16% interest rate
-            if interest_rate < 16:
-                return False, "Interest rate must be at least 16% for credit score between 11-30", 16.0, monthly_installment
-            return True, None, corrected_rate, monthly_installment
-            
-        return False, "Invalid credit score scenario", None, None  # Fallback case
+        with tracing.span('record_decision'):
+            record_decision(build_record(
+                self.decision_source, customer, loan_amount, interest_rate, tenure,
+                components, current_emis, result
+            ))
+        return result
+
+    async def acheck_loan_eligibility(self, customer, loan_amount, interest_rate, tenure):
+        """Async variant of `check_loan_eligibility` using the async ORM."""
+        current_year_start = timezone.now().replace(month=1, day=1)
+        with tracing.span('credit_score') as span:
+            components = await self.acredit_score_breakdown(customer, current_year_start)
+            credit_score = components['credit_score']
+            span.set_attribute('credit_score', credit_score)
+
+        current_emis = 0
+        if credit_score > 10:
+            with tracing.span('emi_cap'):
+                current_emis = (await customer.loans.filter(
+                    status='APPROVED'
+                ).aaggregate(
+                    total_emi=Sum('monthly_installment')
+                ))['total_emi'] or 0
+
+        result = decide_eligibility(
+            credit_score, loan_amount, interest_rate, tenure, current_emis, customer.monthly_salary
+        )
+        # A flush may hand off to Celery or write through, both blocking
+        with tracing.span('record_decision'):
+            await sync_to_async(record_decision)(build_record(
+                self.decision_source, customer, loan_amount, interest_rate, tenure,
+                components, current_emis, result
+            ))
+        return result
 
 
 class CustomerRegistrationView(APIView):
@@ -174,7 +166,15 @@ class CustomerRegistrationView(APIView):
         
         try:
             if serializer.is_valid():
-                customer = serializer.save()
+                with transaction.atomic():
+                    customer = serializer.save()
+                    outbox.record_event(
+                        'customer.registered', 'customer', customer.customer_id, customer.customer_id,
+                        age=customer.age,
+                        monthly_salary=customer.monthly_salary,
+                        approved_limit=customer.approved_limit,
+                    )
+                mark_customer_write(customer.customer_id)
                 response_serializer = CustomerResponseSerializer(customer)
                 return Response(
                     response_serializer.data,
@@ -193,26 +193,33 @@ class CustomerRegistrationView(APIView):
 
 class LoanEligibilityView(BaseLoanEligibilityMixin, APIView):
     permission_classes = [AllowAny]
+    decision_source = 'check-eligibility'
     
     def post(self, request, *args, **kwargs):
         # Validate request data
-        request_serializer = LoanEligibilityRequestSerializer(data=request.data)
-        if not request_serializer.is_valid():
+        with tracing.span('validate_request'):
+            request_serializer = LoanEligibilityRequestSerializer(data=request.data)
+            valid = request_serializer.is_valid()
+        if not valid:
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         data = request_serializer.validated_data
         
         try:
-            # Get customer
-            customer = Customer.objects.get(customer_id=data['customer_id'])
-            
-            # Check eligibility
-            is_eligible, message, corrected_rate, monthly_installment = self.check_loan_eligibility(
-                customer,
-                data['loan_amount'],
-                data['interest_rate'],
-                data['tenure']
-            )
+            # A quote is advisory (create-loan re-checks on the primary), so it
+            # can be served from the replica
+            with replica_reads(customer_id=data['customer_id']):
+                # Get customer
+                with tracing.span('get_customer'):
+                    customer = get_customer(data['customer_id'])
+
+                # Check eligibility
+                is_eligible, message, corrected_rate, monthly_installment = self.check_loan_eligibility(
+                    customer,
+                    data['loan_amount'],
+                    data['interest_rate'],
+                    data['tenure']
+                )
             
             response_data = {
                 'customer_id': customer.customer_id,
@@ -223,10 +230,12 @@ class LoanEligibilityView(BaseLoanEligibilityMixin, APIView):
                 'monthly_installment': monthly_installment or 0
             }
             
-            response_serializer = LoanEligibilityResponseSerializer(data=response_data)
-            response_serializer.is_valid(raise_exception=True)
+            with tracing.span('serialize_response'):
+                response_serializer = LoanEligibilityResponseSerializer(data=response_data)
+                response_serializer.is_valid(raise_exception=True)
+                response_data = response_serializer.data
             
-            return Response(response_serializer.data)
+            return Response(response_data)
             
         except Customer.DoesNotExist:
             return Response(
@@ -237,42 +246,48 @@ class LoanEligibilityView(BaseLoanEligibilityMixin, APIView):
 
 class LoanCreationView(BaseLoanEligibilityMixin, APIView):
     permission_classes = [AllowAny]
+    decision_source = 'create-loan'
     
     def post(self, request, *args, **kwargs):
         # Validate request data
-        request_serializer = LoanCreationRequestSerializer(data=request.data)
-        if not request_serializer.is_valid():
+        with tracing.span('validate_request'):
+            request_serializer = LoanCreationRequestSerializer(data=request.data)
+            valid = request_serializer.is_valid()
+        if not valid:
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         data = request_serializer.validated_data
         
         try:
-            # Get customer
-            customer = Customer.objects.get(customer_id=data['customer_id'])
-            
-            # Check eligibility
-            is_eligible, message, corrected_rate, monthly_installment = self.check_loan_eligibility(
-                customer,
-                data['loan_amount'],
-                data['interest_rate'],
-                data['tenure']
-            )
-            
-            # Prepare base response data
-            response_data = {
-                'customer_id': customer.customer_id,
-                'loan_id': None,
-                'loan_approved': False,
-                'monthly_installment': None,
-                'message': ''
-            }
-            
-            if not is_eligible:
-                response_data['message'] = message
-                return Response(response_data)
-            
-            # Create the loan
-            with transaction.atomic():
+            # The eligibility check and the loan it approves share one
+            # transaction and the customer's row lock, read from the primary:
+            # a cached or replica copy could miss a loan approved a moment ago
+            # and approve past the EMI cap or approved limit
+            with tracing.span('transaction'), transaction.atomic():
+                with tracing.span('get_customer'):
+                    customer = Customer.objects.select_for_update().get(customer_id=data['customer_id'])
+
+                # Check eligibility
+                is_eligible, message, corrected_rate, monthly_installment = self.check_loan_eligibility(
+                    customer,
+                    data['loan_amount'],
+                    data['interest_rate'],
+                    data['tenure']
+                )
+
+                # Prepare base response data
+                response_data = {
+                    'customer_id': customer.customer_id,
+                    'loan_id': None,
+                    'loan_approved': False,
+                    'monthly_installment': None,
+                    'message': ''
+                }
+
+                if not is_eligible:
+                    response_data['message'] = message
+                    return Response(response_data)
+
                 # Create loan
                 loan = Loan.objects.create(
                     customer=customer,
@@ -284,10 +299,26 @@ class LoanCreationView(BaseLoanEligibilityMixin, APIView):
                     end_date=timezone.now().date() + timezone.timedelta(days=30*data['tenure']),
                     status='APPROVED'
                 )
-                
+
                 # Update customer's current debt
-                customer.current_debt = models.F('current_debt') + data['loan_amount']
-                customer.save()
+                Customer.objects.filter(customer_id=customer.customer_id).update(
+                    current_debt=models.F('current_debt') + data['loan_amount'],
+                    updated_at=timezone.now()
+                )
+                # The customer's row is locked above
+                outbox.record_event(
+                    'loan.created', 'loan', loan.loan_id, customer.customer_id,
+                    loan_amount=loan.loan_amount,
+                    interest_rate=loan.interest_rate,
+                    tenure=loan.tenure,
+                    monthly_installment=loan.monthly_installment,
+                    start_date=loan.start_date,
+                    end_date=loan.end_date,
+                    status=loan.status,
+                )
+                invalidate_customer(customer.customer_id)
+
+            mark_customer_write(customer.customer_id)
             
             # Update response for approved loan
             response_data.update({
@@ -296,10 +327,12 @@ class LoanCreationView(BaseLoanEligibilityMixin, APIView):
                 'monthly_installment': monthly_installment
             })
             
-            response_serializer = LoanCreationResponseSerializer(data=response_data)
-            response_serializer.is_valid(raise_exception=True)
+            with tracing.span('serialize_response'):
+                response_serializer = LoanCreationResponseSerializer(data=response_data)
+                response_serializer.is_valid(raise_exception=True)
+                response_data = response_serializer.data
             
-            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+            return Response(response_data, status=status.HTTP_201_CREATED)
             
         except Customer.DoesNotExist:
             return Response(
@@ -312,15 +345,64 @@ class LoanDetailsView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, loan_id, *args, **kwargs):
-        try:
-            loan = Loan.objects.get(loan_id=loan_id)
-            serializer = LoanDetailsSerializer(loan)
-            return Response(serializer.data)
-        except Loan.DoesNotExist:
+        with replica_reads() as on_replica:
+            loan = Loan.objects.select_related('customer').filter(loan_id=loan_id).first()
+        if loan is None and on_replica:
+            # The loan may have been created after the replica's last catch-up
+            loan = Loan.objects.select_related('customer').filter(loan_id=loan_id).first()
+        if loan is None:
+            # Old closed loans live in the archive (core.archive)
+            loan = ArchivedLoan.objects.select_related('customer').filter(loan_id=loan_id).first()
+        if loan is None:
             return Response(
                 {'error': 'Loan not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        serializer = LoanDetailsSerializer(loan, context={'request': request})
+        return Response(serializer.data)
+
+
+def _loans_by_id(model, loan_ids):
+    return {loan.loan_id: loan for loan in model.objects.select_related('customer').filter(loan_id__in=loan_ids)}
+
+
+class LoanBatchDetailsView(APIView):
+    """
+    Details of many loans in one request, for dashboards showing dozens.
+
+    Body: {"loan_ids": [...]}, at most 500. Returns {"results": {loan_id:
+    details}} in the view-loan schema, in request order, with
+    {"error": "Loan not found"} for unknown ids. The loans and their
+    customers come from one query. Only misses are looked up again, on the
+    primary after a replica read and then in the archive.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LoanBatchLookupSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        loan_ids = list(dict.fromkeys(serializer.validated_data['loan_ids']))
+
+        with replica_reads() as on_replica:
+            loans = _loans_by_id(Loan, loan_ids)
+        missing = [loan_id for loan_id in loan_ids if loan_id not in loans]
+        if missing and on_replica:
+            # Loans created after the replica's last catch-up
+            loans.update(_loans_by_id(Loan, missing))
+            missing = [loan_id for loan_id in missing if loan_id not in loans]
+        if missing:
+            # Old closed loans live in the archive (core.archive)
+            loans.update(_loans_by_id(ArchivedLoan, missing))
+
+        found = [loans[loan_id] for loan_id in loan_ids if loan_id in loans]
+        details = LoanDetailsSerializer(found, many=True, context={'request': request}).data
+        results = {str(loan.loan_id): data for loan, data in zip(found, details)}
+        return Response({
+            'results': {
+                str(loan_id): results.get(str(loan_id), {'error': 'Loan not found'}) for loan_id in loan_ids
+            }
+        })
 
 
 class CustomerLoanListView(APIView):
@@ -349,33 +431,35 @@ class CustomerLoanListView(APIView):
             400: If customer_id is invalid
         """
         try:
-            # Verify customer exists
-            try:
-                customer = Customer.objects.get(customer_id=customer_id)
-            except (ValueError, TypeError):
-                return Response(
-                    {"error": "Invalid customer ID format"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except Customer.DoesNotExist:
-                return Response(
-                    {"error": "Customer not found"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Get all active loans for the customer
-            loans = Loan.objects.filter(
-                customer=customer,
-                status='APPROVED'
-            ).order_by('-created_at')
-            
-            # Even if no loans found, return empty list with 200 status
-            serializer = CustomerLoanListSerializer(loans, many=True)
+            with replica_reads(customer_id=customer_id):
+                # Verify customer exists
+                try:
+                    customer = get_customer(customer_id)
+                except (ValueError, TypeError):
+                    return Response(
+                        {"error": "Invalid customer ID format"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                except Customer.DoesNotExist:
+                    return Response(
+                        {"error": "Customer not found"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+
+                # Get all active loans for the customer
+                loans = Loan.objects.filter(
+                    customer=customer,
+                    status='APPROVED'
+                ).order_by('-created_at')
+
+                # Even if no loans found, return empty list with 200 status
+                serializer = CustomerLoanListSerializer(loans, many=True, context={'request': request})
+                loans_data = serializer.data
             return Response(
                 {
                     "customer_id": str(customer_id),
-                    "total_loans": len(serializer.data),
-                    "loans": serializer.data
+                    "total_loans": len(loans_data),
+                    "loans": loans_data
                 },
                 status=status.HTTP_200_OK
             )
@@ -386,3 +470,370 @@ class CustomerLoanListView(APIView):
                 {"error": "An unexpected error occurred"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+# Async-native read path
+#
+# These mirror LoanEligibilityView, LoanDetailsView and CustomerLoanListView
+# on Django's async ORM so a worker can keep serving other requests while a
+# lookup waits on the database. They are plain Django views (DRF's APIView
+# is sync-only) and are routed instead of the sync ones when
+# settings.ASYNC_READ_VIEWS is enabled, which only makes sense under ASGI
+# (see credit_approval/asgi.py). Writes such as create-loan stay sync: Django
+# runs them in a single thread per request, so transaction.atomic() keeps
+# the same guarantees under ASGI as under WSGI.
+
+class AsyncLoanEligibilityView(BaseLoanEligibilityMixin, View):
+    decision_source = 'check-eligibility'
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        request_serializer = LoanEligibilityRequestSerializer(data=payload)
+        if not request_serializer.is_valid():
+            return JsonResponse(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = request_serializer.validated_data
+
+        async with areplica_reads(customer_id=data['customer_id']):
+            try:
+                customer = await aget_customer(data['customer_id'])
+            except Customer.DoesNotExist:
+                return JsonResponse(
+                    {'error': 'Customer not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            is_eligible, message, corrected_rate, monthly_installment = await self.acheck_loan_eligibility(
+                customer,
+                data['loan_amount'],
+                data['interest_rate'],
+                data['tenure']
+            )
+
+        response_data = {
+            'customer_id': customer.customer_id,
+            'approval': is_eligible,
+            'interest_rate': data['interest_rate'],
+            'corrected_interest_rate': corrected_rate if corrected_rate != float(data['interest_rate']) else None,
+            'tenure': data['tenure'],
+            'monthly_installment': monthly_installment or 0
+        }
+
+        response_serializer = LoanEligibilityResponseSerializer(data=response_data)
+        # No DRF exception handler here: answer 400 as the sync view does
+        if not response_serializer.is_valid():
+            return JsonResponse(response_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return JsonResponse(response_serializer.data)
+
+
+class AsyncLoanDetailsView(View):
+    async def get(self, request, loan_id, *args, **kwargs):
+        # select_related so the serializer never lazy-loads from async code
+        loans = Loan.objects.select_related('customer').filter(loan_id=loan_id)
+        async with areplica_reads() as on_replica:
+            loan = await loans.afirst()
+        if loan is None and on_replica:
+            # The loan may have been created after the replica's last catch-up
+            loan = await loans.afirst()
+        if loan is None:
+            # Old closed loans live in the archive (core.archive)
+            loan = await ArchivedLoan.objects.select_related('customer').filter(loan_id=loan_id).afirst()
+        if loan is None:
+            return JsonResponse(
+                {'error': 'Loan not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        negotiate(request)
+        return rendered_response(request, LoanDetailsSerializer(loan, context={'request': request}).data)
+
+
+class AsyncCustomerLoanListView(View):
+    """Async variant of CustomerLoanListView."""
+
+    async def get(self, request, customer_id):
+        async with areplica_reads(customer_id=customer_id):
+            try:
+                await aget_customer(customer_id)
+            except Customer.DoesNotExist:
+                return JsonResponse(
+                    {"error": "Customer not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            loans = [
+                loan async for loan in Loan.objects.filter(
+                    customer_id=customer_id,
+                    status='APPROVED'
+                ).order_by('-created_at')
+            ]
+
+        negotiate(request)
+        serializer = CustomerLoanListSerializer(loans, many=True, context={'request': request})
+        return rendered_response(
+            request,
+            {
+                "customer_id": str(customer_id),
+                "total_loans": len(serializer.data),
+                "loans": serializer.data
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class LoanPaymentIngestView(APIView):
+    """
+    Accept a batch of EMI payment events.
+
+    Events are stored immediately (duplicates by payment_reference are
+    ignored) and folded into the loan counters by a Celery task.
+    Authenticated producers only: on-time payments raise credit scores.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LoanPaymentBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        accepted, duplicates, unknown = record_payments(serializer.validated_data['payments'])
+        if accepted:
+            apply_loan_payments.delay()
+
+        return Response(
+            {
+                'accepted': accepted,
+                'duplicates': duplicates,
+                'unknown_loans': unknown,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ExportView(APIView):
+    """
+    Stream the full customer or loan table as NDJSON or CSV, optionally gzipped.
+
+    Query parameters: file_format (ndjson|csv), compress (gzip), status,
+    created_from, created_to, start_date_from, start_date_to (YYYY-MM-DD).
+    Staff only: the customer export holds every name, phone number and
+    salary.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind, *args, **kwargs):
+        query = ExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        options = dict(query.validated_data)
+        fmt = options.pop('file_format')
+        compress = options.pop('compress', None) == 'gzip'
+
+        # Both run while the response streams, after get() has returned
+        def chunks():
+            with replica_reads():
+                yield from stream_export(kind, fmt, compress=compress, **options)
+
+        async def achunks():
+            async with areplica_reads():
+                async for chunk in astream_export(kind, fmt, compress=compress, **options):
+                    yield chunk
+
+        filename = f"{kind}.{fmt}{'.gz' if compress else ''}"
+        response = StreamingHttpResponse(
+            achunks() if isinstance(request._request, ASGIRequest) else chunks(),
+            content_type='application/gzip' if compress else CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class CustomerSearchView(APIView):
+    """
+    Search customers by phone number prefix or name (see core.search).
+
+    Query parameters: q, limit (1-100, default 20) and cursor, the
+    `next_cursor` of the previous page.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = CustomerSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        options = query.validated_data
+        try:
+            with replica_reads():
+                customers, next_cursor = search_customers(options['q'], options['limit'], options.get('cursor'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except SearchTimeout:
+            return Response(
+                {'error': 'Search took too long; enter more of the phone number or name'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response({
+            'results': CustomerSearchResultSerializer(customers, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class EventStreamView(APIView):
+    """
+    Page through the customer and loan change stream (see core.outbox).
+
+    Query parameters: cursor, the `next_cursor` of the previous page ('0',
+    the default, starts at the oldest event kept), and limit (1-1000,
+    default 100). An empty page returns the same cursor; poll it again.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = EventStreamQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        options = query.validated_data
+        try:
+            events, next_cursor = outbox.read_stream(options['cursor'], options['limit'])
+        except outbox.CursorExpired:
+            return Response(
+                {'error': 'Events after this cursor are no longer kept; resynchronise and restart from cursor 0'},
+                status=status.HTTP_410_GONE
+            )
+        return Response({'events': events, 'next_cursor': next_cursor})
+
+
+class LoanOfferView(APIView):
+    """
+    Pre-approved offers for a customer, one per standard tenure.
+
+    Read straight from the LoanOffer table that the nightly job fills
+    (see core.offers); nothing is computed on the request path.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, customer_id):
+        with replica_reads(customer_id=customer_id):
+            offers = list(LoanOffer.objects.filter(customer_id=customer_id).order_by('tenure'))
+        if not offers:
+            return Response(
+                {"error": "No offers computed for this customer"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response({
+            'customer_id': customer_id,
+            'pre_approved_up_to': max(offer.max_principal for offer in offers),
+            'computed_at': offers[0].computed_at,
+            'offers': LoanOfferSerializer(offers, many=True).data,
+        })
+
+
+class PortfolioSummaryView(APIView):
+    """
+    Portfolio exposure and credit score band totals.
+
+    Served from the running counters in core.portfolio, so the response
+    cost does not grow with the loan table.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        with replica_reads():
+            return Response(portfolio_summary())
+
+
+class RateShockScenarioView(APIView):
+    """
+    Re-evaluate active and pending loans under a rate shift or changed
+    band minimum rates / EMI cap, and report the eligibility flips.
+
+    The result is stored as a SimulationRun of kind 'rate_shock'. Books of
+    more than RATE_SHOCK_SYNC_MAX_LOANS loans are evaluated by the
+    run_rate_shock_scenario task instead: the response is 202 with the run
+    id, and the result is read from `scenarios/runs/<run_id>/`.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = RateShockScenarioSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        policy = {'min_rates': data.get('min_rates', {})}
+        if 'emi_cap_ratio' in data:
+            policy['emi_cap_ratio'] = data['emi_cap_ratio']
+        statuses = tuple(sorted(data['statuses']))
+        parameters = {
+            'rate_shift': data['rate_shift'],
+            'statuses': list(statuses),
+            'max_customer_ids': data['max_customer_ids'],
+            **policy,
+        }
+
+        with replica_reads():
+            loans = Loan.objects.filter(status__in=statuses).count()
+        if loans > settings.RATE_SHOCK_SYNC_MAX_LOANS:
+            run = SimulationRun.objects.create(kind='rate_shock', parameters=parameters)
+            run_rate_shock_scenario.delay(run.pk)
+            return Response(
+                {'run_id': run.pk, 'status': run.status, 'loans': loans},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        # Imported here: NumPy is only needed by this endpoint
+        from .scenarios import run_rate_shock
+
+        with replica_reads():
+            result = run_rate_shock(
+                rate_shift=data['rate_shift'], policy=policy, statuses=statuses,
+                max_customer_ids=data['max_customer_ids']
+            )
+        run = SimulationRun.objects.create(
+            kind='rate_shock',
+            parameters=parameters,
+            status='COMPLETED',
+            summary=result,
+            finished_at=timezone.now(),
+        )
+        return Response({'run_id': run.pk, **result})
+
+
+class SimulationRunView(APIView):
+    """Status and summary of a SimulationRun, e.g. a queued rate shock scenario."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, run_id, *args, **kwargs):
+        try:
+            run = SimulationRun.objects.get(pk=run_id)
+        except SimulationRun.DoesNotExist:
+            return Response({'error': 'Simulation run not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'run_id': run.pk,
+            'kind': run.kind,
+            'status': run.status,
+            'parameters': run.parameters,
+            'summary': run.summary,
+            'error': run.error,
+            'created_at': run.created_at,
+            'finished_at': run.finished_at,
+        })
+
+
+class MetricsView(APIView):
+    """Process metrics in the Prometheus text format (see core.metrics)."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'credit_approval.settings')
+# ASGI workers can interleave requests, so route the read endpoints to the
+# async ORM views unless explicitly disabled
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
 application = get_asgi_application()
@@ -1,5 +1,5 @@
 import os
-from celery import Celery
+from celery import Celery, signals
 
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'credit_approval.settings')
@@ -12,3 +12,21 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+
+@signals.celeryd_init.connect
+def apply_queue_profile(conf=None, options=None, **kwargs):
+    """
+    Give a worker consuming a single queue that queue's concurrency and
+    prefetch (TASK_QUEUE_PROFILES). Command-line options still win.
+    """
+    from django.conf import settings
+
+    queues = options.get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    if len(queues) != 1 or queues[0] not in settings.TASK_QUEUE_PROFILES:
+        return
+    profile = settings.TASK_QUEUE_PROFILES[queues[0]]
+    conf.worker_concurrency = profile['concurrency']
+    conf.worker_prefetch_multiplier = profile['prefetch_multiplier']
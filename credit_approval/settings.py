@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -44,6 +46,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Outermost of ours, so the request span covers admission control too
+    'core.tracing.TracingMiddleware',
+    # Before sessions and auth, so rejected requests never touch the database
+    'core.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,11 +76,36 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'credit_approval.wsgi.application'
+ASGI_APPLICATION = 'credit_approval.asgi.application'
+
+# Serve view-loan, view-loans and check-eligibility from the async ORM views.
+# Enable together with an ASGI server (gunicorn -k uvicorn_worker.UvicornWorker).
+ASYNC_READ_VIEWS = bool(int(os.getenv('ASYNC_READ_VIEWS', 0)))
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Which kind of process loaded these settings; used to size per-process
+# resources such as the database connection pool.
+PROCESS_TYPE = os.getenv('APP_PROCESS_TYPE') or (
+    'celery' if 'celery' in os.path.basename(sys.argv[0]) else 'web'
+)
+
+
+def process_env(name, default):
+    """Read `<PROCESS_TYPE>_<name>` (e.g. CELERY_DB_POOL_MAX_SIZE), then `<name>`."""
+    return os.getenv(f'{PROCESS_TYPE.upper()}_{name}', os.getenv(name, default))
+
+
+# Pool sizes per process type. A sync gunicorn worker serves one request at a
+# time, a prefork Celery child runs one task at a time; uvicorn workers
+# interleave requests and may need a larger max size.
+DB_POOL_DEFAULTS = {
+    'web': {'MIN_SIZE': 1, 'MAX_SIZE': 4},
+    'celery': {'MIN_SIZE': 1, 'MAX_SIZE': 2},
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -89,6 +120,46 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    pool_defaults = DB_POOL_DEFAULTS.get(PROCESS_TYPE, DB_POOL_DEFAULTS['web'])
+    if int(process_env('DB_POOL', 1)):
+        # psycopg 3 connection pool (Django 5.1+). Connections are returned to
+        # the pool at the end of each request instead of being closed.
+        pool_options = {
+            'min_size': int(process_env('DB_POOL_MIN_SIZE', pool_defaults['MIN_SIZE'])),
+            'max_size': int(process_env('DB_POOL_MAX_SIZE', pool_defaults['MAX_SIZE'])),
+            'timeout': float(process_env('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(process_env('DB_POOL_MAX_IDLE', 600)),
+            'max_lifetime': float(process_env('DB_POOL_MAX_LIFETIME', 3600)),
+        }
+        try:
+            from psycopg_pool import ConnectionPool
+            # Validate connections on checkout so restarts of Postgres don't
+            # surface as errors on the first request after them
+            pool_options['check'] = ConnectionPool.check_connection
+        except (ImportError, AttributeError):
+            pass
+        DATABASES['default']['OPTIONS'] = {'pool': pool_options}
+    else:
+        # Persistent per-thread connections with a liveness check on reuse
+        DATABASES['default']['CONN_MAX_AGE'] = int(process_env('DB_CONN_MAX_AGE', 60))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Optional streaming replica for the read-only endpoints (see core.routers)
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.getenv('DB_REPLICA_HOST'),
+        PORT=os.getenv('DB_REPLICA_PORT', DATABASES['default'].get('PORT')),
+        OPTIONS=dict(DATABASES['default'].get('OPTIONS', {})),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Seconds a customer's reads stay on the primary after one of their writes
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +199,121 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 
+# Cache
+# Redis when available so state shared between workers (e.g. replica
+# stickiness) is visible to all of them; per-process memory otherwise.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT', '6379')}/1",
+    } if os.getenv('REDIS_HOST') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Customer lookup cache (core.customer_cache): seconds in the shared cache,
+# seconds and entries in each process's local LRU
+CUSTOMER_CACHE_TTL = int(os.getenv('CUSTOMER_CACHE_TTL', 300))
+CUSTOMER_CACHE_LOCAL_TTL = float(os.getenv('CUSTOMER_CACHE_LOCAL_TTL', 2))
+CUSTOMER_CACHE_LOCAL_SIZE = int(os.getenv('CUSTOMER_CACHE_LOCAL_SIZE', 1024))
+
+# Parquet snapshots of the loan book (core.snapshots)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', str(BASE_DIR / 'snapshots'))
+# Incremental snapshots start this long before the previous watermark, to
+# pick up rows from transactions still open when it was taken; keep it
+# above the longest write transaction
+SNAPSHOT_WATERMARK_OVERLAP_SECONDS = int(os.getenv('SNAPSHOT_WATERMARK_OVERLAP_SECONDS', 300))
+
+# Rows each portfolio total is spread over (core.portfolio)
+PORTFOLIO_COUNTER_SHARDS = int(os.getenv('PORTFOLIO_COUNTER_SHARDS', 16))
+
+# Monte Carlo simulation (core.simulation): pool size (default: CPU count)
+# and the working-memory budget per path batch
+SIMULATION_WORKERS = int(os.getenv('SIMULATION_WORKERS', 0)) or None
+SIMULATION_MEMORY_MB = int(os.getenv('SIMULATION_MEMORY_MB', 256))
+
+# Rate shock scenarios (core.scenarios) over books larger than this many
+# loans run as a task on the simulation queue instead of in the request
+RATE_SHOCK_SYNC_MAX_LOANS = int(os.getenv('RATE_SHOCK_SYNC_MAX_LOANS', 100000))
+
+# Annual rate pre-approved offers are quoted at, unless the customer's
+# credit score band requires more (core.offers)
+OFFER_BASE_RATE = float(os.getenv('OFFER_BASE_RATE', 10.0))
+
+# Customer search (core.search): PostgreSQL cancels a search running longer
+# than this, so a pathological query cannot tie up a connection; 0 disables
+CUSTOMER_SEARCH_TIMEOUT_MS = int(os.getenv('CUSTOMER_SEARCH_TIMEOUT_MS', 500))
+
+# Closed and rejected loans move to the archive this many days after their
+# end date (core.archive)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+
+# Admission control (core.admission). Rules match URL names (fnmatch, first
+# match wins): `rate`/`burst` bound the endpoint as a whole, `client_rate`/
+# `client_burst` each client IP, in requests per second. Priority 'read'
+# rules are the last to be shed when query latency is high.
+ADMISSION_BACKEND = os.getenv('ADMISSION_BACKEND', 'redis' if os.getenv('REDIS_HOST') else 'memory')
+ADMISSION_REDIS_URL = f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/3"
+ADMISSION_RULES = [
+    {'name': 'view-*', 'priority': 'read', 'rate': 2000, 'burst': 4000, 'client_rate': 50, 'client_burst': 100},
+    {
+        'name': 'create-loan', 'methods': ['POST'],
+        'rate': float(os.getenv('ADMISSION_CREATE_LOAN_RATE', 100)), 'burst': 200,
+        'client_rate': 2, 'client_burst': 10,
+    },
+    {'name': 'check-loan-eligibility', 'rate': 500, 'burst': 1000, 'client_rate': 10, 'client_burst': 30},
+    {'name': 'customer-register', 'rate': 100, 'burst': 200, 'client_rate': 2, 'client_burst': 10},
+    {'name': 'customer-search', 'priority': 'read', 'rate': 200, 'burst': 400, 'client_rate': 5, 'client_burst': 20},
+    {'name': 'event-stream', 'priority': 'read', 'rate': 500, 'burst': 1000, 'client_rate': 10, 'client_burst': 20},
+]
+# Proxies in front of the app that append to X-Forwarded-For (1 behind the
+# bundled nginx); 0 uses REMOTE_ADDR as the client
+ADMISSION_PROXY_COUNT = int(os.getenv('ADMISSION_PROXY_COUNT', 0))
+# Adaptive load shedding (off by default): set ADMISSION_DB_P95_MS to the
+# p95 query time in milliseconds (e.g. 250) above which requests are shed.
+# Every query in the process counts, so keep analytics and exports on
+# separate workers before enabling it
+ADMISSION_DB_P95_MS = float(os.getenv('ADMISSION_DB_P95_MS', 0))
+ADMISSION_DB_WINDOW_SECONDS = float(os.getenv('ADMISSION_DB_WINDOW_SECONDS', 10))
+ADMISSION_SHED_RETRY_AFTER = int(os.getenv('ADMISSION_SHED_RETRY_AFTER', 2))
+
+# Eligibility decision audit log (core.decision_log): 'memory' buffers per
+# process and hands batches to Celery, 'redis' buffers in a shared stream
+DECISION_LOG_BACKEND = os.getenv('DECISION_LOG_BACKEND', 'redis' if os.getenv('REDIS_HOST') else 'memory')
+DECISION_LOG_REDIS_URL = f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/2"
+DECISION_LOG_BATCH_SIZE = int(os.getenv('DECISION_LOG_BATCH_SIZE', 200))
+DECISION_LOG_FLUSH_SECONDS = float(os.getenv('DECISION_LOG_FLUSH_SECONDS', 5))
+DECISION_LOG_MAX_BUFFER = int(os.getenv('DECISION_LOG_MAX_BUFFER', 50000))
+# write_through, drop_oldest or drop_newest once the buffer is full
+DECISION_LOG_OVERFLOW = os.getenv('DECISION_LOG_OVERFLOW', 'write_through')
+DECISION_LOG_RETENTION_MONTHS = int(os.getenv('DECISION_LOG_RETENTION_MONTHS', 84))
+
+# Transactional outbox (core.outbox): events are relayed by
+# `manage.py relay_outbox` to a Redis stream ('memory' keeps it in process),
+# trimmed to about OUTBOX_STREAM_MAXLEN entries; published events are kept
+# in the table for OUTBOX_RETENTION_DAYS
+OUTBOX_BACKEND = os.getenv('OUTBOX_BACKEND', 'redis' if os.getenv('REDIS_HOST') else 'memory')
+OUTBOX_REDIS_URL = f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/4"
+OUTBOX_STREAM = os.getenv('OUTBOX_STREAM', 'loan-events')
+OUTBOX_STREAM_MAXLEN = int(os.getenv('OUTBOX_STREAM_MAXLEN', 1000000))
+OUTBOX_RELAY_BATCH_SIZE = int(os.getenv('OUTBOX_RELAY_BATCH_SIZE', 500))
+OUTBOX_RELAY_INTERVAL_SECONDS = float(os.getenv('OUTBOX_RELAY_INTERVAL_SECONDS', 0.5))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+
+# Response compression (core.renderers): bodies smaller than this go out
+# uncompressed; brotli quality and gzip level trade CPU for bytes
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 4))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 5))
+
+# Tracing (core.tracing): share of requests and unparented tasks traced,
+# 0 turns it off; spans are appended to TRACING_FILE as OTLP/JSON lines
+TRACING_SAMPLE_RATIO = float(os.getenv('TRACING_SAMPLE_RATIO', 0))
+TRACING_FILE = os.getenv('TRACING_FILE', str(BASE_DIR / 'traces.jsonl'))
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'credit-approval')
+TRACING_MAX_SPANS = int(os.getenv('TRACING_MAX_SPANS', 1000))
+
+
 # Celery Configuration
 CELERY_BROKER_URL = f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/0"
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
@@ -136,6 +322,109 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Each workload has its own queue and worker service (see docker-compose
+# files), so an hour-long import never sits in front of a payment batch.
+# Unrouted tasks go to the interactive queue.
+CELERY_TASK_DEFAULT_QUEUE = 'interactive'
+CELERY_TASK_ROUTES = {
+    'core.tasks.ingest_loan_payments': {'queue': 'interactive'},
+    'core.tasks.apply_loan_payments': {'queue': 'interactive'},
+    'core.tasks.write_eligibility_decisions': {'queue': 'interactive'},
+    'core.tasks.drain_decision_log': {'queue': 'interactive'},
+    'core.tasks.refresh_credit_scores': {'queue': 'analytics'},
+    'core.tasks.refresh_loan_offers_task': {'queue': 'analytics'},
+    'core.tasks.close_matured_loans_task': {'queue': 'analytics'},
+    'core.tasks.archive_loans_task': {'queue': 'analytics'},
+    'core.tasks.reconcile_current_debt_task': {'queue': 'analytics'},
+    'core.tasks.maintain_decision_log': {'queue': 'analytics'},
+    'core.tasks.snapshot_loan_book': {'queue': 'analytics'},
+    'core.tasks.prune_outbox_task': {'queue': 'analytics'},
+    'core.tasks.run_portfolio_simulation': {'queue': 'simulation'},
+    'core.tasks.run_rate_shock_scenario': {'queue': 'simulation'},
+    'core.tasks.import_excel_data': {'queue': 'imports'},
+    'core.tasks.update_salaries_task': {'queue': 'imports'},
+}
+
+# Worker and task settings per queue. A worker started with `-Q <queue>`
+# takes concurrency and prefetch from its profile (credit_approval/celery.py)
+# unless given on the command line; routed tasks get acks_late and the
+# time limits (seconds, soft then hard) of their queue.
+# - interactive: short tasks, several prefetched per process; acks early
+#   because eligibility decision batches are not idempotent
+# - analytics: chunked, restartable sweeps; one at a time, acked late so a
+#   lost worker's job is redelivered
+# - simulation: a single process that forks its own pool (`--pool solo`,
+#   which does not enforce time limits)
+# - imports: one file at a time; a rerun would duplicate rows, so acked early
+TASK_QUEUE_PROFILES = {
+    'interactive': {
+        'concurrency': int(os.getenv('CELERY_INTERACTIVE_CONCURRENCY', 4)),
+        'prefetch_multiplier': 4, 'acks_late': False, 'soft_time_limit': 30, 'time_limit': 60,
+    },
+    'analytics': {
+        'concurrency': int(os.getenv('CELERY_ANALYTICS_CONCURRENCY', 2)),
+        'prefetch_multiplier': 1, 'acks_late': True, 'soft_time_limit': 1800, 'time_limit': 2100,
+    },
+    'simulation': {
+        'concurrency': 1,
+        'prefetch_multiplier': 1, 'acks_late': True, 'soft_time_limit': 1800, 'time_limit': 2100,
+    },
+    'imports': {
+        'concurrency': 1,
+        'prefetch_multiplier': 1, 'acks_late': False, 'soft_time_limit': 3600, 'time_limit': 3900,
+    },
+}
+CELERY_TASK_ANNOTATIONS = {
+    task: {
+        key: TASK_QUEUE_PROFILES[route['queue']][key]
+        for key in ('acks_late', 'soft_time_limit', 'time_limit')
+    }
+    for task, route in CELERY_TASK_ROUTES.items()
+}
+# Unacknowledged messages are redelivered after this long; it must exceed
+# the longest hard time limit or late-acked tasks would run twice
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 7200}
+
+# Periodic jobs, run by `celery -A credit_approval beat`
+CELERY_BEAT_SCHEDULE = {
+    'close-matured-loans': {
+        'task': 'core.tasks.close_matured_loans_task',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'archive-loans': {
+        'task': 'core.tasks.archive_loans_task',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    'snapshot-loan-book': {
+        'task': 'core.tasks.snapshot_loan_book',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'reconcile-current-debt': {
+        'task': 'core.tasks.reconcile_current_debt_task',
+        'schedule': crontab(hour=2, minute=0, day_of_week='sunday'),
+    },
+    'refresh-loan-offers': {
+        'task': 'core.tasks.refresh_loan_offers_task',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'drain-decision-log': {
+        'task': 'core.tasks.drain_decision_log',
+        'schedule': 10.0,
+    },
+    'maintain-decision-log-partitions': {
+        'task': 'core.tasks.maintain_decision_log',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'prune-outbox': {
+        'task': 'core.tasks.prune_outbox_task',
+        'schedule': crontab(hour=0, minute=45),
+    },
+    'refresh-credit-scores': {
+        'task': 'core.tasks.refresh_credit_scores',
+        'schedule': crontab(minute='*/5'),
+    },
+}
+
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -148,4 +437,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON by default, MessagePack on request; both compressed (core.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.CompressedJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
@@ -14,9 +14,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
-    }
+    },
+    # Same in-memory database seen through a second connection, so replica
+    # routing can be exercised locally
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Replica routing is enabled per test with override_settings
+DATABASE_ROUTERS = []
+
 # Disable migrations during tests for faster execution
 class DisableMigrations:
     def __contains__(self, item):
@@ -36,6 +46,21 @@ PASSWORD_HASHERS = [
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# Hand every eligibility decision off at once, without a timer thread
+DECISION_LOG_BACKEND = 'memory'
+DECISION_LOG_BATCH_SIZE = 1
+DECISION_LOG_FLUSH_SECONDS = 0
+
+# No rate limits unless a test sets its own rules
+ADMISSION_BACKEND = 'memory'
+ADMISSION_RULES = []
+
+# The change stream is a per-process list; tests relay explicitly
+OUTBOX_BACKEND = 'memory'
+
+# Tests that trace turn it on and point TRACING_FILE at a temporary file
+TRACING_SAMPLE_RATIO = 0
+
 # Allow unauthenticated access during tests
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -47,6 +72,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # JSON by default, MessagePack on request; both compressed (core.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.CompressedJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Disable caching during tests
@@ -16,6 +16,7 @@ print_help() {
     echo "Commands:"
     echo "  dev         Start development environment"
     echo "  prod        Start production environment"
+    echo "  prod-asgi   Start production environment with uvicorn workers"
     echo "  test        Run tests in Docker container"
     echo "  build       Build Docker images"
     echo "  stop        Stop all containers"
@@ -51,6 +52,10 @@ case "$1" in
         log "Starting production environment..."
         docker-compose -f docker-compose.prod.yml up --build -d
         ;;
+    "prod-asgi")
+        log "Starting production environment (ASGI)..."
+        docker-compose -f docker-compose.prod.yml -f docker-compose.asgi.yml up --build -d
+        ;;
     "test")
         log "Running tests in Docker container..."
         docker-compose -f docker-compose.dev.yml run --rm web python run_tests.py core/tests.py -v
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration, read from the working directory by default.
+
+The application is loaded once in the master (`preload_app`) together with
+the URL conf and every view module, then the workers are forked from it,
+so they start without importing anything and share those pages
+copy-on-write. `gc.freeze()` moves everything loaded so far out of the
+collector's reach; otherwise the first collection in each worker would
+write to (and so copy) every page holding a tracked object.
+
+Nothing may open a database connection or start a thread in the master:
+neither survives a fork. Django connects lazily, and the connections and
+pools are closed before forking in case a hook did connect.
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Recycle workers now and then so slow leaks never reach the OOM killer;
+# jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # Import every view module now instead of on each worker's first request
+    get_resolver().url_patterns
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        # Only pools that exist: the `pool` property would open one
+        if connection.alias in (getattr(type(connection), '_connection_pools', None) or {}):
+            connection.close_pool()
+    gc.collect()
+    gc.freeze()